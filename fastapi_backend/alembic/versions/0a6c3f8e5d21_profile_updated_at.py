@@ -0,0 +1,31 @@
+"""profiles updated_at (ETag)
+
+Revision ID: 0a6c3f8e5d21
+Revises: f2b7d9e4a610
+Create Date: 2026-10-17 17:48:52.190633
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6c3f8e5d21'
+down_revision: Union[str, Sequence[str], None] = 'f2b7d9e4a610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'profiles',
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('profiles', 'updated_at')
@@ -0,0 +1,34 @@
+"""job_state for batch jobs (recompute_targets)
+
+Revision ID: 3d8b1f6a9c47
+Revises: 0a6c3f8e5d21
+Create Date: 2026-10-17 22:40:13.504118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d8b1f6a9c47'
+down_revision: Union[str, Sequence[str], None] = '0a6c3f8e5d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'job_state',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('last_run_on', sa.Date(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('job_state')
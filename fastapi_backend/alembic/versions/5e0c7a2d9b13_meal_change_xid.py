@@ -0,0 +1,75 @@
+"""meal_nutrition / meal_tombstones change_xid (commit-safe delta sync cursor)
+
+Revision ID: 5e0c7a2d9b13
+Revises: 3d8b1f6a9c47
+Create Date: 2026-10-17 23:55:41.218304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0c7a2d9b13'
+down_revision: Union[str, Sequence[str], None] = '3d8b1f6a9c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CURRENT_XID = "pg_current_xact_id()::text::bigint"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # เพิ่มด้วย default 0 ก่อน (ไม่ rewrite ตาราง) แล้วค่อยเปลี่ยน default เป็น xid ของ transaction
+    # แถวเดิมได้ 0 = เก่ากว่าทุก change ใหม่; cursor แบบเวลาเดิมใช้ไม่ได้แล้ว client เริ่ม sync ใหม่
+    for table in ('meal_nutrition', 'meal_tombstones'):
+        op.add_column(table, sa.Column('change_xid', sa.BigInteger(), nullable=False, server_default='0'))
+        op.alter_column(table, 'change_xid', server_default=sa.text(CURRENT_XID))
+    op.drop_index('ix_meal_tombstones_user_id_deleted_at', table_name='meal_tombstones')
+    op.create_index(
+        'ix_meal_tombstones_user_id_change_xid',
+        'meal_tombstones',
+        ['user_id', 'change_xid', 'meal_id'],
+        unique=False,
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_meal_nutrition_user_id_change_xid',
+            'meal_nutrition',
+            ['user_id', 'change_xid', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_meal_nutrition_user_id_updated_at',
+            table_name='meal_nutrition',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_meal_nutrition_user_id_updated_at',
+            'meal_nutrition',
+            ['user_id', 'updated_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_meal_nutrition_user_id_change_xid',
+            table_name='meal_nutrition',
+            postgresql_concurrently=True,
+        )
+    op.drop_index('ix_meal_tombstones_user_id_change_xid', table_name='meal_tombstones')
+    op.create_index(
+        'ix_meal_tombstones_user_id_deleted_at',
+        'meal_tombstones',
+        ['user_id', 'deleted_at', 'meal_id'],
+        unique=False,
+    )
+    for table in ('meal_tombstones', 'meal_nutrition'):
+        op.drop_column(table, 'change_xid')
@@ -0,0 +1,41 @@
+"""meal_nutrition (user_id, created_at) index
+
+Revision ID: 7c3e9a1f4b2d
+Revises: 596a543d847a
+Create Date: 2026-10-17 10:12:41.508211
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e9a1f4b2d'
+down_revision: Union[str, Sequence[str], None] = '596a543d847a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # สร้างแบบ CONCURRENTLY ไม่ล็อกตาราง meal_nutrition ระหว่างสร้าง (ต้องอยู่นอก transaction)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_meal_nutrition_user_id_created_at',
+            'meal_nutrition',
+            ['user_id', 'created_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_meal_nutrition_user_id_created_at',
+            table_name='meal_nutrition',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,60 @@
+"""daily nutrition rollup
+
+Revision ID: b41d6e2c8f90
+Revises: 7c3e9a1f4b2d
+Create Date: 2026-10-17 13:40:05.117842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41d6e2c8f90'
+down_revision: Union[str, Sequence[str], None] = '7c3e9a1f4b2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'daily_nutrition_rollup',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('calories', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('protein', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('carb', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('fat', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('meal_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'day'),
+    )
+
+    # เติมข้อมูลจาก meal_nutrition ที่มีอยู่ (เหมือน `python rollup.py backfill`)
+    # ใช้ timezone เดียวกับ app (.env / env) ไม่งั้นวันของ rollup ไม่ตรงกับที่ rollup.py ใช้ต่อ
+    tz = settings.APP_TIMEZONE
+    op.execute(
+        sa.text(
+            """
+            INSERT INTO daily_nutrition_rollup (user_id, day, calories, protein, carb, fat, meal_count)
+            SELECT user_id,
+                   date(timezone(:tz, created_at)),
+                   coalesce(sum(calories), 0),
+                   coalesce(sum(protein), 0),
+                   coalesce(sum(carb), 0),
+                   coalesce(sum(fat), 0),
+                   count(id)
+            FROM meal_nutrition
+            GROUP BY user_id, date(timezone(:tz, created_at))
+            """
+        ).bindparams(tz=tz)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_nutrition_rollup')
@@ -0,0 +1,43 @@
+"""meal_nutrition client_key (idempotent batch sync)
+
+Revision ID: e93a4c1d7b05
+Revises: b41d6e2c8f90
+Create Date: 2026-10-17 15:02:37.430119
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e93a4c1d7b05'
+down_revision: Union[str, Sequence[str], None] = 'b41d6e2c8f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # column nullable ไม่มี default → เพิ่มได้ทันทีไม่ rewrite ตาราง
+    op.add_column('meal_nutrition', sa.Column('client_key', sa.String(length=64), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_meal_nutrition_user_id_client_key',
+            'meal_nutrition',
+            ['user_id', 'client_key'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'uq_meal_nutrition_user_id_client_key',
+            table_name='meal_nutrition',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('meal_nutrition', 'client_key')
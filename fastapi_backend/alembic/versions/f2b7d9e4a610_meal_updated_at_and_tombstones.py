@@ -0,0 +1,62 @@
+"""meal_nutrition updated_at + meal_tombstones (delta sync)
+
+Revision ID: f2b7d9e4a610
+Revises: e93a4c1d7b05
+Create Date: 2026-10-17 16:21:08.774512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7d9e4a610'
+down_revision: Union[str, Sequence[str], None] = 'e93a4c1d7b05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # default now() ไม่ volatile → Postgres เพิ่ม column ได้โดยไม่ rewrite ตาราง
+    # แถวเดิมได้ updated_at = เวลา migrate (client ที่ sync ครั้งแรกได้ทุกแถวอยู่แล้ว)
+    op.add_column(
+        'meal_nutrition',
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+    )
+    op.create_table(
+        'meal_tombstones',
+        sa.Column('meal_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('meal_id'),
+    )
+    op.create_index(
+        'ix_meal_tombstones_user_id_deleted_at',
+        'meal_tombstones',
+        ['user_id', 'deleted_at', 'meal_id'],
+        unique=False,
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_meal_nutrition_user_id_updated_at',
+            'meal_nutrition',
+            ['user_id', 'updated_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_meal_nutrition_user_id_updated_at',
+            table_name='meal_nutrition',
+            postgresql_concurrently=True,
+        )
+    op.drop_index('ix_meal_tombstones_user_id_deleted_at', table_name='meal_tombstones')
+    op.drop_table('meal_tombstones')
+    op.drop_column('meal_nutrition', 'updated_at')
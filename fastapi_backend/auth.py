@@ -1,12 +1,19 @@
 # auth.py
+import json
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from config import settings
+from cache import TieredCache, invalidate_on_commit
+from database import get_async_db
+from passwords import pwd_context
+import models
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
@@ -16,24 +23,81 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_access_token(sub: str) -> str:
+def create_access_token(sub: str, uid: Optional[int] = None) -> str:
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = {"exp": expire, "sub": sub}
+    if uid is not None:
+        to_encode["uid"] = uid
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_access_token(token: str):
+def decode_token_claims(token: str) -> Optional[dict]:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
 
+def decode_access_token(token: str):
+    payload = decode_token_claims(token)
+    return payload.get("sub") if payload else None
+
+def _credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid authentication credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 def get_current_user_email(token: str = Depends(oauth2_scheme)) -> str:
     email = decode_access_token(token)
     if not email:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_error()
     return email
+
+
+# ----------- Current user (cached) -----------
+@dataclass(frozen=True)
+class CurrentUser:
+    """ข้อมูล user ที่ handler ใช้ (ไม่ผูกกับ Session จึงเก็บใน cache ได้)"""
+    id: int
+    email: str
+
+
+# user id → CurrentUser; token ใหม่มี claim "uid" จึงไม่ต้อง query users ทุก request
+user_cache = TieredCache(
+    "user",
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    dumps=lambda u: json.dumps(asdict(u)).encode(),
+    loads=lambda raw: CurrentUser(**json.loads(raw)),
+)
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> CurrentUser:
+    claims = decode_token_claims(token)
+    email = claims.get("sub") if claims else None
+    if not email:
+        raise _credentials_error()
+
+    uid = claims.get("uid")
+    if uid is not None:
+        cached = await user_cache.aget(uid)
+        if cached is not None and cached.email == email:
+            return cached
+        cond = models.User.id == uid
+    else:
+        # token เก่าที่ยังไม่มี uid
+        cond = models.User.email == email
+    row = (await db.execute(select(models.User.id, models.User.email).where(cond))).first()
+
+    if row is None or row.email != email:
+        raise _credentials_error()
+
+    user = CurrentUser(id=row.id, email=row.email)
+    await user_cache.aset(user.id, user)
+    return user
+
+
+# แก้ / ลบ user → ลบจาก cache ทุก worker หลัง commit
+invalidate_on_commit(models.User, user_cache, lambda u: u.id)
@@ -0,0 +1,352 @@
+# cache.py
+"""cache สองชั้น: LRU ใน process + (ถ้าตั้ง REDIS_URL) ชั้นที่แชร์กันผ่าน Redis protocol
+
+- TTLCache: LRU ใน memory มีอายุ ใช้เป็นชั้นแรกของทุก cache
+- TieredCache: get ดูชั้นใน process ก่อน แล้วค่อยถาม Redis; delete จะ publish บอก worker อื่น
+  ให้ทิ้งค่าใน memory ของตัวเองด้วย (pub/sub) ไม่ต้องรอหมด TTL
+- ไม่มี REDIS_URL หรือ Redis ล่ม → ทำงานเป็น cache ใน process อย่างเดียว
+- invalidate_on_commit: ผูก model กับ cache ให้ลบ key หลัง commit (ไม่ใช่ก่อน commit
+  ที่ worker อื่นอาจโหลดค่าเก่ากลับเข้า cache ได้) ลบใน memory ทันที ส่วน Redis ทำใน thread แยก
+  (hook after_commit ของ AsyncSession รันบน event loop)
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU ใน memory มีขนาดจำกัด + อายุของแต่ละ entry (thread-safe)"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# ----------- shared tier (Redis protocol) -----------
+class SharedBackend:
+    """ห่อ client ของ redis-py (หรือตัวแทนที่ API เหมือนกัน เช่น fakeredis)
+
+    error จาก Redis ไม่ทำให้ request ล้ม: get คืน None, set/delete ข้ามไป
+    """
+
+    def __init__(self, client, prefix: str, channel: str):
+        self.client = client
+        self.prefix = prefix
+        self.channel = channel
+        self.source = uuid.uuid4().hex      # ไว้ข้ามข้อความ invalidate ที่ process นี้ส่งเอง
+        self.errors = 0
+        self._pubsub = None
+        self._thread = None
+
+    def key(self, namespace: str, key) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def _safe(self, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Shared cache unavailable (%s): %s", fn.__name__, e)
+            return None
+
+    def get(self, skey: str) -> Optional[bytes]:
+        return self._safe(self.client.get, skey)
+
+    def set(self, skey: str, value: bytes, ttl: Optional[float]):
+        self._safe(self.client.set, skey, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, skey: str):
+        self._safe(self.client.delete, skey)
+
+    def publish(self, namespace: str, key):
+        msg = json.dumps({"ns": namespace, "key": key, "src": self.source})
+        self._safe(self.client.publish, self.channel, msg)
+
+    def invalidate(self, namespace: str, key):
+        """ลบ key ใน Redis แล้วบอก worker อื่นให้ลบจาก memory"""
+        self.delete(self.key(namespace, key))
+        self.publish(namespace, key)
+
+    def start_listener(self, handler: Callable[[str, object], None]):
+        def on_message(message):
+            try:
+                data = json.loads(message["data"])
+            except (TypeError, ValueError):
+                return
+            if data.get("src") != self.source:
+                handler(data.get("ns"), data.get("key"))
+
+        try:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self.channel: on_message})
+            self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        except Exception as e:
+            logger.warning("Shared cache invalidation listener not started: %s", e)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+        if self._pubsub is not None:
+            self._safe(self._pubsub.close)
+            self._pubsub = None
+
+
+_caches: Dict[str, "TieredCache"] = {}
+_shared: Optional[SharedBackend] = None
+_shared_lock = threading.Lock()
+_shared_configured = False
+
+
+def _on_remote_invalidate(namespace: str, key):
+    cache = _caches.get(namespace)
+    if cache is not None:
+        cache._invalidate_local(key)
+
+
+def set_shared_client(client):
+    """ใช้ client ที่สร้างเอง (เช่น fakeredis ตอนทดสอบ) แทนการต่อจาก REDIS_URL; None = ปิดชั้น shared"""
+    global _shared, _shared_configured
+    with _shared_lock:
+        if _shared is not None:
+            _shared.stop()
+        _shared = None
+        if client is not None:
+            _shared = SharedBackend(client, settings.CACHE_KEY_PREFIX, f"{settings.CACHE_KEY_PREFIX}:invalidate")
+            _shared.start_listener(_on_remote_invalidate)
+        _shared_configured = True
+
+
+def get_shared() -> Optional[SharedBackend]:
+    if not _shared_configured:
+        client = None
+        if settings.REDIS_URL:
+            import redis  # optional dependency: ต้องใช้เมื่อตั้ง REDIS_URL เท่านั้น
+
+            client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=settings.REDIS_TIMEOUT_SECONDS)
+        set_shared_client(client)
+    return _shared
+
+
+def shutdown():
+    global _invalidator
+    with _invalidator_lock:
+        invalidator, _invalidator = _invalidator, None
+    if invalidator is not None:
+        invalidator.shutdown(wait=True)     # ส่ง invalidation ที่ค้างให้ครบก่อนปิด client
+    set_shared_client(None)
+
+
+# ----------- background invalidation (หลัง commit) -----------
+# thread เดียว: DELETE / PUBLISH ของ key เดียวกันออกไปตามลำดับ commit
+_invalidator: Optional[ThreadPoolExecutor] = None
+_invalidator_lock = threading.Lock()
+
+
+def _submit_invalidation(fn, *args):
+    global _invalidator
+    with _invalidator_lock:
+        if _invalidator is None:
+            _invalidator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-invalidate")
+        return _invalidator.submit(fn, *args)
+
+
+def wait_invalidations(timeout: Optional[float] = None):
+    """รอให้ invalidation ที่ส่งเข้า thread ก่อนหน้านี้เสร็จ (ใช้ใน test / script)"""
+    if _invalidator is not None:
+        _submit_invalidation(lambda: None).result(timeout)
+
+
+def _json_dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class TieredCache:
+    """cache ต่อ namespace: TTLCache ใน process → Redis (ถ้ามี)
+
+    ค่าที่เก็บต้องแปลงด้วย dumps/loads ได้ (ค่าเริ่มต้น JSON)
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float, shared_ttl: Optional[float] = None,
+                 dumps: Callable = _json_dumps, loads: Callable = json.loads):
+        self.namespace = namespace
+        self.local = TTLCache(maxsize, ttl)
+        self.shared_ttl = shared_ttl if shared_ttl is not None else ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.shared_hits = 0
+        self._listeners: List[Callable] = []
+        # key ที่ยังลบจาก Redis ไม่เสร็จ (ทำใน thread หลัง commit): ระหว่างนั้นไม่อ่านค่าเก่าจาก Redis กลับมา
+        self._pending: Dict[object, int] = {}
+        self._pending_lock = threading.Lock()
+        _caches[namespace] = self
+
+    # ----------- sync API -----------
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        shared = get_shared()
+        if shared is None or key in self._pending:
+            return default
+        raw = shared.get(shared.key(self.namespace, key))
+        if raw is None:
+            return default
+        value = self.loads(raw)
+        self.shared_hits += 1
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        shared = get_shared()
+        if shared is not None:
+            shared.set(shared.key(self.namespace, key), self.dumps(value), self.shared_ttl)
+
+    def delete(self, key):
+        """ลบทุกชั้น และบอก worker อื่นให้ลบจาก memory ของตัวเอง"""
+        self._invalidate_local(key)
+        shared = get_shared()
+        if shared is not None:
+            shared.invalidate(self.namespace, key)
+
+    # ----------- async API (ชั้น shared รันใน threadpool ไม่ block event loop) -----------
+    async def aget(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING or get_shared() is None:
+            return default if value is _MISSING else value
+        return await run_in_threadpool(self.get, key, default)
+
+    async def aset(self, key, value):
+        if get_shared() is None:
+            self.local.set(key, value)
+        else:
+            await run_in_threadpool(self.set, key, value)
+
+    async def adelete(self, key):
+        if get_shared() is None:
+            self._invalidate_local(key)
+        else:
+            await run_in_threadpool(self.delete, key)
+
+    # ----------- invalidation -----------
+    def on_invalidate(self, callback: Callable[[object], None]):
+        """เรียก callback(key) เมื่อ key ถูกลบ (จาก process นี้หรือ worker อื่น)"""
+        self._listeners.append(callback)
+
+    def _invalidate_local(self, key):
+        self.local.delete(key)
+        for cb in self._listeners:
+            cb(key)
+
+    def delete_after_commit(self, key):
+        """ลบใน memory ทันที ส่วน Redis ส่งเข้า thread: ไม่ block event loop และไม่ต่อ Redis ใน hook"""
+        self._invalidate_local(key)
+        if _shared_configured and _shared is None:
+            return
+        with self._pending_lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+        _submit_invalidation(self._delete_shared, key)
+
+    def _delete_shared(self, key):
+        try:
+            # ยังไม่เคยต่อ Redis (เช่น script ที่ไม่ผ่าน lifespan) ก็ต่อใน thread นี้
+            shared = get_shared()
+            if shared is not None:
+                shared.invalidate(self.namespace, key)
+        finally:
+            with self._pending_lock:
+                if self._pending[key] > 1:
+                    self._pending[key] -= 1
+                else:
+                    del self._pending[key]
+
+    def stats(self) -> dict:
+        shared = _shared
+        return {
+            **self.local.stats(),
+            "shared": shared is not None,
+            "shared_hits": self.shared_hits,
+            "shared_errors": shared.errors if shared is not None else 0,
+        }
+
+
+# ----------- ORM → cache invalidation -----------
+_PENDING = "_cache_invalidations"
+
+
+def invalidate_on_commit(model, cache: TieredCache, key_fn: Callable):
+    """ลบ key_fn(row) ออกจาก cache หลัง commit เมื่อแถวของ model ถูก insert / update / delete"""
+
+    def _mark(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(_PENDING, set()).add((cache.namespace, key_fn(target)))
+
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, _mark)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidations(session):
+    for namespace, key in session.info.pop(_PENDING, ()):
+        cache = _caches.get(namespace)
+        if cache is not None:
+            cache.delete_after_commit(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_invalidations(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,67 @@
+# class_menu.py
+"""map class id ของ YOLO → แถว Menu (โภชนาการ) คำนวณไว้ล่วงหน้า
+
+ใช้ตอน /yolo/predict?include_nutrition=true ให้ client ไม่ต้องยิง /menu?search= ตามอีกรอบ
+จับคู่ด้วย menu_index ตัวเดียวกับ /menu (ชื่อ class → ผลอันดับแรก) แล้วสร้างใหม่เมื่อ
+version ของ model หรือของ menu index เปลี่ยน
+"""
+import logging
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from menu_index import menu_index
+from model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+# ชื่อ class มักเป็น "pad_thai" / "khao-man-kai"
+_SEPARATORS = re.compile(r"[_\-]+")
+
+
+def _query_for(class_name: str) -> str:
+    return _SEPARATORS.sub(" ", class_name).strip()
+
+
+class ClassMenuMap:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._map: Dict[int, Optional[dict]] = {}
+        self._key: Optional[Tuple[str, int]] = None
+
+    def _current_key(self) -> Tuple[str, int]:
+        return registry.version, menu_index.version
+
+    def refresh(self, db: Session) -> Dict[int, Optional[dict]]:
+        """สร้าง map ใหม่ถ้า model หรือตาราง menu เปลี่ยน (เรียกจาก thread ได้)"""
+        menu_index.ensure_loaded(db)
+        key = self._current_key()
+        if key == self._key:
+            return self._map
+        with self._lock:
+            if key != self._key:
+                mapping = {}
+                for cls_id, name in registry.class_names.items():
+                    rows, _ = menu_index.search(_query_for(name), limit=1)
+                    mapping[int(cls_id)] = rows[0] if rows else None
+                missing = [registry.class_names[c] for c, row in mapping.items() if row is None]
+                if missing:
+                    logger.warning("No menu row for YOLO classes: %s", ", ".join(missing))
+                self._map, self._key = mapping, key
+            return self._map
+
+    def lookup(self, detections, mapping: Dict[int, Optional[dict]]):
+        """แถวโภชนาการของแต่ละ class ที่เจอ (ไม่ซ้ำ เรียงตามลำดับที่พบ)"""
+        seen, out = set(), []
+        for d in detections:
+            cls_id = int(d["cls"])
+            if cls_id in seen:
+                continue
+            seen.add(cls_id)
+            out.append({"cls": cls_id, "label": d.get("label"), "menu": mapping.get(cls_id)})
+        return out
+
+
+class_menu = ClassMenuMap()
@@ -4,10 +4,84 @@ from typing import List
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # ว่าง = ใช้ DATABASE_URL เปลี่ยน driver เป็น asyncpg / aiosqlite
+    ASYNC_DATABASE_URL: str = ""
+    # connection pool (ต่อ engine ต่อ process)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800         # วินาที; ปิด connection เก่ากว่านี้ก่อนโดน server/proxy ตัด
+    DB_POOL_TIMEOUT: float = 30
+    # สร้างตารางที่ยังไม่มีตอน startup (production ใช้ alembic upgrade head แล้วปิดได้)
+    DB_CREATE_ALL: bool = True
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # bcrypt: cost + process pool สำหรับ hash/verify (ดู passwords.py)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    PASSWORD_HASH_NICE: int = 10        # priority ของ process hash ต่ำกว่า API (0 = เท่ากัน)
+    # menu search index (menu_index.py)
+    MENU_INDEX_TTL_SECONDS: float = 300
+    MENU_SEARCH_MIN_SCORE: float = 120
+    MENU_CACHE_MAX_AGE_SECONDS: int = 300   # Cache-Control ของ GET /menu
+    # shared cache (cache.py): ว่าง = cache ใน process อย่างเดียว เช่น redis://localhost:6379/0
+    REDIS_URL: str = ""
+    REDIS_TIMEOUT_SECONDS: float = 0.5
+    CACHE_KEY_PREFIX: str = "nutrition"
+    # cache GET /profiles/me
+    PROFILE_CACHE_SIZE: int = 10000
+    PROFILE_CACHE_TTL_SECONDS: float = 300
+    # cache user ของ token (get_current_user)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 300
     # อนุญาตหลาย origin แยกด้วยคอมมา
     CORS_ORIGINS: str = "*"
+    # timezone ตั้งต้นที่ใช้นับ "วัน" ของ meal (ส่ง ?tz= มาเปลี่ยนได้)
+    APP_TIMEZONE: str = "Asia/Bangkok"
+    # POST /meals/batch: created_at จาก client (บันทึกตอน offline) เก่าได้ไม่เกินกี่วัน เกินกว่านั้นปัดเป็นขอบ
+    MEAL_BATCH_MAX_AGE_DAYS: int = 30
+
+    # รูปย่อของไฟล์ใน uploads (thumbnails.py) ขนาด = ด้านยาวสุด (px)
+    THUMBNAIL_SIZES: List[int] = [64, 256, 512]
+    THUMBNAIL_QUALITY: int = 80
+
+    # production launcher (gunicorn -c gunicorn.conf.py main:app)
+    WEB_BIND: str = "0.0.0.0:8000"
+    WEB_WORKERS: int = 2
+    # true = ผูกแต่ละ worker กับชุด core ของตัวเอง (Linux) ไม่ให้ thread ของ torch แย่ง core กัน
+    WORKER_CPU_AFFINITY: bool = False
+
+    # False = worker นี้เป็น API อย่างเดียว ไม่ import / โหลด model (ไม่มี /yolo/*)
+    ENABLE_INFERENCE: bool = True
+    # YOLO model
+    YOLO_MODEL_PATH: str = "models/best.pt"
+    # torch / onnx / openvino (onnx, openvino ต้อง export ก่อน: python detector_backends.py export)
+    YOLO_BACKEND: str = "torch"
+    YOLO_QUANTIZED: bool = False        # ใช้ไฟล์ int8 ที่ export ไว้
+    YOLO_INTRA_OP_THREADS: int = 0      # 0 = ให้ runtime เลือกเอง (gunicorn.conf.py: core ÷ จำนวน worker)
+    YOLO_INTER_OP_THREADS: int = 0
+    YOLO_IMGSZ: int = 640
+    YOLO_WARMUP: bool = True
+    # เก็บสำเนา JPEG ย่อของรูปที่ส่งมา detect (ใช้เป็นรูปอาหาร / render overlay)
+    YOLO_ARCHIVE_UPLOADS: bool = True
+    YOLO_ARCHIVE_MAX_SIDE: int = 1600
+    YOLO_ARCHIVE_QUALITY: int = 85
+    # จำนวน detection ล่าสุดที่เก็บไว้ render overlay และจำนวนรูป overlay สูงสุดใน results/runs
+    YOLO_DETECTION_CACHE_SIZE: int = 2048
+    YOLO_PREDICTION_SHARED_TTL_SECONDS: float = 7 * 24 * 3600   # อายุผล prediction ใน Redis
+    # เก็บผล prediction เป็น JSON ใน results/predictions ด้วย (อยู่รอดข้าม restart เมื่อไม่มี Redis)
+    YOLO_PREDICTION_DISK_CACHE: bool = False
+    YOLO_PREDICTION_DISK_MAX_FILES: int = 20000     # รวมทุก version ของ model; เก่าสุดถูกลบก่อน
+    YOLO_RENDER_CACHE_MAX_FILES: int = 2000
+
+    # true = API worker ส่งรูปไปที่ model_server.py (process เดียวถือ model) แทนโหลด model เอง
+    YOLO_MODEL_SERVER: bool = False
+    YOLO_MODEL_SERVER_SOCKET: str = "/tmp/nutrition-yolo.sock"
+    YOLO_MODEL_SERVER_TIMEOUT: float = 30.0
+
+    # YOLO inference scheduler (micro-batching)
+    YOLO_MAX_BATCH_SIZE: int = 8
+    YOLO_MAX_WAIT_MS: float = 15.0
 
     class Config:
         env_file = ".env"
@@ -1,19 +1,23 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import models, schemas
 from schemas import UserCreate
 from auth import get_password_hash
+from cache import TieredCache, invalidate_on_commit
+from config import settings
 import math
 from datetime import date
+from typing import Optional
 
 
 # ==========================================
 # 🔹 Helper Functions สำหรับคำนวณค่าโภชนาการ
 # ==========================================
 
-def calculate_age(dob: date):
+def calculate_age(dob: date, today: Optional[date] = None):
     if not dob:
         return None
-    today = date.today()
+    today = today or date.today()
     age = today.year - dob.year
     if (today.month, today.day) < (dob.month, dob.day):
         age -= 1
@@ -57,7 +61,7 @@ def calc_tdee(bmr, lifestyle):
 def calc_macro(goal, weight, tdee):
     """คำนวณโปรตีน คาร์บ ไขมันตามเป้าหมายสุขภาพ"""
     if not tdee or not weight:
-        return None, None, None
+        return None, None, None, None
 
     # Default
     protein_per_kg = 1.4
@@ -94,28 +98,46 @@ def calc_macro(goal, weight, tdee):
 # ==========================================
 # 🔹 User CRUD
 # ==========================================
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(models.User).where(models.User.email == email))
 
 
-def create_user(db: Session, user: UserCreate):
-    hashed_pw = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: UserCreate, hashed_password: Optional[str] = None):
+    hashed_pw = hashed_password or get_password_hash(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_pw)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def update_password_hash(db: AsyncSession, db_user: models.User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    await db.commit()
     return db_user
 
 
 # ==========================================
 # 🔹 Profile CRUD
 # ==========================================
-def get_profile_by_user(db: Session, user_id: int):
-    return db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
+# user_id → {"version": [...], "data": ProfileOut แบบ JSON} ของ GET /profiles/me
+profile_cache = TieredCache(
+    "profile",
+    maxsize=settings.PROFILE_CACHE_SIZE,
+    ttl=settings.PROFILE_CACHE_TTL_SECONDS,
+)
+invalidate_on_commit(models.Profile, profile_cache, lambda p: p.user_id)
+
+
+async def get_profile_by_user(db: AsyncSession, user_id: int):
+    return await db.scalar(select(models.Profile).where(models.Profile.user_id == user_id))
+
 
+def _apply_health_calculation(profile_dict, today: Optional[date] = None):
+    """ทำให้ backend คำนวณค่า BMR / BMI / TDEE / Macro ให้เอง
 
-def _apply_health_calculation(profile_dict):
-    """ทำให้ backend คำนวณค่า BMR / BMI / TDEE / Macro ให้เอง"""
+    สูตรเดียวกับ recompute_targets.py (แบบ vectorized) แก้ที่นี่ต้องแก้ที่นั่นด้วย
+    """
 
     gender = profile_dict.get("gender")
     height = profile_dict.get("height")
@@ -125,7 +147,7 @@ def _apply_health_calculation(profile_dict):
     lifestyle = profile_dict.get("lifestyle", "light")
 
     # AGE
-    age = calculate_age(dob)
+    age = calculate_age(dob, today)
 
     # BMI
     bmi = calc_bmi(current_weight, height)
@@ -151,7 +173,7 @@ def _apply_health_calculation(profile_dict):
     return profile_dict
 
 
-def create_profile(db: Session, user_id: int, data: schemas.ProfileCreate):
+async def create_profile(db: AsyncSession, user_id: int, data: schemas.ProfileCreate):
     payload = data.model_dump(exclude_unset=False)
 
     # คำนวณ BMI, BMR, TDEE, Macro
@@ -159,13 +181,13 @@ def create_profile(db: Session, user_id: int, data: schemas.ProfileCreate):
 
     prof = models.Profile(user_id=user_id, **payload)
     db.add(prof)
-    db.commit()
-    db.refresh(prof)
+    await db.commit()
+    await db.refresh(prof)
     return prof
 
 
-def patch_profile(db: Session, user_id: int, data: schemas.ProfileUpdate):
-    prof = get_profile_by_user(db, user_id)
+async def patch_profile(db: AsyncSession, user_id: int, data: schemas.ProfileUpdate):
+    prof = await get_profile_by_user(db, user_id)
     if not prof:
         return None
 
@@ -181,13 +203,13 @@ def patch_profile(db: Session, user_id: int, data: schemas.ProfileUpdate):
     for k, v in final_payload.items():
         setattr(prof, k, v)
 
-    db.commit()
-    db.refresh(prof)
+    await db.commit()
+    await db.refresh(prof)
     return prof
 
 
-def update_profile(db: Session, user_id: int, data: schemas.ProfileUpdate):
-    prof = get_profile_by_user(db, user_id)
+async def update_profile(db: AsyncSession, user_id: int, data: schemas.ProfileUpdate):
+    prof = await get_profile_by_user(db, user_id)
     if not prof:
         return None
 
@@ -201,6 +223,6 @@ def update_profile(db: Session, user_id: int, data: schemas.ProfileUpdate):
     for k, v in final_payload.items():
         setattr(prof, k, v)
 
-    db.commit()
-    db.refresh(prof)
+    await db.commit()
+    await db.refresh(prof)
     return prof
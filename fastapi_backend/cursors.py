@@ -0,0 +1,47 @@
+# cursors.py
+"""cursor แบบ opaque สำหรับ keyset pagination / delta sync
+
+cursor คือค่าของ key ที่ใช้เรียง (เช่น (created_at, id) / (change_xid, id)) ของแถวสุดท้ายที่ส่งไปแล้ว
+เข้ารหัสเป็น base64url ของ JSON ให้ client เก็บ/ส่งกลับมาโดยไม่ต้องรู้รูปแบบข้างใน
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = json.dumps([ts.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        ts = datetime.fromisoformat(ts)
+        if ts.tzinfo is None:
+            raise ValueError("cursor timestamp must be timezone-aware")
+        return ts, int(row_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_change_cursor(xid: int, row_id: int) -> str:
+    raw = json.dumps([xid, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_change_cursor(cursor: str) -> Tuple[int, int]:
+    # cursor แบบเวลาเดิม ([iso timestamp, id]) ไม่ผ่าน → 400 ให้ client เริ่ม sync ใหม่
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        xid, row_id = json.loads(raw)
+        if not isinstance(xid, int) or not isinstance(row_id, int):
+            raise ValueError("change cursor must be two integers")
+        return xid, row_id
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -1,12 +1,43 @@
 # database.py
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from config import settings
+from metrics import TimedAsyncQueuePool, TimedQueuePool
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+# driver async ของแต่ละ backend (DATABASE_URL ใช้ driver sync เดิมได้ เช่น postgresql://)
+_ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    u = make_url(url)
+    driver = _ASYNC_DRIVERS.get(u.get_backend_name())
+    if driver is None:
+        return url
+    return u.set(drivername=f"{u.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def _pool_options(url: str, poolclass) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": poolclass,     # จับเวลารอ checkout connection (metrics.py)
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+
+# ----------- sync (script / alembic / งานใน threadpool เช่น yolo) -----------
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, **_pool_options(DATABASE_URL, TimedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -16,3 +47,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ----------- async (routers ที่เป็น I/O ล้วน) -----------
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True, **_pool_options(ASYNC_DATABASE_URL, TimedAsyncQueuePool))
+# expire_on_commit=False: หลัง commit ยังอ่าน attribute ได้โดยไม่ lazy-load (lazy-load ใน async ไม่ได้)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,351 @@
+# detector_backends.py
+"""Inference backend ของ food detector
+
+ทุก backend คืนผลรูปแบบเดียวกันต่อรูป:
+    {"detections": [{"cls", "conf", "box": [x1, y1, x2, y2]}, ...],
+     "orig_shape": (h, w), "speed": {"preprocess", "inference", "postprocess"} (ms)}
+
+- torch     : ultralytics + PyTorch (ค่าเดิม)
+- onnx      : ONNX Runtime ตรง ๆ (ตั้ง intra/inter-op threads ได้) รองรับ int8
+- openvino  : โฟลเดอร์ที่ export ด้วย ultralytics (format="openvino")
+
+CLI:
+    python detector_backends.py export [--int8]
+    python detector_backends.py parity fixtures/ --backend onnx
+"""
+import ast
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+def _names_dict(names) -> Dict[int, str]:
+    if isinstance(names, str):
+        names = ast.literal_eval(names)
+    if isinstance(names, (list, tuple)):
+        names = dict(enumerate(names))
+    return {int(k): str(v) for k, v in names.items()}
+
+
+# =========================
+# ULTRALYTICS (torch / openvino)
+# =========================
+class UltralyticsBackend:
+    def __init__(self, weights: str, task: str = "detect"):
+        from ultralytics import YOLO
+
+        self.model = YOLO(str(weights), task=task)
+        self.names = _names_dict(self.model.names)
+
+    def predict(self, sources: Sequence, conf: float = 0.25, imgsz: int = 640) -> List[dict]:
+        results = self.model.predict(source=list(sources), conf=conf, imgsz=imgsz, save=False, verbose=False)
+        out = []
+        for r in results:
+            dets = []
+            for b in r.boxes:
+                x1, y1, x2, y2 = map(float, b.xyxy[0])
+                dets.append({"cls": int(b.cls[0]), "conf": float(b.conf[0]), "box": [x1, y1, x2, y2]})
+            out.append({
+                "detections": dets,
+                "orig_shape": tuple(int(v) for v in r.orig_shape[:2]),
+                "speed": dict(r.speed),
+            })
+        return out
+
+
+# =========================
+# ONNX RUNTIME
+# =========================
+def _load_bgr(src) -> np.ndarray:
+    if isinstance(src, np.ndarray):
+        return src
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as im:
+        rgb = np.asarray(ImageOps.exif_transpose(im).convert("RGB"))
+    return np.ascontiguousarray(rgb[:, :, ::-1])
+
+
+def _letterbox(img: np.ndarray, size: int):
+    """resize คงสัดส่วน + pad สีเทา 114 แบบเดียวกับ ultralytics"""
+    from PIL import Image
+
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    if (nw, nh) != (w, h):
+        img = np.asarray(Image.fromarray(img).resize((nw, nh), Image.BILINEAR))
+    pad_w, pad_h = (size - nw) / 2, (size - nh) / 2
+    left, top = int(round(pad_w - 0.1)), int(round(pad_h - 0.1))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = img
+    return canvas, r, (left, top)
+
+
+def _nms(boxes: np.ndarray, scores: np.ndarray, iou_thres: float) -> List[int]:
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = (xx2 - xx1).clip(0) * (yy2 - yy1).clip(0)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][iou <= iou_thres]
+    return keep
+
+
+class OnnxBackend:
+    def __init__(self, onnx_path: str, intra_op_threads: int = 0, inter_op_threads: int = 0,
+                 iou: float = 0.7, max_det: int = 300):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            opts.intra_op_num_threads = intra_op_threads
+        if inter_op_threads > 0:
+            opts.inter_op_num_threads = inter_op_threads
+            opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.session = ort.InferenceSession(str(onnx_path), sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = _names_dict(meta.get("names", "{}"))
+        self.iou = iou
+        self.max_det = max_det
+
+        # export แบบ dynamic=False จะรับ batch ได้ทีละ 1
+        batch_dim = self.session.get_inputs()[0].shape[0]
+        self.fixed_batch = batch_dim if isinstance(batch_dim, int) else None
+
+    def _postprocess(self, pred: np.ndarray, conf: float, ratio: float, pad, orig_shape) -> List[dict]:
+        # pred: (4 + nc, anchors) → (anchors, 4 + nc)
+        pred = pred.T
+        scores_all = pred[:, 4:]
+        cls = scores_all.argmax(1)
+        scores = scores_all[np.arange(len(cls)), cls]
+        mask = scores > conf
+        if not mask.any():
+            return []
+        xywh, cls, scores = pred[mask, :4], cls[mask], scores[mask]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+
+        # NMS แยก class: เลื่อน box ตาม class id ไม่ให้ข้าม class ทับกัน
+        offset = cls[:, None].astype(np.float32) * 7680.0
+        keep = _nms(boxes + offset, scores, self.iou)[: self.max_det]
+
+        h, w = orig_shape
+        boxes = boxes[keep]
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / ratio).clip(0, w)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / ratio).clip(0, h)
+
+        return [
+            {"cls": int(c), "conf": float(s), "box": [float(v) for v in b]}
+            for b, c, s in zip(boxes, cls[keep], scores[keep])
+        ]
+
+    def predict(self, sources: Sequence, conf: float = 0.25, imgsz: int = 640) -> List[dict]:
+        t0 = time.perf_counter()
+        images = [_load_bgr(s) for s in sources]
+        boxed = [_letterbox(im, imgsz) for im in images]
+        # BGR HWC uint8 → RGB CHW float32 0..1
+        batch = np.stack([b[0] for b in boxed])[..., ::-1].transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+        t1 = time.perf_counter()
+
+        if self.fixed_batch == 1:
+            preds = np.concatenate(
+                [self.session.run(None, {self.input_name: batch[i:i + 1]})[0] for i in range(len(batch))]
+            )
+        else:
+            preds = self.session.run(None, {self.input_name: batch})[0]
+        t2 = time.perf_counter()
+
+        out = []
+        for pred, im, (_, ratio, pad) in zip(preds, images, boxed):
+            out.append({"detections": self._postprocess(pred, conf, ratio, pad, im.shape[:2]),
+                        "orig_shape": im.shape[:2]})
+        t3 = time.perf_counter()
+
+        n = max(1, len(out))
+        speed = {
+            "preprocess": (t1 - t0) * 1000 / n,
+            "inference": (t2 - t1) * 1000 / n,
+            "postprocess": (t3 - t2) * 1000 / n,
+        }
+        for o in out:
+            o["speed"] = speed
+        return out
+
+
+# =========================
+# FACTORY / EXPORT
+# =========================
+def onnx_path_for(weights: str, int8: bool = False) -> Path:
+    p = Path(weights).with_suffix(".onnx")
+    return p.with_name(p.stem + ".int8.onnx") if int8 else p
+
+
+def set_torch_threads(intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """จำกัด thread ของ PyTorch (0 = ค่าเดิมของ torch คือเท่าจำนวน core)"""
+    import torch
+
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            # ตั้งได้ครั้งเดียวก่อนมีงาน parallel (เช่น process นี้ตั้งไว้แล้ว / รัน inference ไปแล้ว)
+            pass
+
+
+def create_backend(kind: str, weights: str, intra_op_threads: int = 0, inter_op_threads: int = 0):
+    kind = (kind or "torch").lower()
+    if kind == "torch":
+        if intra_op_threads > 0 or inter_op_threads > 0:
+            set_torch_threads(intra_op_threads, inter_op_threads)
+        return UltralyticsBackend(weights)
+    if kind == "onnx":
+        return OnnxBackend(weights, intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+    if kind == "openvino":
+        return UltralyticsBackend(weights)
+    raise ValueError(f"unknown YOLO backend: {kind!r}")
+
+
+def export_onnx(weights: str, imgsz: int = 640, int8: bool = False) -> Path:
+    """export best.pt → best.onnx (batch แบบ dynamic) และ best.int8.onnx ถ้าขอ int8"""
+    from ultralytics import YOLO
+
+    fp32 = Path(YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True))
+    if not int8:
+        return fp32
+
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    out = onnx_path_for(weights, int8=True)
+    quantize_dynamic(str(fp32), str(out), weight_type=QuantType.QUInt8)
+
+    # quantize ไม่ copy metadata (ชื่อ class) มาด้วย
+    src, dst = onnx.load(str(fp32)), onnx.load(str(out))
+    del dst.metadata_props[:]
+    dst.metadata_props.extend(src.metadata_props)
+    onnx.save(dst, str(out))
+    return out
+
+
+def export_openvino(weights: str, imgsz: int = 640, int8: bool = False) -> Path:
+    from ultralytics import YOLO
+
+    return Path(YOLO(weights).export(format="openvino", imgsz=imgsz, int8=int8))
+
+
+# =========================
+# PARITY CHECK
+# =========================
+def _iou(a, b) -> float:
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare_detections(ref: List[dict], other: List[dict], min_iou: float = 0.9, conf_tol: float = 0.05) -> List[str]:
+    """เทียบผลสอง backend: ทุก box ใน ref ต้องมีคู่ class เดียวกันที่ IoU/conf ใกล้เคียง"""
+    problems = []
+    unmatched = list(other)
+    for d in ref:
+        best, best_iou = None, 0.0
+        for o in unmatched:
+            if o["cls"] != d["cls"]:
+                continue
+            iou = _iou(d["box"], o["box"])
+            if iou > best_iou:
+                best, best_iou = o, iou
+        if best is None or best_iou < min_iou:
+            problems.append(f"no match for cls={d['cls']} conf={d['conf']:.3f} (best IoU {best_iou:.3f})")
+            continue
+        unmatched.remove(best)
+        if abs(best["conf"] - d["conf"]) > conf_tol:
+            problems.append(f"cls={d['cls']} conf {d['conf']:.3f} vs {best['conf']:.3f}")
+    for o in unmatched:
+        # box ที่ conf ใกล้ threshold อาจโผล่ฝั่งเดียวได้
+        if o["conf"] > 0.25 + conf_tol:
+            problems.append(f"extra box cls={o['cls']} conf={o['conf']:.3f}")
+    return problems
+
+
+def run_parity(images_dir: str, kind: str, weights: str, ref_weights: str, imgsz: int = 640,
+               min_iou: float = 0.9, conf_tol: float = 0.05) -> int:
+    exts = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+    images = sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in exts)
+    ref = create_backend("torch", ref_weights)
+    other = create_backend(kind, weights)
+
+    failed = 0
+    for img in images:
+        a = ref.predict([str(img)], imgsz=imgsz)[0]["detections"]
+        b = other.predict([str(img)], imgsz=imgsz)[0]["detections"]
+        problems = compare_detections(a, b, min_iou=min_iou, conf_tol=conf_tol)
+        status = "ok" if not problems else "FAIL"
+        print(f"{status:4} {img.name}: torch={len(a)} {kind}={len(b)}")
+        for p in problems:
+            print(f"     - {p}")
+        failed += bool(problems)
+
+    print(f"{len(images) - failed}/{len(images)} images match")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from config import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_exp = sub.add_parser("export", help="export weights สำหรับ CPU backend")
+    p_exp.add_argument("--weights", default=settings.YOLO_MODEL_PATH)
+    p_exp.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    p_exp.add_argument("--int8", action="store_true")
+    p_exp.add_argument("--imgsz", type=int, default=settings.YOLO_IMGSZ)
+
+    p_par = sub.add_parser("parity", help="เทียบผล backend กับ PyTorch บนชุดรูป")
+    p_par.add_argument("images")
+    p_par.add_argument("--backend", choices=["onnx", "openvino"], default="onnx")
+    p_par.add_argument("--weights", default=None, help="ค่าเริ่มต้น: ไฟล์ที่ export จาก --ref-weights")
+    p_par.add_argument("--ref-weights", default=settings.YOLO_MODEL_PATH)
+    p_par.add_argument("--imgsz", type=int, default=settings.YOLO_IMGSZ)
+    p_par.add_argument("--min-iou", type=float, default=0.9)
+    p_par.add_argument("--conf-tol", type=float, default=0.05)
+
+    args = parser.parse_args()
+    if args.cmd == "export":
+        if args.format == "onnx":
+            print(export_onnx(args.weights, imgsz=args.imgsz, int8=args.int8))
+        else:
+            print(export_openvino(args.weights, imgsz=args.imgsz, int8=args.int8))
+    else:
+        weights = args.weights
+        if weights is None:
+            weights = str(onnx_path_for(args.ref_weights)) if args.backend == "onnx" \
+                else str(Path(args.ref_weights).with_suffix("")) + "_openvino_model"
+        sys.exit(run_parity(args.images, args.backend, weights, args.ref_weights, imgsz=args.imgsz,
+                            min_iou=args.min_iou, conf_tol=args.conf_tol))
@@ -0,0 +1,66 @@
+# etag.py
+"""ETag แบบ weak + If-None-Match → 304 สำหรับ GET ที่ client เรียกซ้ำบ่อย
+
+ใช้เป็น dependency:
+
+    cond: Conditional = Depends()
+    ...
+    not_modified = cond.check("profile", row.id, row.updated_at)
+    if not_modified:
+        return not_modified
+
+ค่าที่ส่งให้ check() ควรเป็น "version" ของข้อมูล (id + updated_at, จำนวนแถว + เวลาแก้ล่าสุด ฯลฯ)
+ที่ query ได้ถูกกว่าการโหลดและ serialize ข้อมูลทั้งก้อน
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# ข้อมูลส่วนตัว: cache ได้เฉพาะฝั่ง client และต้องถาม server ทุกครั้ง (ได้ 304 ถ้าไม่เปลี่ยน)
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match ใช้ weak comparison (RFC 9110 13.1.2)
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(t) for t in if_none_match.split(",")}
+
+
+class Conditional:
+    def __init__(self, request: Request, response: Response):
+        self.request = request
+        self.response = response
+        self.etag: Optional[str] = None
+
+    def check(self, *parts, cache_control: str = PRIVATE_REVALIDATE) -> Optional[Response]:
+        """ตั้ง ETag/Cache-Control ให้ response; คืน 304 ถ้า client มีรุ่นนี้อยู่แล้ว
+
+        ETag รวม path + query string (เรียง param แล้ว) เสมอ: filter ใน URL ทุกตัว (date, tz, ...)
+        ได้ ETag คนละค่ากันแม้ handler ไม่ได้ส่งมาใน parts
+        """
+        query = sorted(self.request.query_params.multi_items())
+        self.etag = weak_etag(self.request.url.path, query, *parts)
+        headers = {"ETag": self.etag, "Cache-Control": cache_control}
+        self.response.headers.update(headers)
+        if etag_matches(self.request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return None
+
+    @property
+    def headers(self) -> dict:
+        """header ที่ตั้งไว้ (ใช้ตอน handler คืน Response เองแทน response_model)"""
+        return {k: self.response.headers[k] for k in ("ETag", "Cache-Control") if k in self.response.headers}
@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+"""production launcher:  gunicorn -c gunicorn.conf.py main:app
+
+- preload_app: master import main แล้วโหลด weights (torch) ก่อน fork → ทุก worker ใช้หน้า memory
+  ของ weights ชุดเดียวกันแบบ copy-on-write แทนที่จะโหลดคนละชุด
+- master ไม่รัน inference (thread pool ของ torch / OpenMP ใช้ต่อหลัง fork ไม่ได้)
+  warm-up ทำใน lifespan ของแต่ละ worker หลังตั้ง thread แล้ว
+- thread และ CPU affinity ต่อ worker มาจาก config.Settings (ดู worker_tuning.py)
+  WEB_WORKERS, WEB_BIND, YOLO_INTRA_OP_THREADS, YOLO_INTER_OP_THREADS, WORKER_CPU_AFFINITY
+"""
+from config import settings
+import worker_tuning
+
+bind = settings.WEB_BIND
+workers = settings.WEB_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# โหลด / warm-up model ใน lifespan ใช้เวลานานกว่า default 30 วินาทีได้
+timeout = 120
+graceful_timeout = 30
+
+# ต้องตั้งก่อน preload import numpy / torch
+worker_tuning.limit_thread_env(workers)
+
+
+def when_ready(server):
+    # master หลัง preload app แล้ว ก่อน fork worker ตัวแรก
+    if not worker_tuning.should_preload_model():
+        return
+    from model_registry import registry
+
+    try:
+        registry.get()
+    except Exception:
+        # worker จะลองโหลดเองตอน lifespan
+        server.log.exception("Could not preload YOLO weights in master")
+        return
+    server.log.info("Preloaded YOLO weights %s (version %s)", registry.weights_path, registry.version)
+
+
+def pre_fork(server, worker):
+    # worker ที่ตายแล้วถูก fork ใหม่ได้ช่อง (ชุด core) ที่ว่างอยู่ ไม่ไปซ้อนกับตัวที่ยังรันอยู่
+    used = {getattr(w, "slot", None) for w in server.WORKERS.values()}
+    worker.slot = next(i for i in range(len(used) + 1) if i not in used)
+
+
+def post_fork(server, worker):
+    plan = worker_tuning.plan(worker.slot, workers)
+    worker_tuning.apply(plan)
+    server.log.info(
+        "Worker %s slot %s: intra-op %s, inter-op %s, cores %s",
+        worker.pid, plan.slot, plan.intra_op_threads, plan.inter_op_threads, plan.cores or "all",
+    )
@@ -0,0 +1,168 @@
+# inference.py
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Sequence
+
+
+class SchedulerStopped(RuntimeError):
+    """scheduler ถูก stop (ปิด server / สลับ model) ระหว่างที่ request ยังรอคิวอยู่ หรือส่งเข้ามาหลัง stop"""
+
+
+class BatchScheduler:
+    """รวม request ที่เข้ามาพร้อมกันเป็น micro-batch แล้วรันบน worker thread แยก
+
+    `run_batch` รับ list ของ input และต้องคืน list ของผลลัพธ์ลำดับเดียวกัน
+    แต่ละ caller ได้ผลของตัวเองกลับผ่าน future
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        name: str = "inference",
+    ):
+        self._run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+        # ---- metrics ----
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._max_seen_batch = 0
+        self._batch_size_counts: Dict[int, int] = {}
+        self._busy_seconds = 0.0
+
+    # ----------- lifecycle -----------
+    def start(self):
+        with self._lock:
+            self._stopping = False
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self._worker, name=f"{self.name}-worker", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """หยุดรับงาน: batch ที่กำลังรันอยู่ทำต่อจนเสร็จ ส่วนที่ยังรอคิวได้ SchedulerStopped ทันที"""
+        with self._lock:
+            thread = self._thread
+            self._stopping = True
+            self._thread = None
+        # submit ใส่ queue ภายใต้ lock เดียวกัน: หลังจุดนี้ไม่มีงานใหม่เข้ามาอีก
+        self._fail_pending()
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _fail_pending(self):
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if entry is None:
+                continue
+            _, fut = entry
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(SchedulerStopped(f"{self.name} scheduler is stopped"))
+
+    # ----------- submit -----------
+    def submit_nowait(self, item: Any) -> Future:
+        """ส่งงานเข้าคิว (เริ่ม worker ให้ถ้ายังไม่เริ่ม) หลัง stop() แล้วจะ raise SchedulerStopped"""
+        fut: Future = Future()
+        with self._lock:
+            if self._stopping:
+                raise SchedulerStopped(f"{self.name} scheduler is stopped")
+            self._ensure_thread()
+            self._queue.put((item, fut))
+        return fut
+
+    async def submit(self, item: Any) -> Any:
+        return await asyncio.wrap_future(self.submit_nowait(item))
+
+    # ----------- worker -----------
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is None:
+                # ส่ง sentinel กลับเข้า queue ให้ loop หลักหยุด หลังรัน batch นี้เสร็จ
+                self._queue.put(None)
+                break
+            batch.append(nxt)
+        return batch
+
+    def _worker(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                if self._stopping:
+                    break
+                continue
+
+            batch = self._collect(first)
+            # caller ที่ cancel ไปแล้วไม่ต้องรัน
+            batch = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                results = list(self._run_batch([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"run_batch returned {len(results)} results for {len(batch)} inputs"
+                    )
+            except BaseException as exc:
+                self._errors += 1
+                for _, fut in batch:
+                    fut.set_exception(exc)
+            else:
+                for (_, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            finally:
+                self._record(len(batch), time.perf_counter() - started)
+
+    def _record(self, size: int, elapsed: float):
+        self._batches += 1
+        self._items += size
+        self._busy_seconds += elapsed
+        self._max_seen_batch = max(self._max_seen_batch, size)
+        self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+
+    # ----------- metrics -----------
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queue_depth": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "avg_batch_size": (self._items / self._batches) if self._batches else 0.0,
+            "max_seen_batch_size": self._max_seen_batch,
+            "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+            "busy_seconds": round(self._busy_seconds, 4),
+        }
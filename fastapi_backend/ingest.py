@@ -0,0 +1,91 @@
+# ingest.py
+import io
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# EXIF orientation ที่หมุน 90/270 องศา (กว้าง/สูงสลับกัน)
+_TRANSPOSED = {5, 6, 7, 8}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+@dataclass
+class DecodedImage:
+    """รูปที่ decode + ย่อแล้ว พร้อมส่งเข้า model (BGR, HWC, uint8 แบบเดียวกับ cv2)"""
+    array: np.ndarray
+    orig_width: int
+    orig_height: int
+
+    @property
+    def scale_x(self) -> float:
+        return self.orig_width / self.array.shape[1]
+
+    @property
+    def scale_y(self) -> float:
+        return self.orig_height / self.array.shape[0]
+
+    def to_original(self, box: List[float]) -> List[float]:
+        """แปลงพิกัด box จากรูปที่ย่อ กลับเป็นพิกัดของรูปต้นฉบับ"""
+        x1, y1, x2, y2 = box
+        sx, sy = self.scale_x, self.scale_y
+        return [x1 * sx, y1 * sy, x2 * sx, y2 * sy]
+
+
+def _open(data: bytes) -> Image.Image:
+    try:
+        return Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImage(str(e)) from e
+
+
+def _oriented_size(im: Image.Image):
+    w, h = im.size
+    if im.getexif().get(0x0112) in _TRANSPOSED:
+        return h, w
+    return w, h
+
+
+def decode_for_inference(data: bytes, target: int) -> DecodedImage:
+    """decode ครั้งเดียวใน memory แล้วย่อให้ด้านยาวไม่เกิน target (= imgsz ของ model)
+
+    JPEG ใช้ draft mode ให้ libjpeg decode ที่ 1/2, 1/4, 1/8 ของขนาดจริงได้เลย
+    รูปมือถือ 4000px จึงไม่ต้อง decode เต็มขนาดก่อนย่อ
+    """
+    with _open(data) as im:
+        orig_w, orig_h = _oriented_size(im)
+        if im.format == "JPEG":
+            im.draft("RGB", (target, target))
+        try:
+            im = ImageOps.exif_transpose(im).convert("RGB")
+        except OSError as e:
+            raise InvalidImage(str(e)) from e
+
+    if max(im.size) > target:
+        im.thumbnail((target, target), Image.BILINEAR)
+
+    # ultralytics / backend รับ numpy เป็น BGR
+    arr = np.ascontiguousarray(np.asarray(im)[:, :, ::-1])
+    return DecodedImage(arr, orig_w, orig_h)
+
+
+def decode_file(path, target: int) -> DecodedImage:
+    with open(path, "rb") as f:
+        return decode_for_inference(f.read(), target)
+
+
+def archive_copy(data: bytes, max_side: int, quality: int) -> bytes:
+    """สำเนา JPEG ขนาดย่อสำหรับเก็บไว้ (เช่นใช้เป็นรูปอาหาร / render overlay ภายหลัง)"""
+    with _open(data) as im:
+        if im.format == "JPEG":
+            im.draft("RGB", (max_side, max_side))
+        im = ImageOps.exif_transpose(im).convert("RGB")
+    if max(im.size) > max_side:
+        im.thumbnail((max_side, max_side), Image.LANCZOS)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
@@ -0,0 +1,461 @@
+# load_bench.py
+"""load test ของ API บน DATABASE_URL (Postgres) ใน process เดียว
+
+    python load_bench.py sync-vs-async --clients 500 --requests 5000
+    python load_bench.py meal-index --users 20 --meals-per-user 50000
+    python load_bench.py login-storm --readers 50 --logins 200
+    python load_bench.py keyset --meals-per-user 100000
+
+client ยิงผ่าน httpx ASGITransport (ไม่ผ่าน network / uvicorn) จึงวัดเฉพาะ app + DB
+และ client ใช้ CPU เครื่องเดียวกับ app — ใช้เทียบกันเอง ไม่ใช่ตัวเลข production
+ข้อมูลที่ seed เป็นของ user อีเมล @loadbench.example.com และถูกลบตอนจบทุกครั้ง
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional
+
+import httpx
+from sqlalchemy import text
+
+from config import settings
+import models  # noqa: F401  (create_all ต้องเห็นทุกตาราง)
+from database import Base, engine
+
+BENCH_DOMAIN = "loadbench.example.com"     # ต้องผ่าน EmailStr (โดเมน .invalid ไม่ผ่าน)
+
+
+# =========================
+# SEED / CLEANUP
+# =========================
+def seed_user(conn, name: str, hashed_password: str = "!") -> int:
+    return conn.execute(
+        text("INSERT INTO users (email, hashed_password) VALUES (:e, :p) RETURNING id"),
+        {"e": f"{name}@{BENCH_DOMAIN}", "p": hashed_password},
+    ).scalar_one()
+
+
+def seed_meals(conn, user_id: int, count: int, days: int = 365):
+    # INSERT ... SELECT generate_series: แสนแถวในไม่กี่วินาที (ไม่ผ่าน ORM)
+    conn.execute(text(
+        """
+        INSERT INTO meal_nutrition (user_id, name, protein, fat, carb, calories, meal_time, created_at, updated_at)
+        SELECT :u, 'meal ' || g, 20, 10, 50, 400, 'lunch',
+               now() - make_interval(secs => (g::float / :n) * :days * 86400),
+               now()
+        FROM generate_series(1, :n) AS g
+        """
+    ), {"u": user_id, "n": count, "days": days})
+
+
+def cleanup():
+    users = f"SELECT id FROM users WHERE email LIKE '%@{BENCH_DOMAIN}'"
+    with engine.begin() as conn:
+        for table in ("meal_tombstones", "meal_nutrition", "daily_nutrition_rollup", "profiles"):
+            conn.execute(text(f"DELETE FROM {table} WHERE user_id IN ({users})"))
+        conn.execute(text(f"DELETE FROM users WHERE email LIKE '%@{BENCH_DOMAIN}'"))
+
+
+# =========================
+# LOAD
+# =========================
+async def run_load(request: Callable[[int], Awaitable[httpx.Response]], clients: int,
+                   total: Optional[int] = None, seconds: Optional[float] = None,
+                   rate: Optional[float] = None, backoff: Optional[Callable[[httpx.Response], float]] = None,
+                   ramp: float = 0.0) -> dict:
+    """clients งานพร้อมกัน ยิงรวม total ครั้ง (หรือยิงไปเรื่อย ๆ จนครบ seconds) คืน latency (วินาที) ของแต่ละครั้ง
+
+    rate: จำกัดรวมกี่ request/วินาที (ครั้งที่ i เริ่มไม่ก่อน start + i / rate)
+    backoff(response): วินาทีที่ client รอก่อนยิงครั้งต่อไป (ไม่นับใน latency)
+    ramp: ทยอยเริ่ม client ภายในกี่วินาที (0 = ทุกตัวเริ่มพร้อมกัน)
+    """
+    latencies: List[float] = []
+    codes: Counter = Counter()
+    counter = iter(range(total)) if total is not None else itertools.count()
+    start = time.perf_counter()
+    deadline = start + seconds if seconds is not None else None
+
+    async def client(k: int):
+        if ramp:
+            await asyncio.sleep(ramp * k / clients)
+        for i in counter:
+            if rate:
+                delay = start + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            t = time.perf_counter()
+            r = await request(i)
+            latencies.append(time.perf_counter() - t)
+            codes[r.status_code] += 1
+            if backoff is not None:
+                await asyncio.sleep(backoff(r))
+
+    await asyncio.gather(*(client(k) for k in range(clients)))
+    errors = sum(n for code, n in codes.items() if code >= 400)
+    return {"latencies": latencies, "seconds": time.perf_counter() - start, "errors": errors, "codes": codes}
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def latency_summary(lat: List[float]) -> str:
+    return (
+        f"p50 {statistics.median(lat) * 1000:7.1f} ms"
+        f"  p95 {percentile(lat, 95) * 1000:7.1f} ms"
+        f"  p99 {percentile(lat, 99) * 1000:7.1f} ms"
+    )
+
+
+def report(name: str, result: dict):
+    lat = result["latencies"]
+    codes = " ".join(f"{code}x{n}" for code, n in sorted(result["codes"].items()))
+    print(f"{name:24s} {len(lat) / result['seconds']:8.1f} req/s  {latency_summary(lat)}  status {codes}")
+
+
+def asgi_client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+
+# =========================
+# sync-vs-async  (routers แบบ def + threadpool เทียบกับ async def + asyncpg)
+# =========================
+# query เดียวกับหน้า list ของ GET /meals; pg_sleep จำลอง round-trip ไป DB ที่อยู่คนละเครื่อง
+_LIST_MEALS = text(
+    "SELECT id, name, calories, created_at FROM meal_nutrition"
+    " WHERE user_id = :u ORDER BY created_at DESC, id DESC LIMIT 20"
+)
+_LATENCY = text("SELECT pg_sleep(:s)")
+
+
+def _sync_vs_async_apps(pool_size: int, latency: float):
+    from fastapi import FastAPI
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from database import ASYNC_DATABASE_URL, DATABASE_URL
+
+    sync_engine = create_engine(DATABASE_URL, pool_size=pool_size, max_overflow=0)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=pool_size, max_overflow=0)
+
+    sync_app = FastAPI()
+
+    @sync_app.get("/meals")
+    def sync_meals(user_id: int):
+        with sync_engine.connect() as conn:
+            if latency:
+                conn.execute(_LATENCY, {"s": latency})
+            return [dict(r._mapping) for r in conn.execute(_LIST_MEALS, {"u": user_id})]
+
+    async_app = FastAPI()
+
+    @async_app.get("/meals")
+    async def async_meals(user_id: int):
+        async with async_engine.connect() as conn:
+            if latency:
+                await conn.execute(_LATENCY, {"s": latency})
+            return [dict(r._mapping) for r in await conn.execute(_LIST_MEALS, {"u": user_id})]
+
+    async def dispose_sync():
+        sync_engine.dispose()
+
+    # ปิด pool ของแบบแรกก่อนเริ่มแบบที่สอง (สองแบบรวมกันอาจเกิน max_connections)
+    return [
+        ("sync def + threadpool", sync_app, dispose_sync),
+        ("async def + asyncpg", async_app, async_engine.dispose),
+    ]
+
+
+async def bench_sync_vs_async(args) -> int:
+    with engine.begin() as conn:
+        user_id = seed_user(conn, "sync-vs-async")
+        seed_meals(conn, user_id, 200, days=30)
+
+    print(f"{args.clients} clients, {args.requests} requests, pool {args.pool_size},"
+          f" simulated DB latency {args.db_latency_ms} ms")
+    for name, app, dispose in _sync_vs_async_apps(args.pool_size, args.db_latency_ms / 1000):
+        async with asgi_client(app) as client:
+            await client.get("/meals", params={"user_id": user_id})      # warm-up
+            result = await run_load(lambda i: client.get("/meals", params={"user_id": user_id}),
+                                    args.clients, args.requests)
+        await dispose()
+        report(name, result)
+    return 0
+
+
+# =========================
+# meal-index  (index (user_id, created_at) + ช่วงเวลาแบบ half-open ของ GET /meals?date=)
+# =========================
+MEAL_INDEX = "ix_meal_nutrition_user_id_created_at"
+
+
+def explain(conn, stmt) -> dict:
+    compiled = stmt.compile(dialect=conn.dialect)
+    sql = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + str(compiled)
+    return conn.exec_driver_sql(sql, compiled.params).scalar()[0]["Plan"]
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def uses_index_range(plan: dict, index: str, column: str) -> bool:
+    """มี node ที่ใช้ index นี้ และ Index Cond กรอง column ด้วย (ไม่ใช่แค่ user_id แล้ว filter ทีหลัง)"""
+    return any(n.get("Index Name") == index and column in n.get("Index Cond", "") for n in plan_nodes(plan))
+
+
+def time_query(conn, stmt, runs: int) -> List[float]:
+    out = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        conn.execute(stmt).all()
+        out.append(time.perf_counter() - t)
+    return out
+
+
+def seed_table(prefix: str, users: int, meals_per_user: int, days: int) -> List[int]:
+    with engine.begin() as conn:
+        user_ids = [seed_user(conn, f"{prefix}-{i}") for i in range(users)]
+        for u in user_ids:
+            seed_meals(conn, u, meals_per_user, days=days)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE meal_nutrition"))
+        total = conn.execute(text("SELECT count(*) FROM meal_nutrition")).scalar_one()
+    print(f"meal_nutrition {total} rows ({users} bench users x {meals_per_user} meals over {days} days)")
+    return user_ids
+
+
+async def bench_meal_index(args) -> int:
+    from datetime import timedelta
+
+    from sqlalchemy import Date, cast, select
+
+    from models import MealNutrition as M
+    from routers.meals import _day_range, _local_today, _zone
+
+    user_ids = seed_table("meal-index", args.users, args.meals_per_user, args.days)
+    zone = _zone(None)
+    day = _local_today(zone) - timedelta(days=args.days // 2)
+    order = (M.created_at.desc(), M.id.desc())
+    queries = [
+        # query ของ GET /meals?date= (ต้องใช้ index range)
+        ("half-open range", select(M).where(M.user_id == user_ids[0], *_day_range(day, day, zone)).order_by(*order), True),
+        # แบบเดิมก่อน migration ไว้เทียบ
+        ("cast(created_at, Date)", select(M).where(M.user_id == user_ids[0], cast(M.created_at, Date) == day).order_by(*order), False),
+    ]
+
+    failed = False
+    with engine.connect() as conn:
+        for name, stmt, must_pass in queries:
+            plan = explain(conn, stmt)
+            lat = time_query(conn, stmt, args.runs)
+            indexed = uses_index_range(plan, MEAL_INDEX, "created_at")
+            buffers = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+            print(f"{name:24s} {latency_summary(lat)}  rows {plan['Actual Rows']:5d}"
+                  f"  buffers {buffers:6d}  index range {'yes' if indexed else 'no'}")
+            if must_pass and (not indexed or percentile(lat, 99) * 1000 > args.max_ms):
+                failed = True
+    if failed:
+        print(f"FAIL: GET /meals?date= must use {MEAL_INDEX} on created_at with p99 <= {args.max_ms} ms")
+    return 1 if failed else 0
+
+
+# =========================
+# login-storm  (bcrypt บน process pool ต้องไม่ทำให้ GET /meals ช้าลง)
+# =========================
+async def bench_login_storm(args) -> int:
+    from fastapi import FastAPI
+
+    import passwords
+    from auth import create_access_token
+    from routers import meals, users
+
+    hashed = passwords._hash("bench-password")      # hash เดียวใช้กับทุก user (ไม่ต้องรอ bcrypt ตอน seed)
+    with engine.begin() as conn:
+        for i in range(args.users):
+            seed_user(conn, f"login-storm-{i}", hashed)
+        reader = seed_user(conn, "login-storm-reader")
+        seed_meals(conn, reader, 500, days=30)
+    auth = {"Authorization": f"Bearer {create_access_token(sub=f'login-storm-reader@{BENCH_DOMAIN}', uid=reader)}"}
+
+    app = FastAPI()
+    app.include_router(users.router)
+    app.include_router(meals.router)
+
+    def read(i):
+        return client.get("/meals", params={"limit": 20}, headers=auth)
+
+    def login(i):
+        email = f"login-storm-{i % args.users}@{BENCH_DOMAIN}"
+        return client.post("/users/login", json={"email": email, "password": "bench-password"})
+
+    def retry_after(r):
+        # client จริงรอตาม Retry-After (+ jitter ไม่ให้ทุกตัวกลับมาพร้อมกัน) ก่อนลองใหม่
+        if r.status_code != 503:
+            return 0
+        return float(r.headers.get("Retry-After", 1)) * random.uniform(1.0, 2.0)
+
+    print(f"{args.readers} /meals clients at {args.read_rate:g} req/s, {args.logins} login clients"
+          f" (ramp {args.ramp:g} s),"
+          f" {args.seconds:.0f} s per phase;"
+          f" bcrypt rounds {settings.BCRYPT_ROUNDS}, {settings.PASSWORD_HASH_WORKERS} hash workers,"
+          f" max pending {settings.PASSWORD_HASH_MAX_PENDING}, nice {settings.PASSWORD_HASH_NICE}")
+    try:
+        async with asgi_client(app) as client:
+            await read(0)
+            await login(0)      # เริ่ม process pool ก่อนจับเวลา
+            baseline = await run_load(read, args.readers, seconds=args.seconds, rate=args.read_rate)
+            report("/meals (baseline)", baseline)
+            storm, logins = await asyncio.gather(
+                run_load(read, args.readers, seconds=args.seconds, rate=args.read_rate),
+                run_load(login, args.logins, seconds=args.seconds, backoff=retry_after, ramp=args.ramp),
+            )
+            report("/meals (login storm)", storm)
+            report("/users/login", logins)
+    finally:
+        passwords.shutdown()
+        from database import async_engine
+
+        await async_engine.dispose()
+
+    ratio = percentile(storm["latencies"], 99) / percentile(baseline["latencies"], 99)
+    print(f"/meals p99 during storm = {ratio:.2f}x baseline (limit {args.max_ratio}x)")
+    return 0 if ratio <= args.max_ratio and not storm["errors"] else 1
+
+
+# =========================
+# keyset  (GET /meals ทีละหน้าด้วย cursor บนประวัติ 100k meals ต่อ user)
+# =========================
+async def _walk_pages(client, headers: dict, page_size: int, fields: Optional[str], max_pages: int):
+    latencies, rows, size, cursor, cursors = [], 0, 0, None, []
+    while True:
+        params = {"limit": page_size}
+        if fields:
+            params["fields"] = fields
+        if cursor:
+            params["cursor"] = cursor
+        t = time.perf_counter()
+        r = await client.get("/meals", params=params, headers=headers)
+        latencies.append(time.perf_counter() - t)
+        r.raise_for_status()
+        rows += len(r.json())
+        size += len(r.content)
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor or len(latencies) >= max_pages:
+            return latencies, rows, size, cursors
+        cursors.append(cursor)
+
+
+async def bench_keyset(args) -> int:
+    from fastapi import FastAPI
+    from sqlalchemy import and_, or_, select
+
+    from auth import create_access_token
+    from cursors import decode_cursor
+    from models import MealNutrition as M
+    from routers import meals
+
+    user_ids = seed_table("keyset", args.users, args.meals_per_user, args.days)
+    u = user_ids[0]
+    headers = {"Authorization": f"Bearer {create_access_token(sub=f'keyset-0@{BENCH_DOMAIN}', uid=u)}"}
+    app = FastAPI()
+    app.include_router(meals.router)
+
+    max_pages = args.pages or sys.maxsize
+    async with asgi_client(app) as client:
+        for fields in (None, args.fields):
+            lat, rows, size, cursors = await _walk_pages(client, headers, args.page_size, fields, max_pages)
+            tail = lat[-max(1, len(lat) // 10):]
+            print(f"{'fields=' + fields if fields else 'all fields':24s} {len(lat):5d} pages {rows:7d} rows"
+                  f" {size / rows:6.0f} B/row  {latency_summary(lat)}  last 10% p99 {percentile(tail, 99) * 1000:6.1f} ms")
+    from database import async_engine
+
+    await async_engine.dispose()
+
+    # หน้าลึกสุด: keyset (query ของ router) เทียบกับ OFFSET ที่ตำแหน่งเดียวกัน
+    ts, last_id = decode_cursor(cursors[-1])
+    order = (M.created_at.desc(), M.id.desc())
+    keyset = (select(M).where(M.user_id == u, M.created_at <= ts,
+                              or_(M.created_at < ts, and_(M.created_at == ts, M.id < last_id)))
+              .order_by(*order).limit(args.page_size + 1))
+    offset = select(M).where(M.user_id == u).order_by(*order).offset(len(cursors) * args.page_size).limit(args.page_size + 1)
+
+    failed = False
+    with engine.connect() as conn:
+        for name, stmt, must_pass in (("keyset (deepest page)", keyset, True), ("OFFSET (same page)", offset, False)):
+            plan = explain(conn, stmt)
+            lat = time_query(conn, stmt, args.runs)
+            indexed = uses_index_range(plan, MEAL_INDEX, "created_at")
+            buffers = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+            print(f"{name:24s} {latency_summary(lat)}  buffers {buffers:6d}  index range {'yes' if indexed else 'no'}")
+            if must_pass and (not indexed or percentile(lat, 99) * 1000 > args.max_ms):
+                failed = True
+    if failed:
+        print(f"FAIL: keyset page must use {MEAL_INDEX} on created_at with p99 <= {args.max_ms} ms")
+    return 1 if failed else 0
+
+
+# =========================
+# CLI
+# =========================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("sync-vs-async", help="throughput ของ router แบบ sync กับ async ที่ client พร้อมกันจำนวนมาก")
+    p.add_argument("--clients", type=int, default=500)
+    p.add_argument("--requests", type=int, default=5000)
+    p.add_argument("--pool-size", type=int, default=settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+    p.add_argument("--db-latency-ms", type=float, default=5.0, help="pg_sleep ต่อ request (จำลอง network ไป DB)")
+    p.set_defaults(run=bench_sync_vs_async)
+
+    p = sub.add_parser("meal-index", help="plan + latency ของ query รายวันบนตาราง meal_nutrition ขนาดใหญ่")
+    p.add_argument("--users", type=int, default=20)
+    p.add_argument("--meals-per-user", type=int, default=50000)
+    p.add_argument("--days", type=int, default=730)
+    p.add_argument("--runs", type=int, default=200)
+    p.add_argument("--max-ms", type=float, default=10.0, help="p99 สูงสุดที่ยอมรับ (exit 1 ถ้าเกิน)")
+    p.set_defaults(run=bench_meal_index)
+
+    p = sub.add_parser("login-storm", help="p99 ของ GET /meals ขณะมี login พร้อมกันจำนวนมาก")
+    p.add_argument("--readers", type=int, default=50)
+    p.add_argument("--read-rate", type=float, default=50.0, help="GET /meals รวมต่อวินาที (ต่ำกว่าที่เครื่องรับไหว)")
+    p.add_argument("--logins", type=int, default=200)
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--ramp", type=float, default=2.0, help="ทยอยเริ่ม login client ภายในกี่วินาที (0 = พร้อมกันทั้งหมด)")
+    p.add_argument("--seconds", type=float, default=15.0)
+    p.add_argument("--max-ratio", type=float, default=2.0, help="p99 ช่วง storm / baseline สูงสุด (exit 1 ถ้าเกิน)")
+    p.set_defaults(run=bench_login_storm)
+
+    p = sub.add_parser("keyset", help="เดินทุกหน้าของ GET /meals ด้วย cursor + plan ของหน้าลึกสุดเทียบ OFFSET")
+    p.add_argument("--users", type=int, default=5)
+    p.add_argument("--meals-per-user", type=int, default=100000)
+    p.add_argument("--days", type=int, default=3650)
+    p.add_argument("--page-size", type=int, default=50)
+    p.add_argument("--pages", type=int, default=0, help="หยุดเมื่อครบกี่หน้า (0 = ทั้งประวัติ)")
+    p.add_argument("--fields", default="id,name,calories,created_at", help="projection ที่ใช้เทียบกับทุก field")
+    p.add_argument("--runs", type=int, default=200)
+    p.add_argument("--max-ms", type=float, default=10.0, help="p99 สูงสุดของหน้าลึกสุด (exit 1 ถ้าเกิน)")
+    p.set_defaults(run=bench_keyset)
+
+    args = parser.parse_args()
+    Base.metadata.create_all(bind=engine)
+    cleanup()
+    try:
+        return asyncio.run(args.run(args))
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
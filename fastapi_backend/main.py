@@ -1,25 +1,69 @@
 # main.py
+import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
-from database import engine, Base
+from database import engine, async_engine, Base, SessionLocal
 import models  # โหลด models ก่อน
 
 # ----------- Import Routers -----------
 from routers.users import router as users_router
 from routers.profile import router as profile_router
 from routers.files import router as files_router
-from routers.yolo import router as yolo_router
+from config import settings
+import passwords
+import cache
+import metrics
 from routers import menu
 from routers import meals
 
-# ----------- สร้างตาราง -----------
-Base.metadata.create_all(bind=engine)
+# router ของ YOLO ดึง numpy / backend ของ model มาด้วย: import เฉพาะ worker ที่เปิด inference
+# (ENABLE_INFERENCE=false → worker CRUD อย่างเดียว start เร็วและกิน memory น้อย)
+if settings.ENABLE_INFERENCE:
+    from routers.yolo import router as yolo_router, scheduler as yolo_scheduler
+    from model_registry import registry as model_registry
+    from class_menu import class_menu
+
+logger = logging.getLogger(__name__)
+
+
+def _warmup_inference():
+    # โหลด + warm-up model ครั้งเดียวตอนเริ่ม ให้ request แรกไม่ช้า
+    model_registry.warmup()
+    # map class id → menu ไว้ก่อน request แรก (ถ้า DB ยังไม่พร้อม จะสร้างตอนถูกเรียกใช้)
+    try:
+        with SessionLocal() as db:
+            class_menu.refresh(db)
+    except Exception:
+        logger.exception("Could not build YOLO class → menu map at startup")
+
+
+# ----------- Lifespan -----------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # สร้างตารางตอน startup ไม่ใช่ตอน import (import main ไม่ต้องต่อ DB)
+    if settings.DB_CREATE_ALL:
+        Base.metadata.create_all(bind=engine)
+    # ต่อ Redis (ถ้าตั้ง REDIS_URL) ก่อนรับ request ไม่ให้ไปต่อครั้งแรกใน request / hook หลัง commit
+    await run_in_threadpool(cache.get_shared)
+    if settings.ENABLE_INFERENCE:
+        if settings.YOLO_WARMUP:
+            _warmup_inference()
+        yolo_scheduler.start()
+    yield
+    if settings.ENABLE_INFERENCE:
+        yolo_scheduler.stop()
+    passwords.shutdown()
+    cache.shutdown()
+    await async_engine.dispose()
 
 # ----------- Init App -----------
-app = FastAPI(title="Nutrition API", version="1.0.0")
+app = FastAPI(title="Nutrition API", version="1.0.0", lifespan=lifespan)
 
 # ----------- CORS -----------
 ALLOW_ORIGINS = ["*"]
@@ -31,6 +75,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ----------- Metrics (Prometheus) -----------
+app.add_middleware(metrics.MetricsMiddleware)
+
 # ----------- Static Files (แก้ให้ถูกต้อง) -----------
 STATIC_MOUNT = [
     ("/media", "media"),
@@ -46,7 +93,8 @@ for mount_path, folder in STATIC_MOUNT:
 app.include_router(users_router)
 app.include_router(profile_router)
 app.include_router(files_router)
-app.include_router(yolo_router)
+if settings.ENABLE_INFERENCE:
+    app.include_router(yolo_router)
 app.include_router(menu.router)
 app.include_router(meals.router)
 
@@ -55,6 +103,10 @@ app.include_router(meals.router)
 def healthz():
     return {"ok": True}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/", include_in_schema=False)
 def root():
     return {"message": "OK", "docs": "/docs"}
@@ -0,0 +1,215 @@
+# menu_index.py
+"""index ค้นหาเมนูใน memory (ตาราง menu เล็กและอ่านบ่อย)
+
+- prefix lookup: list ของ key ที่ sort แล้ว + bisect (ทั้งชื่อเต็มและทีละคำ)
+- fuzzy: inverted index ของ character bigram แล้วจัดอันดับด้วย Dice coefficient
+- ภาษาไทย: ตัดวรรณยุกต์/การันต์และช่องว่างออกตอนเทียบ ("ผัดไท", "ผัด ไทย", "ผัดไท่" ใกล้กัน)
+- โหลดใหม่เมื่อ Menu ถูกแก้ผ่าน ORM (ทุก worker ผ่าน menu_cache) หรือครบ MENU_INDEX_TTL_SECONDS
+- แถวดิบของตาราง menu อยู่ใน menu_cache (cache.py) worker ที่ build ทีหลังไม่ต้อง query DB ซ้ำ
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from cache import TieredCache, invalidate_on_commit
+from config import settings
+from models import Menu
+
+# ไม้ไต่คู้ ่ ้ ๊ ๋ การันต์ นิคหิต ยามักการ (U+0E47–U+0E4E)
+_THAI_MARKS = re.compile("[\u0e47-\u0e4e]")
+_ZERO_WIDTH = re.compile("[\u200b-\u200d\ufeff]")
+_SPACES = re.compile(r"\s+")
+
+_FIELDS = ("food_name", "food_name_en", "protein", "fat", "carbs", "calories")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFC", text or "")
+    text = _ZERO_WIDTH.sub("", text).casefold()
+    return _SPACES.sub(" ", text).strip()
+
+
+def loose(text: str) -> str:
+    """รูปแบบหลวม ๆ สำหรับ fuzzy: ไม่มีวรรณยุกต์และช่องว่าง"""
+    return _THAI_MARKS.sub("", normalize(text)).replace(" ", "")
+
+
+def _bigrams(s: str) -> set:
+    if len(s) < 2:
+        return {s} if s else set()
+    return {s[i:i + 2] for i in range(len(s) - 1)}
+
+
+class _Snapshot:
+    """ข้อมูล index หนึ่งรุ่น (สร้างใหม่ทั้งก้อนแล้วสลับ reference ตอน reload)"""
+
+    def __init__(self, rows, names, looses, prefix, grams):
+        self.rows: List[dict] = rows
+        # เปลี่ยนเฉพาะเมื่อข้อมูล menu เปลี่ยนจริง (reload ตาม TTL แล้วได้ค่าเดิม) ใช้ทำ ETag
+        self.fingerprint = hashlib.sha1(repr(rows).encode()).hexdigest()[:16]
+        self.names: List[Tuple[str, ...]] = names        # normalized ชื่อไทย/อังกฤษ ต่อแถว
+        self.loose: List[Tuple[str, ...]] = looses
+        self.prefix: List[Tuple[str, int]] = prefix      # (key, row idx) sort แล้ว
+        self.grams: Dict[str, List[int]] = grams
+
+
+def _menu_row(m: Menu) -> dict:
+    return {**{f: getattr(m, f) for f in _FIELDS}, "id": m.id}
+
+
+def _build_snapshot(rows: List[dict]) -> _Snapshot:
+    names, looses, prefix = [], [], []
+    grams = defaultdict(set)
+    for idx, row in enumerate(rows):
+        n = tuple(normalize(x) for x in (row["food_name"], row["food_name_en"]) if x)
+        l = tuple(loose(x) for x in n)
+        names.append(n)
+        looses.append(l)
+
+        for name, lname in zip(n, l):
+            prefix.append((lname, idx))
+            for token in name.split(" ")[1:]:
+                prefix.append((loose(token), idx))
+            for g in _bigrams(lname):
+                grams[g].add(idx)
+
+    prefix.sort()
+    return _Snapshot(rows, names, looses, prefix, {g: sorted(ids) for g, ids in grams.items()})
+
+
+def _prefix_hits(snap: _Snapshot, q: str) -> Dict[int, int]:
+    """row idx → 0 ถ้า key ตรงทั้งคำ, 1 ถ้าเป็นแค่ prefix"""
+    hits = {}
+    i = bisect_left(snap.prefix, (q, -1))
+    while i < len(snap.prefix) and snap.prefix[i][0].startswith(q):
+        key, idx = snap.prefix[i]
+        hits[idx] = min(hits.get(idx, 1), 0 if key == q else 1)
+        i += 1
+    return hits
+
+
+def _score(snap: _Snapshot, idx: int, q: str, qn: str, qgrams: set, prefix_rank) -> float:
+    names, looses = snap.names[idx], snap.loose[idx]
+    if qn in names or q in looses:
+        return 1000.0
+    if prefix_rank is not None and any(l.startswith(q) for l in looses):
+        return 600.0                      # prefix ของชื่อเต็ม
+    if prefix_rank is not None:
+        return 500.0                      # prefix ของคำใดคำหนึ่ง
+    if any(q in l for l in looses):
+        return 400.0
+    best = 0.0
+    for l in looses:
+        g = _bigrams(l)
+        if g and qgrams:
+            best = max(best, 2 * len(g & qgrams) / (len(g) + len(qgrams)))
+    return best * 300.0
+
+
+class MenuSearchIndex:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._async_lock = asyncio.Lock()
+        self._stale = True
+        self._loaded_at = 0.0
+        self._snap = _Snapshot([], [], [], [], {})
+        self.version = 0
+
+    # ----------- build -----------
+    def mark_stale(self):
+        self._stale = True
+
+    def _needs_reload(self) -> bool:
+        return self._stale or (time.monotonic() - self._loaded_at) > self.ttl
+
+    def _install(self, rows: List[dict]):
+        self._snap = _build_snapshot(rows)
+        self._loaded_at = time.monotonic()
+        self.version += 1
+
+    def ensure_loaded(self, db: Session):
+        if not self._needs_reload():
+            return
+        with self._lock:
+            if self._needs_reload():
+                # ล้าง flag ก่อน query: ถ้ามีการแก้ menu ระหว่าง build จะได้ build ใหม่อีกรอบ
+                self._stale = False
+                rows = menu_cache.get(_ROWS_KEY)
+                if rows is None:
+                    rows = [_menu_row(m) for m in db.query(Menu).order_by(Menu.id)]
+                    menu_cache.set(_ROWS_KEY, rows)
+                self._install(rows)
+
+    async def ensure_loaded_async(self, db: AsyncSession):
+        # asyncio.Lock แทน threading.Lock (ห้าม block event loop ระหว่างรอ query)
+        if not self._needs_reload():
+            return
+        async with self._async_lock:
+            if self._needs_reload():
+                self._stale = False
+                rows = await menu_cache.aget(_ROWS_KEY)
+                if rows is None:
+                    rows = [_menu_row(m) for m in await db.scalars(select(Menu).order_by(Menu.id))]
+                    await menu_cache.aset(_ROWS_KEY, rows)
+                self._install(rows)
+
+    @property
+    def rows(self) -> List[dict]:
+        return self._snap.rows
+
+    @property
+    def fingerprint(self) -> str:
+        return self._snap.fingerprint
+
+    # ----------- search -----------
+    def search(self, text: str, limit: int = 20, offset: int = 0) -> Tuple[List[dict], int]:
+        """คืน (แถวในหน้านั้น, จำนวนที่ match ทั้งหมด) เรียงตามคะแนน"""
+        qn, q = normalize(text), loose(text)
+        if not q:
+            return [], 0
+
+        snap = self._snap
+        prefix = _prefix_hits(snap, q)
+        qgrams = _bigrams(q)
+
+        candidates = set(prefix)
+        counts = defaultdict(int)
+        for g in qgrams:
+            for idx in snap.grams.get(g, ()):
+                counts[idx] += 1
+        # fuzzy: ต้องมี bigram ร่วมอย่างน้อยครึ่งหนึ่งของคำค้น
+        need = max(1, len(qgrams) // 2)
+        candidates.update(idx for idx, c in counts.items() if c >= need)
+        if len(q) < 2:
+            # สั้นกว่า bigram: ไม่มี gram ให้หา → ไล่หา substring ทุกแถว (เหมือน ILIKE '%q%' เดิม)
+            candidates.update(idx for idx, ls in enumerate(snap.loose) if any(q in l for l in ls))
+
+        scored = []
+        for idx in candidates:
+            score = _score(snap, idx, q, qn, qgrams, prefix.get(idx))
+            if score >= settings.MENU_SEARCH_MIN_SCORE:
+                scored.append((-score, len(snap.loose[idx][0]), idx))
+        scored.sort()
+
+        page = scored[offset:offset + limit]
+        return [snap.rows[idx] for _, _, idx in page], len(scored)
+
+
+menu_index = MenuSearchIndex(ttl=settings.MENU_INDEX_TTL_SECONDS)
+
+# แถวทั้งตารางเก็บเป็น key เดียว; Menu ถูกแก้ → ลบ key หลัง commit → ทุก worker build index ใหม่
+_ROWS_KEY = "rows"
+menu_cache = TieredCache("menu", maxsize=1, ttl=settings.MENU_INDEX_TTL_SECONDS)
+menu_cache.on_invalidate(lambda key: menu_index.mark_stale())
+invalidate_on_commit(Menu, menu_cache, lambda m: _ROWS_KEY)
@@ -0,0 +1,247 @@
+# metrics.py
+"""metrics แบบ Prometheus text format (GET /metrics) ไม่ต้องพึ่ง prometheus_client
+
+- latency ของ request แยกตาม route template / method / status (MetricsMiddleware)
+- จำนวน query และเวลา query ต่อ request (event ของ SQLAlchemy Engine ทุกตัว รวม async engine)
+- เวลารอ checkout connection จาก pool (TimedQueuePool / TimedAsyncQueuePool)
+- เวลาแต่ละช่วงของ YOLO (decode / preprocess / inference / postprocess / archive / render)
+- จำนวน byte ที่ upload เข้ามา
+
+ค่าเก็บต่อ process: ถ้ารันหลาย worker ให้ scrape แต่ละ worker แยก (หรือรวมที่ Prometheus)
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (16e3, 64e3, 256e3, 1e6, 2e6, 4e6, 8e6)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Tuple) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        return tuple(str(v) for v in labels)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.label_names, k)} {_fmt_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], list] = {}   # [counts ต่อ bucket..., sum]
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="' + _fmt_num(bound) + '"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {_fmt_num(state[-1])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+_registry = []
+
+
+def render() -> str:
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+# ----------- series -----------
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Duration of a single SQL statement")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), buckets=COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Total SQL time per HTTP request", ("route",))
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+YOLO_STAGE = Histogram(
+    "yolo_stage_duration_seconds", "Time per image in each stage of /yolo/predict", ("stage",))
+UPLOAD_BYTES = Counter(
+    "upload_bytes_total", "Bytes received in image uploads", ("endpoint",))
+UPLOAD_SIZE = Histogram(
+    "upload_size_bytes", "Size of uploaded images", ("endpoint",), buckets=BYTES_BUCKETS)
+
+
+def record_upload(endpoint: str, size: int):
+    UPLOAD_BYTES.inc(endpoint, amount=size)
+    UPLOAD_SIZE.observe(size, endpoint)
+
+
+class timed:
+    """with metrics.timed(YOLO_STAGE, "decode"): ..."""
+
+    def __init__(self, histogram: Histogram, *labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+# ----------- per-request SQL stats -----------
+class _RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current: ContextVar[Optional[_RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERY_LATENCY.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+# ----------- pool checkout wait -----------
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start, "sync")
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start, "async")
+
+
+# ----------- ASGI middleware -----------
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        state = {"status": 500, "end": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                # จบที่ body ก้อนสุดท้าย ไม่นับ background task ที่รันต่อหลังส่ง response
+                state["end"] = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            elapsed = (state["end"] or time.perf_counter()) - start
+            REQUEST_LATENCY.observe(elapsed, scope.get("method", ""), template, state["status"])
+            DB_QUERIES_PER_REQUEST.observe(stats.queries, template)
+            DB_TIME_PER_REQUEST.observe(stats.db_seconds, template)
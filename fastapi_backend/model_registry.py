@@ -0,0 +1,162 @@
+# model_registry.py
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import settings
+from detector_backends import create_backend, onnx_path_for
+
+logger = logging.getLogger(__name__)
+
+
+def _weight_files(path: Path):
+    # openvino export เป็นโฟลเดอร์ (.xml + .bin)
+    if path.is_dir():
+        return sorted(p for p in path.iterdir() if p.is_file())
+    return [path]
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    for fp in _weight_files(path):
+        with fp.open("rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def active_weights_path() -> str:
+    """ไฟล์ weights ของ backend ที่เลือกใน config"""
+    kind = settings.YOLO_BACKEND.lower()
+    base = Path(settings.YOLO_MODEL_PATH)
+    if kind == "onnx":
+        return str(onnx_path_for(str(base), int8=settings.YOLO_QUANTIZED))
+    if kind == "openvino":
+        suffix = "_int8_openvino_model" if settings.YOLO_QUANTIZED else "_openvino_model"
+        return str(base.with_name(base.stem + suffix))
+    return str(base)
+
+
+class ModelRegistry:
+    """เก็บ YOLO model (backend) หนึ่งตัวต่อ process
+
+    - โหลด weights ครั้งเดียว (lazy) แล้วแชร์ให้ทุก code path
+    - backend (torch / onnx / openvino) เลือกจาก config ดู detector_backends.py
+    - `class_names` คือตารางชื่อ class ที่ถูกต้องตัวเดียว (มาจาก model.names)
+    - ถ้าไฟล์ weights ถูกแทนที่ (mtime/size เปลี่ยน) จะ hot-swap ให้เองโดยไม่ต้อง restart
+    """
+
+    def __init__(self, weights_path: str, backend: str = "torch", warmup_size: int = 640):
+        self.weights_path = Path(weights_path)
+        self.backend = backend
+        self.warmup_size = warmup_size
+
+        self._lock = threading.RLock()
+        self._model = None
+        self._class_names: Dict[int, str] = {}
+        self._version: Optional[str] = None
+        self._stamp = None
+
+    # ----------- loading -----------
+    def _current_stamp(self):
+        stats = [os.stat(p) for p in _weight_files(self.weights_path)]
+        return tuple((st.st_mtime_ns, st.st_size) for st in stats)
+
+    def _load(self):
+        stamp = self._current_stamp()
+        model = create_backend(
+            self.backend,
+            str(self.weights_path),
+            intra_op_threads=settings.YOLO_INTRA_OP_THREADS,
+            inter_op_threads=settings.YOLO_INTER_OP_THREADS,
+        )
+
+        self._model = model
+        self._class_names = dict(model.names)
+        # hash ของไฟล์ weights: แต่ละ backend (pt / onnx / int8) ได้ version ต่างกันเอง
+        self._version = _file_digest(self.weights_path)[:12]
+        self._stamp = stamp
+        logger.info("Loaded YOLO %s weights %s (version %s)", self.backend, self.weights_path, self._version)
+
+    def get(self):
+        """คืน backend ปัจจุบัน (โหลดครั้งแรก หรือโหลดใหม่ถ้าไฟล์ weights เปลี่ยน)"""
+        with self._lock:
+            if self._model is None:
+                self._load()
+            else:
+                self.reload_if_changed()
+            return self._model
+
+    def reload_if_changed(self) -> bool:
+        with self._lock:
+            if self._model is None:
+                return False
+            try:
+                stamp = self._current_stamp()
+            except FileNotFoundError:
+                # ไฟล์กำลังถูกแทนที่อยู่ ใช้ตัวเดิมไปก่อน
+                return False
+            if stamp == self._stamp:
+                return False
+            return self.reload()
+
+    def reload(self) -> bool:
+        """โหลด weights ใหม่; ถ้าโหลดไม่สำเร็จจะใช้ model เดิมต่อ"""
+        with self._lock:
+            old = (self._model, self._class_names, self._version, self._stamp)
+            try:
+                self._load()
+                self.warmup()
+            except Exception:
+                logger.exception("Failed to reload YOLO weights, keeping version %s", old[2])
+                self._model, self._class_names, self._version, self._stamp = old
+                return False
+            return True
+
+    def warmup(self):
+        """รัน dummy image หนึ่งรอบ ให้ request แรกไม่ต้องจ่ายค่า init"""
+        import numpy as np
+
+        model = self.get()
+        dummy = np.zeros((self.warmup_size, self.warmup_size, 3), dtype=np.uint8)
+        model.predict([dummy], imgsz=self.warmup_size)
+
+    # ----------- metadata -----------
+    @property
+    def class_names(self) -> Dict[int, str]:
+        self.get()
+        return self._class_names
+
+    @property
+    def version(self) -> str:
+        self.get()
+        return self._version
+
+    def class_name(self, cls_id: int) -> str:
+        return self.class_names.get(int(cls_id), f"class_{cls_id}")
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "weights": str(self.weights_path),
+                "loaded": self._model is not None,
+                "version": self._version,
+                "classes": self._class_names,
+            }
+
+
+if settings.YOLO_MODEL_SERVER:
+    # model อยู่ที่ model_server.py; worker นี้ไม่โหลด weights เอง
+    from model_server import RemoteModelRegistry
+
+    registry = RemoteModelRegistry(settings.YOLO_MODEL_SERVER_SOCKET, settings.YOLO_MODEL_SERVER_TIMEOUT)
+else:
+    registry = ModelRegistry(
+        active_weights_path(),
+        backend=settings.YOLO_BACKEND.lower(),
+        warmup_size=settings.YOLO_IMGSZ,
+    )
@@ -0,0 +1,475 @@
+# model_server.py
+"""YOLO model server: process เดียวถือ model ให้ทุก API worker ใช้ร่วมกัน
+
+ปกติ (`uvicorn --workers N`) ทุก worker โหลด model ของตัวเอง → memory xN และ thread แย่ง CPU กัน
+ตั้ง YOLO_MODEL_SERVER=true แล้ว worker จะส่งรูปที่ decode แล้วมาที่นี่แทน
+
+- คุยกันผ่าน Unix socket (YOLO_MODEL_SERVER_SOCKET): ข้อความ JSON นำหน้าด้วยความยาว 4 byte
+- pixel ไม่ผ่าน socket: worker เขียน array ลง shared memory ก้อนเดียวต่อ batch แล้วส่งแค่ชื่อ
+  + offset/shape; server อ่านเป็น numpy view ตรง ๆ ไม่ copy
+- server รวมรูปจากทุก worker เป็น micro-batch ด้วย BatchScheduler ตัวเดียวกับ in-process
+- hot-swap weights ทำฝั่ง server (ModelRegistry เดิม) version ใหม่ส่งกลับไปกับทุกผล
+
+CLI:
+    python model_server.py                    # supervisor: รัน server เป็น child และ restart เมื่อตาย
+    python model_server.py serve              # server อย่างเดียว (ไม่มี supervisor)
+    python model_server.py bench img1.jpg ... # เทียบ in-process กับ model server ที่รันอยู่
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct("!I")
+_INFO_TTL_SECONDS = 2.0
+_STABLE_SECONDS = 60.0          # รันนานกว่านี้แล้วตาย → นับ backoff ใหม่
+_MAX_BACKOFF_SECONDS = 30.0
+
+
+class ModelServerUnavailable(RuntimeError):
+    pass
+
+
+# ----------- framing -----------
+def _send(sock: socket.socket, msg: dict):
+    data = json.dumps(msg, separators=(",", ":")).encode()
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv(sock: socket.socket) -> Optional[dict]:
+    head = _recv_exact(sock, _LENGTH.size)
+    if head is None:
+        return None
+    body = _recv_exact(sock, _LENGTH.unpack(head)[0])
+    return None if body is None else json.loads(body)
+
+
+# =========================
+# SERVER
+# =========================
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # worker เป็นเจ้าของ segment (สร้าง + unlink เอง) ฝั่งนี้ต้องไม่ให้ resource_tracker ไปลบ
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class _Segments:
+    """ปิด shared memory หลังใช้เสร็จ; ถ้า backend ยังถือ view อยู่ (ultralytics เก็บ batch ล่าสุดไว้)
+    จะเลื่อนไปปิดรอบถัดไป"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: List[shared_memory.SharedMemory] = []
+
+    def release(self, shm: Optional[shared_memory.SharedMemory] = None):
+        with self._lock:
+            if shm is not None:
+                self._pending.append(shm)
+            still_open = []
+            for s in self._pending:
+                try:
+                    s.close()
+                except BufferError:
+                    still_open.append(s)
+            self._pending = still_open
+
+
+class ModelServer:
+    def __init__(self, registry):
+        from inference import BatchScheduler
+
+        self.registry = registry
+        self.segments = _Segments()
+        self.scheduler = BatchScheduler(
+            self._predict_batch,
+            max_batch_size=settings.YOLO_MAX_BATCH_SIZE,
+            max_wait_ms=settings.YOLO_MAX_WAIT_MS,
+            name="model-server",
+        )
+
+    def _predict_batch(self, items):
+        # item = (array, conf, imgsz); request จากคนละ worker อาจขอ conf / imgsz ต่างกัน
+        model = self.registry.get()
+        results = [None] * len(items)
+        groups: Dict[tuple, List[int]] = {}
+        for i, (_, conf, imgsz) in enumerate(items):
+            groups.setdefault((conf, imgsz), []).append(i)
+        for (conf, imgsz), idxs in groups.items():
+            out = model.predict([items[i][0] for i in idxs], conf=conf, imgsz=imgsz)
+            for i, r in zip(idxs, out):
+                results[i] = r
+        return results
+
+    def info(self) -> dict:
+        version = self.registry.version     # โหลด model ถ้ายังไม่ได้โหลด
+        info = self.registry.info()
+        return {
+            **info,
+            "version": version,
+            "classes": {str(k): v for k, v in info["classes"].items()},
+            "pid": os.getpid(),
+            "scheduler": self.scheduler.stats(),
+        }
+
+    def predict(self, req: dict) -> dict:
+        shm = _attach(req["shm"])
+        try:
+            arrays = [
+                np.ndarray(tuple(shape), dtype=np.uint8, buffer=shm.buf, offset=offset)
+                for offset, shape in req["images"]
+            ]
+            futures = [self.scheduler.submit_nowait((a, req["conf"], req["imgsz"])) for a in arrays]
+            results = [f.result() for f in futures]
+            del arrays, futures
+        finally:
+            self.segments.release(shm)
+        return {"version": self.registry.version, "results": [_jsonable(r) for r in results]}
+
+    def handle(self, req: dict) -> dict:
+        op = req.get("op")
+        try:
+            if op == "predict":
+                return {"ok": True, **self.predict(req)}
+            if op == "info":
+                return {"ok": True, **self.info()}
+            return {"ok": False, "error": f"unknown op: {op!r}"}
+        except Exception as e:
+            logger.exception("model server request failed")
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def _jsonable(result: dict) -> dict:
+    return {
+        "detections": result["detections"],
+        "orig_shape": [int(v) for v in result.get("orig_shape", ())],
+        "speed": {k: v for k, v in result.get("speed", {}).items() if v is not None},
+    }
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # connection ค้างไว้ใช้ต่อหลาย request (หนึ่ง connection ต่อ thread ของ worker)
+        while True:
+            try:
+                req = _recv(self.request)
+            except (ConnectionError, ValueError):
+                return
+            if req is None:
+                return
+            _send(self.request, self.server.model_server.handle(req))
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128    # ทุก thread ของทุก worker ต่อเข้ามาพร้อมกันตอน start
+
+
+def serve(socket_path: str = None):
+    from model_registry import ModelRegistry, active_weights_path
+
+    socket_path = socket_path or settings.YOLO_MODEL_SERVER_SOCKET
+    registry = ModelRegistry(
+        active_weights_path(),
+        backend=settings.YOLO_BACKEND.lower(),
+        warmup_size=settings.YOLO_IMGSZ,
+    )
+    model_server = ModelServer(registry)
+    if settings.YOLO_WARMUP:
+        registry.warmup()
+
+    # socket เก่าจากรอบที่ตายไปแล้ว
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = _UnixServer(socket_path, _Handler)
+    server.model_server = model_server
+    model_server.scheduler.start()
+
+    def _stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    logger.info("Model server listening on %s (pid %s, version %s)", socket_path, os.getpid(), registry.version)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        model_server.scheduler.stop()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def supervise(socket_path: str = None):
+    """รัน `serve` เป็น child process และ restart เมื่อ crash (backoff 1 → 30 วินาที)"""
+    cmd = [sys.executable, os.path.abspath(__file__)]
+    if socket_path:
+        cmd += ["--socket", socket_path]
+    cmd.append("serve")
+    state = {"stopping": False, "child": None}
+
+    def _stop(signum, frame):
+        state["stopping"] = True
+        child = state["child"]
+        if child is not None and child.poll() is None:
+            child.terminate()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    backoff = 1.0
+    while not state["stopping"]:
+        started = time.monotonic()
+        state["child"] = subprocess.Popen(cmd)
+        code = state["child"].wait()
+        if state["stopping"]:
+            break
+        ran = time.monotonic() - started
+        if ran > _STABLE_SECONDS:
+            backoff = 1.0
+        logger.error("Model server exited with code %s after %.1fs, restarting in %.0fs", code, ran, backoff)
+        time.sleep(backoff)
+        backoff = min(backoff * 2, _MAX_BACKOFF_SECONDS)
+    return 0
+
+
+# =========================
+# CLIENT (ฝั่ง API worker)
+# =========================
+class ModelServerClient:
+    """connection ต่อ thread; ถ้า server restart จะต่อใหม่และลองซ้ำหนึ่งครั้ง"""
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def call(self, req: dict) -> dict:
+        for attempt in (1, 2):
+            try:
+                sock = getattr(self._local, "sock", None)
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                _send(sock, req)
+                reply = _recv(sock)
+                if reply is None:
+                    raise ConnectionError("model server closed the connection")
+                break
+            except socket.timeout as e:
+                # คำตอบที่มาช้าจะค้างใน connection นี้ → ทิ้ง connection ไม่ลองซ้ำ
+                self._drop()
+                raise ModelServerUnavailable(f"model server timed out after {self.timeout}s") from e
+            except OSError as e:
+                self._drop()
+                if attempt == 2:
+                    raise ModelServerUnavailable(f"model server at {self.socket_path} unavailable: {e}") from e
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "model server error"))
+        return reply
+
+    def predict(self, arrays: Sequence[np.ndarray], conf: float, imgsz: int) -> dict:
+        # ทุกรูปใน batch อยู่ใน segment เดียว: copy จาก array ที่ decode แล้วลง shm ครั้งเดียว
+        arrays = [np.ascontiguousarray(a, dtype=np.uint8) for a in arrays]
+        layout, offset = [], 0
+        for a in arrays:
+            layout.append([offset, list(a.shape)])
+            offset += a.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        try:
+            for a, (off, _) in zip(arrays, layout):
+                shm.buf[off:off + a.nbytes] = a.reshape(-1)
+            return self.call({"op": "predict", "shm": shm.name, "images": layout,
+                              "conf": conf, "imgsz": imgsz})
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+class RemoteModelRegistry:
+    """แทน ModelRegistry ใน API worker เมื่อ YOLO_MODEL_SERVER=true (interface เดียวกัน)
+
+    get() คืนตัวเองซึ่งมี predict() แบบเดียวกับ backend; version / ชื่อ class ถามจาก server
+    แล้ว cache ไว้สั้น ๆ (และอัปเดตจากผล predict ทุกครั้ง)
+    """
+
+    backend = "remote"
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.client = ModelServerClient(socket_path, timeout)
+        self._lock = threading.Lock()
+        self._info: Optional[dict] = None
+        self._info_at = 0.0
+
+    def _refresh(self, force: bool = False) -> dict:
+        info = self._info
+        if force or info is None or time.monotonic() - self._info_at > _INFO_TTL_SECONDS:
+            with self._lock:
+                reply = self.client.call({"op": "info"})
+                reply["classes"] = {int(k): v for k, v in reply["classes"].items()}
+                self._info, self._info_at = reply, time.monotonic()
+                info = reply
+        return info
+
+    def get(self):
+        return self
+
+    def predict(self, sources: Sequence, conf: float = 0.25, imgsz: int = 640) -> List[dict]:
+        from detector_backends import _load_bgr
+
+        reply = self.client.predict([_load_bgr(s) for s in sources], conf, imgsz)
+        if self._info is None or reply["version"] != self._info["version"]:
+            self._refresh(force=True)      # server hot-swap model → ชื่อ class อาจเปลี่ยน
+        return reply["results"]
+
+    def warmup(self, wait_seconds: float = 30.0):
+        """รอให้ server พร้อม (server warm-up model เอง) ไม่ raise ถ้ายังไม่ขึ้น"""
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            try:
+                self._refresh(force=True)
+                return
+            except ModelServerUnavailable as e:
+                if time.monotonic() > deadline:
+                    logger.warning("Model server not ready: %s", e)
+                    return
+                time.sleep(0.5)
+
+    # ----------- metadata -----------
+    @property
+    def class_names(self) -> Dict[int, str]:
+        return self._refresh()["classes"]
+
+    @property
+    def version(self) -> str:
+        return self._refresh()["version"]
+
+    def class_name(self, cls_id: int) -> str:
+        return self.class_names.get(int(cls_id), f"class_{cls_id}")
+
+    def info(self) -> dict:
+        try:
+            info = dict(self._refresh())
+        except ModelServerUnavailable as e:
+            return {"backend": self.backend, "server": self.client.socket_path, "available": False, "error": str(e)}
+        return {**info, "server": self.client.socket_path, "available": True}
+
+
+# =========================
+# BENCHMARK
+# =========================
+def _bench(predict, images, requests: int, concurrency: int) -> dict:
+    from concurrent.futures import ThreadPoolExecutor
+
+    predict(images[:1])     # warm-up / เปิด connection
+    latencies = []
+
+    def one(i):
+        t = time.perf_counter()
+        predict([images[i % len(images)]])
+        latencies.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "images_per_s": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def run_bench(paths: List[str], requests: int, concurrency: int, socket_path: str = None) -> int:
+    from inference import BatchScheduler
+    from ingest import decode_file
+    from model_registry import ModelRegistry, active_weights_path
+
+    images = [decode_file(p, settings.YOLO_IMGSZ).array for p in paths]
+    conf, imgsz = 0.25, settings.YOLO_IMGSZ
+
+    # in-process: model + micro-batching ใน process นี้ (แบบ worker ปกติ)
+    local = ModelRegistry(active_weights_path(), backend=settings.YOLO_BACKEND.lower(), warmup_size=imgsz)
+    scheduler = BatchScheduler(
+        lambda batch: local.get().predict(batch, conf=conf, imgsz=imgsz),
+        max_batch_size=settings.YOLO_MAX_BATCH_SIZE, max_wait_ms=settings.YOLO_MAX_WAIT_MS,
+    )
+    try:
+        modes = {"in-process": lambda ims: [scheduler.submit_nowait(im).result() for im in ims]}
+        client = ModelServerClient(socket_path or settings.YOLO_MODEL_SERVER_SOCKET,
+                                   settings.YOLO_MODEL_SERVER_TIMEOUT)
+        modes["model-server"] = lambda ims: client.predict(ims, conf, imgsz)["results"]
+
+        for name, predict in modes.items():
+            try:
+                r = _bench(predict, images, requests, concurrency)
+            except ModelServerUnavailable as e:
+                print(f"{name:12s} skipped: {e}")
+                continue
+            print(f"{name:12s} {r['images_per_s']:7.1f} img/s  p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms")
+    finally:
+        scheduler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=None, help="ค่าเริ่มต้น: YOLO_MODEL_SERVER_SOCKET")
+    sub = parser.add_subparsers(dest="cmd")
+    sub.add_parser("supervise", help="รัน server และ restart เมื่อ crash (ค่าเริ่มต้น)")
+    sub.add_parser("serve", help="รัน server ใน process นี้")
+    p_bench = sub.add_parser("bench", help="เทียบ in-process กับ model server")
+    p_bench.add_argument("images", nargs="+")
+    p_bench.add_argument("--requests", type=int, default=200)
+    p_bench.add_argument("--concurrency", type=int, default=4)
+
+    args = parser.parse_args()
+    if args.cmd == "serve":
+        serve(args.socket)
+    elif args.cmd == "bench":
+        sys.exit(run_bench(args.images, args.requests, args.concurrency, args.socket))
+    else:
+        sys.exit(supervise(args.socket))
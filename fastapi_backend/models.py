@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Float, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, Date, Float, DateTime, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
+# xid (64 บิต) ของ transaction ที่เขียนแถว ใช้เป็น cursor ของ GET /meals/changes
+# เทียบกับ xmin ของ snapshot ได้ว่า transaction นั้นจบแล้วหรือยัง (ลำดับเวลา now() ไม่ใช่ลำดับ commit)
+CURRENT_XID = text("pg_current_xact_id()::text::bigint")
+
 
 # =========================
 # USER MODEL
@@ -37,6 +41,8 @@ class Profile(Base):
     gender = Column(String, nullable=True)
     date_of_birth = Column(Date, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # เปลี่ยนทุกครั้งที่แก้ profile ใช้ทำ ETag ของ GET /profiles/me
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     # --- Body Measurements ---
     height = Column(Integer, nullable=True)
@@ -100,6 +106,69 @@ class MealNutrition(Base):
     image_url = Column(String, nullable=True)
     meal_time = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # เวลาแก้ไขล่าสุด (สร้าง = created_at)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    # transaction ที่ insert / update ล่าสุด — cursor ของ GET /meals/changes
+    change_xid = Column(BigInteger, nullable=False, server_default=CURRENT_XID, onupdate=CURRENT_XID)
+    # idempotency key จาก client (POST /meals/batch) ส่งซ้ำแล้วไม่สร้างแถวซ้ำ
+    client_key = Column(String(64), nullable=True)
 
     user = relationship("User")
 
+    # ดึง created_at (server default) กลับมาตอน INSERT ด้วย RETURNING
+    # (AsyncSession lazy-load attribute ที่หมดอายุไม่ได้)
+    __mapper_args__ = {"eager_defaults": True}
+
+    __table_args__ = (
+        # ทุก query ของ meals กรอง user_id + ช่วงเวลา created_at
+        Index("ix_meal_nutrition_user_id_created_at", "user_id", "created_at"),
+        Index("uq_meal_nutrition_user_id_client_key", "user_id", "client_key", unique=True),
+        Index("ix_meal_nutrition_user_id_change_xid", "user_id", "change_xid", "id"),
+    )
+
+
+# =========================
+# MEAL TOMBSTONE (delta sync)
+# =========================
+class MealTombstone(Base):
+    """meal ที่ถูกลบ ให้ GET /meals/changes แจ้ง client ที่ sync ไว้ก่อนหน้าได้"""
+    __tablename__ = "meal_tombstones"
+    __mapper_args__ = {"eager_defaults": True}
+
+    meal_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    change_xid = Column(BigInteger, nullable=False, server_default=CURRENT_XID)
+
+    __table_args__ = (
+        Index("ix_meal_tombstones_user_id_change_xid", "user_id", "change_xid", "meal_id"),
+    )
+
+
+# =========================
+# DAILY NUTRITION ROLLUP
+# =========================
+class DailyNutritionRollup(Base):
+    """ยอดรวมต่อผู้ใช้ต่อวัน (วันตาม APP_TIMEZONE) อัปเดตแบบ delta พร้อมกับ meal_nutrition"""
+    __tablename__ = "daily_nutrition_rollup"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    calories = Column(Float, nullable=False, default=0)
+    protein = Column(Float, nullable=False, default=0)
+    carb = Column(Float, nullable=False, default=0)
+    fat = Column(Float, nullable=False, default=0)
+    meal_count = Column(Integer, nullable=False, default=0)
+
+
+# =========================
+# BATCH JOB STATE
+# =========================
+class JobState(Base):
+    """วันที่ batch job รันสำเร็จล่าสุด (เช่น recompute_targets.py birthdays ใช้หาคนที่เพิ่งผ่านวันเกิด)"""
+    __tablename__ = "job_state"
+
+    name = Column(String(64), primary_key=True)
+    last_run_on = Column(Date, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
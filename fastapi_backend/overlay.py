@@ -0,0 +1,63 @@
+# overlay.py
+import colorsys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+
+def _color(cls_id: int):
+    # สีคงที่ต่อ class (golden ratio hue) ให้รูปเดิม render ซ้ำได้เหมือนเดิม
+    h = (cls_id * 0.618033988749895) % 1.0
+    r, g, b = colorsys.hsv_to_rgb(h, 0.85, 0.95)
+    return int(r * 255), int(g * 255), int(b * 255)
+
+
+def render_overlay(image_path: Path, detections: List[dict], out_path: Path, quality: int = 85,
+                   orig_size: Optional[Tuple[int, int]] = None) -> Path:
+    """วาดกรอบ + label ของ detections ลงบนรูปต้นฉบับ แล้วเซฟเป็น JPEG
+
+    `detections` ใช้รูปแบบเดียวกับ response ของ /yolo/predict
+    (box เป็นพิกัด xyxy ของรูปต้นฉบับขนาด `orig_size`; ถ้ารูปที่เก็บไว้ถูกย่อจะ scale box ให้)
+    """
+    with Image.open(image_path) as src:
+        im = ImageOps.exif_transpose(src).convert("RGB")
+
+    sx = sy = 1.0
+    if orig_size:
+        sx, sy = im.width / orig_size[0], im.height / orig_size[1]
+
+    draw = ImageDraw.Draw(im)
+    line_w = max(2, round(max(im.size) / 300))
+    font = ImageFont.load_default()
+
+    for det in detections:
+        x1, y1, x2, y2 = det["box"]
+        x1, x2, y1, y2 = x1 * sx, x2 * sx, y1 * sy, y2 * sy
+        color = _color(int(det.get("cls", 0)))
+        draw.rectangle([x1, y1, x2, y2], outline=color, width=line_w)
+
+        text = f'{det.get("label", "")} {float(det.get("conf", 0)):.2f}'
+        tx1, ty1, tx2, ty2 = draw.textbbox((0, 0), text, font=font)
+        tw, th = tx2 - tx1, ty2 - ty1
+        top = max(0, y1 - th - 2 * line_w)
+        draw.rectangle([x1, top, x1 + tw + 2 * line_w, top + th + 2 * line_w], fill=color)
+        draw.text((x1 + line_w, top + line_w), text, fill=(255, 255, 255), font=font)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    im.save(tmp, format="JPEG", quality=quality)
+    tmp.replace(out_path)
+    return out_path
+
+
+def prune_dir(folder: Path, max_files: int, pattern: str = "*"):
+    """ลบไฟล์เก่าสุด (ตาม mtime) ที่ตรง pattern ให้เหลือไม่เกิน max_files (pattern ของ Path.glob)"""
+    if max_files <= 0:
+        return
+    files = [p for p in folder.glob(pattern) if p.is_file()]
+    if len(files) <= max_files:
+        return
+    files.sort(key=lambda p: p.stat().st_mtime)
+    for p in files[: len(files) - max_files]:
+        p.unlink(missing_ok=True)
@@ -0,0 +1,129 @@
+# passwords.py
+"""hash / verify รหัสผ่าน (bcrypt) บน process pool แยก
+
+bcrypt ใช้ CPU ~250 ms ต่อครั้ง ถ้ารันใน handler จะกิน thread ของ threadpool และ event loop
+ที่นี่จึงส่งงานไป process pool ขนาดจำกัด และปฏิเสธ (503) เมื่องานค้างเกิน PASSWORD_HASH_MAX_PENDING
+process ของ pool รันด้วย nice PASSWORD_HASH_NICE: ตอน login storm CPU ไปที่ request อื่นก่อน
+(login ช้าลงแทนที่ทุก endpoint จะช้า)
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from config import settings
+
+# min/max = rounds ปัจจุบัน → hash ที่ cost ไม่ตรงจะ needs_update() แล้วถูก rehash ตอน login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+# ----------- worker (รันใน process ลูก) -----------
+def _init_worker(niceness: int):
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    ok = pwd_context.verify(password, hashed)
+    if ok and pwd_context.needs_update(hashed):
+        return True, pwd_context.hash(password)
+    return ok, None
+
+
+# ----------- pool + admission control -----------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                initializer=_init_worker,
+                initargs=(settings.PASSWORD_HASH_NICE,),
+            )
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
+def check_capacity():
+    """503 ทันทีถ้างานค้างเต็มแล้ว — เรียกก่อน query DB ให้ request ที่จะโดนปฏิเสธไม่เปลือง connection / CPU
+
+    (ตัวกันจริงคือ _admit ตอนส่งงาน; ตรงนี้แค่ตัดงานที่ไม่จำเป็นช่วง login storm)
+    """
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise _busy()
+
+
+def _admit():
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise _busy()
+        _pending += 1
+
+
+def _release():
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def _run(fn, *args):
+    _admit()
+    try:
+        return await asyncio.wrap_future(_get_pool().submit(fn, *args))
+    finally:
+        _release()
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """คืน (ถูกต้องไหม, hash ใหม่ถ้าต้อง rehash เพราะ cost เปลี่ยน)"""
+    return await _run(_verify, password, hashed)
+
+
+def stats() -> dict:
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "pending": _pending,
+        "max_pending": settings.PASSWORD_HASH_MAX_PENDING,
+        "nice": settings.PASSWORD_HASH_NICE,
+        "rounds": settings.BCRYPT_ROUNDS,
+    }
@@ -0,0 +1,75 @@
+# prediction_cache.py
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from cache import TieredCache
+from config import settings
+from overlay import prune_dir
+
+BASE_DIR = Path(__file__).resolve().parent
+PREDICTIONS_DIR = BASE_DIR / "results" / "predictions"
+
+
+class PredictionCache:
+    """ผล prediction keyed ด้วย (sha256 ของรูป, version ของ model)
+
+    TieredCache (LRU ใน memory + Redis ถ้าตั้งไว้ แชร์ข้ามเครื่องได้)
+    persist=True: เก็บเป็น JSON บน disk ด้วย (อยู่รอดข้าม restart และแชร์ระหว่าง worker บนเครื่องเดียวกัน)
+    จำกัดไว้ max_files ไฟล์รวมทุก version (version เก่าไม่ถูกอ่านอีกแล้ว จึงถูกลบก่อนตาม mtime)
+    ผลของ (รูป, model) เดิมไม่เปลี่ยน จึงไม่ต้อง invalidate
+    """
+
+    def __init__(self, root: Path, memory_size: int = 2048, persist: bool = False, max_files: int = 0):
+        self.root = root
+        self.persist = persist
+        self.max_files = max_files
+        self._memory = TieredCache(
+            "prediction",
+            maxsize=memory_size,
+            ttl=settings.YOLO_PREDICTION_SHARED_TTL_SECONDS,
+        )
+        # prune ทุก ๆ ~10% ของ max_files ที่เขียน (ไม่ list ทั้งโฟลเดอร์ทุก put) → เกินได้ไม่เกิน ~10%
+        self._prune_every = max(1, max_files // 10)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, digest: str, model_version: str) -> Path:
+        return self.root / model_version / f"{digest}.json"
+
+    def get(self, digest: str, model_version: str) -> Optional[dict]:
+        key = f"{model_version}:{digest}"
+        val = self._memory.get(key)
+        if val is None:
+            if not self.persist:
+                self.misses += 1
+                return None
+            try:
+                with self._path(digest, model_version).open("r", encoding="utf-8") as f:
+                    val = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self.misses += 1
+                return None
+            self._memory.set(key, val)
+        self.hits += 1
+        return val
+
+    def put(self, digest: str, model_version: str, prediction: dict):
+        self._memory.set(f"{model_version}:{digest}", prediction)
+        if not self.persist:
+            return
+        path = self._path(digest, model_version)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(prediction, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % self._prune_every == 0:
+            prune_dir(self.root, self.max_files, "*/*.json")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "disk": self.persist, "memory": self._memory.stats()}
@@ -0,0 +1,356 @@
+# recompute_targets.py
+"""คำนวณ age-dependent / สูตรเป้าหมายสุขภาพของ profiles ใหม่ทั้งตาราง
+
+crud._apply_health_calculation คำนวณทีละ profile ตอนถูกแก้เท่านั้น ค่าจึงเก่าเมื่อผู้ใช้อายุเพิ่ม
+หรือเมื่อแก้สูตรใน crud.calc_* — job นี้อ่าน profiles ทีละ chunk (keyset ตาม id) คำนวณสูตรเดียวกัน
+ด้วย NumPy ทั้งคอลัมน์ แล้ว UPDATE เฉพาะแถวที่ค่าเปลี่ยน (statement เดียวต่อ chunk)
+
+- full      : ทุก profile (หลังแก้สูตร)
+- birthdays : เฉพาะคนที่ผ่านวันเกิดตั้งแต่รันสำเร็จครั้งก่อน (job_state) รันวันละครั้งได้
+- parity    : เทียบผล vectorized กับฟังก์ชัน scalar ใน crud (แถวจริงใน DB หรือ --synthetic N)
+
+UPDATE มีเงื่อนไข updated_at = ค่าที่อ่านมา: ถ้าผู้ใช้แก้ profile ระหว่างนั้น (API คำนวณให้แล้ว) จะข้ามแถวนั้น
+
+    python recompute_targets.py full [--chunk 5000] [--dry-run]
+    python recompute_targets.py birthdays
+    python recompute_targets.py parity [--synthetic 100000]
+"""
+from datetime import date
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import Integer, and_, cast, extract, or_, select, text
+from sqlalchemy.orm import Session
+
+import crud
+from models import JobState, Profile
+
+JOB_NAME = "recompute_targets"
+
+_INPUTS = ("gender", "height", "current_weight", "goal", "lifestyle")
+# คอลัมน์ผลลัพธ์ (ชื่อคอลัมน์ใน profiles) ตามลำดับ
+TARGETS = ("bmi", "bmr", "tdee", "protein_target", "carb_target", "fat_target", "target_calories")
+
+_MALE = ["male", "ชาย", "m"]
+_LIFESTYLE_FACTOR = {"sedentary": 1.2, "light": 1.375, "moderate": 1.55, "active": 1.725, "athlete": 1.9}
+_DEFAULT_FACTOR = 1.375
+# goal → (protein g/kg, สัดส่วนพลังงานจากไขมัน, ตัวคูณแคลอรี่) ตาม crud.calc_macro
+_GOALS = {"ลดน้ำหนัก": (2.0, 0.25, 0.80), "เพิ่มน้ำหนัก": (2.2, 0.30, 1.15)}
+_DEFAULT_GOAL = (1.4, 0.30, 1.0)
+
+
+# =========================
+# VECTORIZED FORMULAS
+# =========================
+def _lookup(values: np.ndarray, table: dict, default: float) -> np.ndarray:
+    out = np.full(len(values), default, dtype=float)
+    for key, v in table.items():
+        out[values == key] = v
+    return out
+
+
+def _valid(x: np.ndarray) -> np.ndarray:
+    # `not x` ใน crud: None และ 0 ถือว่าไม่มีค่า
+    return ~np.isnan(x) & (x != 0)
+
+
+def _round1(x: np.ndarray) -> np.ndarray:
+    """round(x, 1) แบบ Python: np.round คูณ 10 ก่อนจึงอาจปัดต่างที่ค่ากึ่งกลางพอดี → ใช้ round ของ Python เฉพาะตัวนั้น"""
+    out = np.round(x, 1)
+    frac = np.abs(np.mod(x * 10, 1) - 0.5)
+    tie = np.flatnonzero(frac < 1e-6)
+    for i in tie:
+        out[i] = round(float(x[i]), 1)
+    return out
+
+
+def compute_targets(cols: Dict[str, np.ndarray], today: date) -> Dict[str, np.ndarray]:
+    """สูตรเดียวกับ crud._apply_health_calculation ทั้งคอลัมน์
+
+    cols: gender / goal / lifestyle (object), height / current_weight / dob_year / dob_md (float, NaN = NULL)
+    คืน array float ต่อคอลัมน์ใน TARGETS (NaN = NULL)
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):     # NULL / 0 → NaN แล้วค่อยกรองด้วย mask
+        return _compute(cols, today)
+
+
+def _compute(cols: Dict[str, np.ndarray], today: date) -> Dict[str, np.ndarray]:
+    h, w = cols["height"], cols["current_weight"]
+    n = len(h)
+    nan = np.full(n, np.nan)
+
+    # AGE (dob_md = เดือน*100 + วัน)
+    today_md = today.month * 100 + today.day
+    age = today.year - cols["dob_year"] - (today_md < cols["dob_md"])
+
+    # BMI
+    h_m = h / 100
+    bmi = np.where(_valid(w) & _valid(h), _round1(w / (h_m * h_m)), nan)
+
+    # BMR
+    base = 10 * w + 6.25 * h - 5 * age
+    male = np.zeros(n, dtype=bool)
+    for g in _MALE:
+        male |= cols["gender"] == g
+    bmr = np.where(_valid(w) & _valid(h) & _valid(age), np.rint(np.where(male, base + 5, base - 161)), nan)
+
+    # TDEE
+    tdee = np.where(_valid(bmr), np.rint(bmr * _lookup(cols["lifestyle"], _LIFESTYLE_FACTOR, _DEFAULT_FACTOR)), nan)
+
+    # Macros
+    goal = cols["goal"]
+    protein_per_kg = _lookup(goal, {g: v[0] for g, v in _GOALS.items()}, _DEFAULT_GOAL[0])
+    fat_ratio = _lookup(goal, {g: v[1] for g, v in _GOALS.items()}, _DEFAULT_GOAL[1])
+    cal_factor = _lookup(goal, {g: v[2] for g, v in _GOALS.items()}, _DEFAULT_GOAL[2])
+
+    target_cal = np.rint(tdee * cal_factor)
+    protein_g = np.rint(w * protein_per_kg)
+    fat_cal = np.rint(target_cal * fat_ratio)
+    fat_g = np.rint(fat_cal / 9)
+    carb_g = np.rint((target_cal - (protein_g * 4 + fat_cal)) / 4)
+
+    has_macro = _valid(tdee) & _valid(w)
+    macros = {k: np.where(has_macro, v, nan) for k, v in
+              (("protein_target", protein_g), ("carb_target", carb_g), ("fat_target", fat_g),
+               ("target_calories", target_cal))}
+    return {"bmi": bmi, "bmr": bmr, "tdee": tdee, **macros}
+
+
+# =========================
+# STREAMING + BULK UPDATE
+# =========================
+def _select(after_id: int, limit: int, where=None):
+    stmt = (
+        select(
+            Profile.id, Profile.user_id, Profile.updated_at,
+            *[getattr(Profile, c) for c in _INPUTS],
+            cast(extract("year", Profile.date_of_birth), Integer),
+            cast(extract("month", Profile.date_of_birth) * 100 + extract("day", Profile.date_of_birth), Integer),
+            *[getattr(Profile, c) for c in TARGETS],
+        )
+        .where(Profile.id > after_id)
+        .order_by(Profile.id)
+        .limit(limit)
+    )
+    return stmt if where is None else stmt.where(where)
+
+
+def _chunks(db: Session, chunk: int, where=None) -> Iterator[list]:
+    last_id = 0
+    while True:
+        rows = db.execute(_select(last_id, chunk, where)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _columns(rows: list) -> Dict[str, np.ndarray]:
+    cols = list(zip(*rows))
+    names = ("id", "user_id", "updated_at", *_INPUTS, "dob_year", "dob_md", *TARGETS)
+    data = dict(zip(names, cols))
+    out = {k: np.array(data[k], dtype=object) for k in ("gender", "goal", "lifestyle")}
+    for k in ("height", "current_weight", "dob_year", "dob_md", *TARGETS):
+        # None → NaN
+        out[k] = np.array(data[k], dtype=float)
+    out["id"], out["user_id"], out["updated_at"] = data["id"], data["user_id"], data["updated_at"]
+    return out
+
+
+def _changed(cols: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> np.ndarray:
+    mask = np.zeros(len(cols["id"]), dtype=bool)
+    for k in TARGETS:
+        old, val = cols[k], new[k]
+        mask |= ~((old == val) | (np.isnan(old) & np.isnan(val)))
+    return np.flatnonzero(mask)
+
+
+def _param(v: float, k: str):
+    if np.isnan(v):
+        return None
+    return float(v) if k == "bmi" else int(v)
+
+
+_ARRAY_TYPES = {"bmi": "float8"}     # คอลัมน์อื่นใน TARGETS เป็น integer
+
+# UPDATE ... FROM unnest(arrays) statement เดียวต่อ chunk: bind แค่ array ละคอลัมน์
+# (executemany = round trip ต่อแถว, VALUES หลายพันแถว = compile bind param ทีละตัว)
+# updated_at ไม่ตรงกับตอนอ่าน (ผู้ใช้เพิ่งแก้ profile ผ่าน API) → ข้ามแถวนั้น
+_BULK_UPDATE = text(
+    "UPDATE profiles AS p SET "
+    + ", ".join(f"{k} = src.{k}" for k in TARGETS)
+    + ", updated_at = now() FROM unnest(CAST(:id AS integer[]), CAST(:read_at AS timestamptz[]), "
+    + ", ".join(f"CAST(:{k} AS {_ARRAY_TYPES.get(k, 'integer')}[])" for k in TARGETS)
+    + ") AS src(id, read_at, " + ", ".join(TARGETS) + ")"
+    " WHERE p.id = src.id AND p.updated_at = src.read_at"
+)
+
+
+def recompute(db: Session, today: Optional[date] = None, where=None, chunk: int = 5000,
+              dry_run: bool = False) -> Dict[str, int]:
+    """คำนวณใหม่ทุก profile ที่ตรง `where` คืน {"scanned", "changed", "updated"}"""
+    today = today or date.today()
+    stats = {"scanned": 0, "changed": 0, "updated": 0}
+    for rows in _chunks(db, chunk, where):
+        cols = _columns(rows)
+        new = compute_targets(cols, today)
+        idx = _changed(cols, new)
+        stats["scanned"] += len(rows)
+        stats["changed"] += len(idx)
+        if not len(idx) or dry_run:
+            continue
+
+        params = {
+            "id": [cols["id"][i] for i in idx],
+            "read_at": [cols["updated_at"][i] for i in idx],
+            **{k: [_param(new[k][i], k) for i in idx] for k in TARGETS},
+        }
+        result = db.execute(_BULK_UPDATE, params)
+        db.commit()
+        stats["updated"] += result.rowcount
+        # UPDATE ตรง ๆ ไม่ผ่าน ORM event → ลบ cache ของ GET /profiles/me เอง
+        for i in idx:
+            crud.profile_cache.delete(cols["user_id"][i])
+    return stats
+
+
+# =========================
+# INCREMENTAL (birthdays)
+# =========================
+def _birthday_filter(since: date, today: date):
+    """profile ที่ (เดือน, วัน) เกิดอยู่ในช่วง (since, today] → อายุเพิ่มในช่วงนั้น"""
+    md = extract("month", Profile.date_of_birth) * 100 + extract("day", Profile.date_of_birth)
+    a, b = since.month * 100 + since.day, today.month * 100 + today.day
+    if (today.year, b) >= (since.year + 1, a):
+        # ห่างเกินหนึ่งปี: ทุกคนผ่านวันเกิดแล้ว
+        return Profile.date_of_birth.isnot(None)
+    if since.year == today.year:
+        return and_(md > a, md <= b)
+    return or_(md > a, md <= b)
+
+
+def last_run(db: Session) -> Optional[date]:
+    state = db.get(JobState, JOB_NAME)
+    return state.last_run_on if state is not None else None
+
+
+def mark_run(db: Session, today: date):
+    db.merge(JobState(name=JOB_NAME, last_run_on=today))
+    db.commit()
+
+
+def recompute_birthdays(db: Session, today: Optional[date] = None, chunk: int = 5000) -> Dict[str, int]:
+    """เฉพาะคนที่ผ่านวันเกิดตั้งแต่ครั้งก่อน (ยังไม่เคยรัน → ทั้งตาราง)"""
+    today = today or date.today()
+    since = last_run(db)
+    if since is not None and since >= today:
+        return {"scanned": 0, "changed": 0, "updated": 0}
+    where = None if since is None else _birthday_filter(since, today)
+    stats = recompute(db, today, where=where, chunk=chunk)
+    mark_run(db, today)
+    return stats
+
+
+# =========================
+# PARITY CHECK
+# =========================
+def _scalar(cols: Dict[str, np.ndarray], i: int, today: date) -> List[Optional[float]]:
+    def val(k):
+        v = cols[k][i]
+        return None if isinstance(v, float) and np.isnan(v) else v
+
+    dob = None
+    if not np.isnan(cols["dob_year"][i]):
+        md = int(cols["dob_md"][i])
+        dob = date(int(cols["dob_year"][i]), md // 100, md % 100)
+    payload = {k: val(k) for k in _INPUTS}
+    for k in ("height", "current_weight"):
+        payload[k] = None if payload[k] is None else int(payload[k])
+    out = crud._apply_health_calculation({**payload, "date_of_birth": dob}, today)
+    return [out[k] for k in TARGETS]
+
+
+def _synthetic(n: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+
+    def with_nulls(x, p=0.05):
+        x = x.astype(float)
+        x[rng.random(n) < p] = np.nan
+        return x
+
+    years = rng.integers(1940, 2015, n)
+    months = rng.integers(1, 13, n)
+    days = np.minimum(rng.integers(1, 32, n), [28 if m == 2 else 30 if m in (4, 6, 9, 11) else 31 for m in months])
+    leap = (months == 2) & (rng.random(n) < 0.02) & (years % 4 == 0)
+    days[leap] = 29
+    dob_md = with_nulls(months * 100 + days)
+    dob_year = np.where(np.isnan(dob_md), np.nan, years)
+    return {
+        "gender": rng.choice(np.array(["male", "female", "ชาย", "หญิง", "m", "f", None], dtype=object), n),
+        "goal": rng.choice(np.array(["ลดน้ำหนัก", "เพิ่มน้ำหนัก", "รักษาหุ่น", None], dtype=object), n),
+        "lifestyle": rng.choice(np.array([*_LIFESTYLE_FACTOR, "unknown", None], dtype=object), n),
+        "height": with_nulls(rng.integers(0, 210, n)),
+        "current_weight": with_nulls(rng.integers(0, 180, n)),
+        "dob_year": dob_year,
+        "dob_md": dob_md,
+    }
+
+
+def parity(cols: Dict[str, np.ndarray], today: date, show: int = 10) -> int:
+    """คืนจำนวนแถวที่ vectorized ไม่ตรงกับ scalar"""
+    new = compute_targets(cols, today)
+    bad = 0
+    for i in range(len(cols["height"])):
+        expected = _scalar(cols, i, today)
+        got = [_param(new[k][i], k) for k in TARGETS]
+        if got != expected:
+            bad += 1
+            if bad <= show:
+                print(f"row {i}: scalar={expected} vectorized={got}")
+    return bad
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_full = sub.add_parser("full", help="recompute every profile")
+    p_full.add_argument("--chunk", type=int, default=5000)
+    p_full.add_argument("--dry-run", action="store_true", help="นับแถวที่จะเปลี่ยน ไม่เขียน")
+    p_bday = sub.add_parser("birthdays", help="recompute profiles whose birthday passed since the last run")
+    p_bday.add_argument("--chunk", type=int, default=5000)
+    p_par = sub.add_parser("parity", help="compare vectorized formulas with crud scalar functions")
+    p_par.add_argument("--synthetic", type=int, default=0, help="สุ่ม N แถวแทนการอ่านจาก DB")
+    args = parser.parse_args()
+
+    today = date.today()
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        if args.cmd == "parity":
+            if args.synthetic:
+                cols = _synthetic(args.synthetic)
+            else:
+                rows = [r for chunk in _chunks(db, 5000) for r in chunk]
+                if not rows:
+                    print("no profiles")
+                    sys.exit(0)
+                cols = _columns(rows)
+            bad = parity(cols, today)
+            print(f"{len(cols['height']) - bad}/{len(cols['height'])} rows match")
+            sys.exit(1 if bad else 0)
+        if args.cmd == "full":
+            stats = recompute(db, today, chunk=args.chunk, dry_run=args.dry_run)
+            if not args.dry_run:
+                mark_run(db, today)
+        else:
+            stats = recompute_birthdays(db, today, chunk=args.chunk)
+        print(f"scanned {stats['scanned']}, changed {stats['changed']}, updated {stats['updated']}"
+              f" in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
@@ -0,0 +1,122 @@
+# rollup.py
+"""ดูแลตาราง daily_nutrition_rollup
+
+create / update / delete meal เรียก add_meal / remove_meal ใน transaction เดียวกับการแก้ meal
+(AsyncSession ของ router, ยังไม่ commit ในนี้) ส่วน rebuild (sync) ใช้สร้างใหม่ทั้งหมดจาก meal_nutrition
+
+    python rollup.py backfill [--user-id N]
+"""
+from datetime import date
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import DailyNutritionRollup, MealNutrition
+
+ROLLUP_ZONE = ZoneInfo(settings.APP_TIMEZONE)
+
+_VALUE_FIELDS = ("calories", "protein", "carb", "fat")
+_SUM_FIELDS = (*_VALUE_FIELDS, "meal_count")
+
+
+def meal_day(meal: MealNutrition) -> date:
+    """วันของ meal ตาม APP_TIMEZONE (ต้อง flush แล้ว ให้ created_at มีค่า)"""
+    return meal.created_at.astimezone(ROLLUP_ZONE).date()
+
+
+def _upsert(rows):
+    table = DailyNutritionRollup.__table__
+    stmt = pg_insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day],
+        set_={k: table.c[k] + stmt.excluded[k] for k in _SUM_FIELDS},
+    )
+
+
+async def apply_delta(db: AsyncSession, user_id: int, day: date, sign: int = 1, count: int = 1, **values):
+    """บวก (sign=1) หรือลบ (sign=-1) ค่าเข้า rollup ของวันนั้นด้วย upsert เดียว"""
+    row = {f: sign * float(values.get(f) or 0) for f in _VALUE_FIELDS}
+    row["meal_count"] = sign * count
+    await db.execute(_upsert([{"user_id": user_id, "day": day, **row}]))
+
+
+def snapshot(meal: MealNutrition) -> dict:
+    """ค่าเดิมของ meal ก่อนแก้ (ใช้ลบออกจาก rollup ตอน update)"""
+    return {"user_id": meal.user_id, "day": meal_day(meal), **{f: getattr(meal, f) for f in _VALUE_FIELDS}}
+
+
+async def add_meal(db: AsyncSession, meal: MealNutrition):
+    await apply_delta(db, meal.user_id, meal_day(meal), 1, **{f: getattr(meal, f) for f in _VALUE_FIELDS})
+
+
+async def add_meals(db: AsyncSession, meals):
+    """หลาย meal ในครั้งเดียว: รวมตาม (user, วัน) แล้ว upsert หลายแถวใน statement เดียว"""
+    per_day = {}
+    for meal in meals:
+        acc = per_day.setdefault((meal.user_id, meal_day(meal)), dict.fromkeys(_SUM_FIELDS, 0))
+        for f in _VALUE_FIELDS:
+            acc[f] += float(getattr(meal, f) or 0)
+        acc["meal_count"] += 1
+    if per_day:
+        await db.execute(_upsert([{"user_id": u, "day": d, **v} for (u, d), v in per_day.items()]))
+
+
+async def remove_meal(db: AsyncSession, meal: MealNutrition):
+    await remove_snapshot(db, snapshot(meal))
+
+
+async def remove_snapshot(db: AsyncSession, snap: dict):
+    values = {f: snap[f] for f in _VALUE_FIELDS}
+    await apply_delta(db, snap["user_id"], snap["day"], -1, **values)
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """สร้าง rollup ใหม่จาก meal_nutrition (ทั้งหมด หรือเฉพาะ user) คืนจำนวนแถว"""
+    day_col = func.date(func.timezone(ROLLUP_ZONE.key, MealNutrition.created_at))
+
+    src = (
+        select(
+            MealNutrition.user_id,
+            day_col,
+            *[func.coalesce(func.sum(getattr(MealNutrition, f)), 0) for f in _VALUE_FIELDS],
+            func.count(MealNutrition.id),
+        )
+        .group_by(MealNutrition.user_id, day_col)
+    )
+    clear = delete(DailyNutritionRollup)
+    if user_id is not None:
+        src = src.where(MealNutrition.user_id == user_id)
+        clear = clear.where(DailyNutritionRollup.user_id == user_id)
+
+    db.execute(clear)
+    result = db.execute(
+        insert(DailyNutritionRollup).from_select(
+            ["user_id", "day", *_VALUE_FIELDS, "meal_count"], src
+        )
+    )
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_back = sub.add_parser("backfill", help="rebuild daily_nutrition_rollup from meal_nutrition")
+    p_back.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        n = rebuild(db, args.user_id)
+        db.commit()
+        print(f"rebuilt {n} rollup rows")
+    finally:
+        db.close()
@@ -1,71 +1,73 @@
 # routers/files.py
-import uuid
 from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Request
-from fastapi.responses import JSONResponse
-from PIL import Image, UnidentifiedImageError
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
+
+from storage import MAX_BYTES, save_upload, resolve_upload
+import thumbnails
+from metrics import record_upload
 
 BASE_DIR   = Path(__file__).resolve().parent.parent
-UPLOAD_DIR = BASE_DIR / "uploads"
 RESULTS_DIR= BASE_DIR / "results" / "runs"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
-router = APIRouter(prefix="/files", tags=["files"])
-
-MAX_BYTES = 8 * 1024 * 1024
-ALLOWED_EXT = {"jpg", "jpeg", "png", "webp"}
-
-def _make_filename(orig_name: str) -> str:
-    ext = (orig_name or "").split(".")[-1].lower()
-    if ext not in ALLOWED_EXT:
-        ext = "jpg"
-    return f"{uuid.uuid4().hex}.{ext}"
-
-async def _save_upload(file: UploadFile, max_bytes: int = MAX_BYTES) -> Path:
-    fname = _make_filename(file.filename)
-    fpath = UPLOAD_DIR / fname
-
-    size = 0
-    CHUNK = 64 * 1024
-
-    with fpath.open("wb") as out:
-        while True:
-            chunk = await file.read(CHUNK)
-            if not chunk:
-                break
-            size += len(chunk)
-            if size > max_bytes:
-                out.close()
-                fpath.unlink(missing_ok=True)
-                raise HTTPException(status_code=413, detail="File too large")
-            out.write(chunk)
-
-    try:
-        with Image.open(fpath) as im:
-            im.verify()
-    except UnidentifiedImageError:
-        fpath.unlink(missing_ok=True)
-        raise HTTPException(status_code=400, detail="Invalid image file")
-
-    return fpath
+# ชื่อไฟล์ = hash ของเนื้อหา → รูปย่อของ URL เดิมไม่มีวันเปลี่ยน
+IMMUTABLE = "public, max-age=31536000, immutable"
 
-def _to_url_path(p: Path) -> str:
-    return f"/uploads/{p.name}"
+router = APIRouter(prefix="/files", tags=["files"])
 
 # ============ FIXED UPLOAD WITHOUT AUTH =============
 @router.post("/upload")
 async def upload_file(
-    file: UploadFile = File(...)
+    background: BackgroundTasks,
+    file: UploadFile = File(...),
 ):
     if not (file.content_type or "").startswith("image/"):
         raise HTTPException(status_code=400, detail="Only image allowed")
 
-    saved = await _save_upload(file)
+    # ชื่อไฟล์ = sha256 ของเนื้อไฟล์ อัปโหลดซ้ำ (app retry) ไม่เก็บซ้ำ
+    saved = await save_upload(file, MAX_BYTES)
+    record_upload("/files/upload", saved.size)
+
+    # รูปย่อสร้างหลังส่ง response แล้ว (ถ้ามีครบอยู่แล้ว generate จะไม่ทำอะไร)
+    background.add_task(thumbnails.generate, saved.path)
 
     return JSONResponse(
-        {"url": _to_url_path(saved), "filename": saved.name},
-        status_code=status.HTTP_201_CREATED
+        {"url": saved.url, "filename": saved.name, "thumbnails": thumbnails.thumb_urls(saved.path)},
+        status_code=status.HTTP_201_CREATED if saved.created else status.HTTP_200_OK
+    )
+
+
+# ============ THUMBNAILS =============
+@router.get("/thumb/{size}/{filename}")
+async def get_thumbnail(
+    size: int,
+    filename: str,
+    request: Request,
+    fmt: Optional[str] = Query(None, description="webp / jpg; ไม่ส่ง = webp ถ้า client รับได้"),
+):
+    if size not in thumbnails.sizes():
+        raise HTTPException(status_code=404, detail=f"size must be one of {thumbnails.sizes()}")
+    if fmt is None:
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpg"
+    if fmt not in thumbnails.FORMATS:
+        raise HTTPException(status_code=400, detail="fmt must be webp or jpg")
+
+    source = resolve_upload(filename)
+    if source is None:
+        raise HTTPException(status_code=404, detail="image not found")
+
+    out = thumbnails.thumb_path(source, size, fmt)
+    if not out.is_file():
+        # รูปเก่าที่ยังไม่มีรูปย่อ: สร้างครบทุกขนาดครั้งเดียว ครั้งต่อไปได้ไฟล์เลย
+        if not await run_in_threadpool(thumbnails.generate, source) or not out.is_file():
+            raise HTTPException(status_code=404, detail="image not found")
+
+    return FileResponse(
+        out,
+        media_type=thumbnails.FORMATS[fmt][2],
+        headers={"Cache-Control": IMMUTABLE, "Vary": "Accept"},
     )
@@ -1,96 +1,448 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
-from sqlalchemy import cast, Date, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, desc, func, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import List, Optional
-from datetime import date
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from database import get_db
-from models import MealNutrition
-from schemas import MealCreate, MealOut, MealUpdate
-from auth import get_current_user_email
-import crud
+from database import get_async_db
+from models import MealNutrition, MealTombstone, Profile, DailyNutritionRollup
+from schemas import (
+    MealCreate, MealOut, MealUpdate,
+    MealBatchCreate, MealBatchOut, MealBatchResult, MealChanges,
+    DailySummary, RangeSummary, NutritionTargets, NutritionTotals, MealTimeTotals, DayTotals,
+)
+from auth import get_current_user, CurrentUser
+from config import settings
+from cursors import encode_cursor, decode_cursor, encode_change_cursor, decode_change_cursor
+from etag import Conditional
+import rollup
 
 router = APIRouter(prefix="/meals", tags=["meals"])
 
+MAX_SUMMARY_DAYS = 366
+MAX_BATCH_ITEMS = 500
+MEALS_PAGE_SIZE = 50
+MAX_MEALS_PAGE = 200
+# field ที่เลือกได้ใน ?fields= (id / created_at ติดไปเสมอเพราะใช้ทำ cursor)
+MEAL_FIELDS = tuple(MealOut.model_fields)
+MAX_CHANGES_PAGE = 1000
+
+
+# ----------- Timezone / date range helpers -----------
+# วันที่ของ meal นับตาม timezone ของผู้ใช้ และกรองด้วยช่วงเวลาแบบ half-open
+# [เที่ยงคืนวันนั้น, เที่ยงคืนวันถัดไป) บน created_at ตรง ๆ ให้ใช้ index (user_id, created_at) ได้
+# (cast(created_at, Date) ใช้ index ไม่ได้ และได้วันตาม timezone ของ DB session)
+def _zone(tz: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(tz or settings.APP_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+
+
+def _local_today(zone: ZoneInfo) -> date:
+    return datetime.now(zone).date()
+
+
+def _day_range(start: date, end: date, zone: ZoneInfo):
+    """[start 00:00, (end + 1) 00:00) ในเวลาท้องถิ่นของ zone"""
+    lo = datetime.combine(start, time.min, tzinfo=zone)
+    hi = datetime.combine(end + timedelta(days=1), time.min, tzinfo=zone)
+    return MealNutrition.created_at >= lo, MealNutrition.created_at < hi
+
+
+def _uses_rollup(zone: ZoneInfo) -> bool:
+    # daily_nutrition_rollup นับวันตาม APP_TIMEZONE; timezone อื่นคำนวณจาก meal_nutrition
+    return zone.key == rollup.ROLLUP_ZONE.key
+
+
+def _local_date(zone: ZoneInfo):
+    # วันที่ท้องถิ่นของ created_at (ใช้ใน SELECT / GROUP BY เท่านั้น ไม่ใช้ใน WHERE)
+    # GROUP BY ด้วยชื่อ label "d": asyncpg ส่ง zone เป็น bind parameter แยก ($1/$2)
+    # ถ้า GROUP BY ทั้ง expression ซ้ำ Postgres จะมองว่าเป็นคนละ expression กับใน SELECT
+    return func.date(func.timezone(zone.key, MealNutrition.created_at))
+
+
+def _totals_columns():
+    # รวมค่าโภชนาการฝั่ง SQL (SUM/COUNT) แทนการส่งทุกแถวไปบวกในแอป
+    return (
+        func.coalesce(func.sum(MealNutrition.calories), 0).label("calories"),
+        func.coalesce(func.sum(MealNutrition.protein), 0).label("protein"),
+        func.coalesce(func.sum(MealNutrition.carb), 0).label("carb"),
+        func.coalesce(func.sum(MealNutrition.fat), 0).label("fat"),
+        func.count(MealNutrition.id).label("meal_count"),
+    )
+
+
+def _row_totals(row) -> dict:
+    return {
+        "calories": float(row.calories or 0),
+        "protein": float(row.protein or 0),
+        "carb": float(row.carb or 0),
+        "fat": float(row.fat or 0),
+        "meal_count": int(row.meal_count or 0),
+    }
+
+
+def _sum_totals(items) -> NutritionTotals:
+    total = NutritionTotals()
+    for t in items:
+        total.calories += t.calories
+        total.protein += t.protein
+        total.carb += t.carb
+        total.fat += t.fat
+        total.meal_count += t.meal_count
+    return total
+
+
+async def _targets(db: AsyncSession, user_id: int) -> NutritionTargets:
+    row = (await db.execute(
+        select(
+            Profile.target_calories,
+            Profile.protein_target,
+            Profile.carb_target,
+            Profile.fat_target,
+        )
+        .where(Profile.user_id == user_id)
+    )).first()
+    if not row:
+        return NutritionTargets()
+    return NutritionTargets(**row._asdict())
+
 
 # 🟢 Create meal — Automatically attach user_id
 @router.post("", response_model=MealOut)
-def create_meal(
+async def create_meal(
     payload: MealCreate,
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
 
     meal = MealNutrition(
         user_id=user.id,
         **payload.dict()
     )
     db.add(meal)
-    db.commit()
-    db.refresh(meal)
+    await db.flush()
+    await rollup.add_meal(db, meal)
+    await db.commit()
     return meal
 
 
+def _client_created_at(ts: Optional[datetime], now: datetime):
+    """created_at ของ meal ที่ replay จาก offline: ไม่เกินตอนนี้ และเก่าได้ไม่เกิน MEAL_BATCH_MAX_AGE_DAYS
+    (นาฬิกาเครื่อง client เพี้ยนได้) ไม่ส่งมา = now() ของ DB แบบ create_meal"""
+    if ts is None:
+        return func.now()
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=now.tzinfo)
+    return min(max(ts, now - timedelta(days=settings.MEAL_BATCH_MAX_AGE_DAYS)), now)
+
+
+# 🟢 Batch create (offline replay) — idempotent by client_key, one INSERT + one commit
+@router.post("/batch", response_model=MealBatchOut)
+async def create_meals_batch(
+    payload: MealBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(payload.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"batch is limited to {MAX_BATCH_ITEMS} items")
+
+    # key ซ้ำใน request เดียวกัน → ใช้ตัวแรก
+    unique = {}
+    for item in payload.items:
+        unique.setdefault(item.client_key, item)
+
+    # แถวที่ key ชนกับของเดิม (ส่งซ้ำ) ถูกข้ามด้วย ON CONFLICT DO NOTHING
+    # RETURNING คืนเฉพาะแถวที่ insert จริง
+    now = datetime.now(_zone(None))
+    stmt = (
+        pg_insert(MealNutrition)
+        .values([
+            {"user_id": user.id, **item.dict(), "created_at": _client_created_at(item.created_at, now)}
+            for item in unique.values()
+        ])
+        .on_conflict_do_nothing(index_elements=["user_id", "client_key"])
+        .returning(MealNutrition)
+    )
+    created = {m.client_key: m for m in (await db.scalars(stmt)).all()}
+    await rollup.add_meals(db, created.values())
+
+    existing = {}
+    missing = [k for k in unique if k not in created]
+    if missing:
+        rows = await db.scalars(
+            select(MealNutrition)
+            .where(MealNutrition.user_id == user.id, MealNutrition.client_key.in_(missing))
+        )
+        existing = {m.client_key: m for m in rows}
+
+    await db.commit()
+
+    results, seen = [], set()
+    for item in payload.items:
+        key = item.client_key
+        is_new = key in created and key not in seen
+        seen.add(key)
+        results.append(MealBatchResult(
+            client_key=key,
+            status="created" if is_new else "duplicate",
+            meal=created.get(key) or existing[key],
+        ))
+
+    return MealBatchOut(
+        created=len(created),
+        duplicates=len(results) - len(created),
+        results=results,
+    )
+
+
 # 🟢 Get meals for CURRENT user only
 @router.get("", response_model=List[MealOut])
-def get_meals(
+async def get_meals(
+    response: Response,
     date: Optional[date] = Query(None),
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+    tz: Optional[str] = Query(None, description="IANA timezone เช่น Asia/Bangkok"),
+    limit: int = Query(MEALS_PAGE_SIZE, ge=1, le=MAX_MEALS_PAGE),
+    cursor: Optional[str] = Query(None, description="ค่า X-Next-Cursor จากหน้าก่อน"),
+    fields: Optional[str] = Query(None, description="เลือก field คั่นด้วยคอมมา เช่น id,name,calories"),
+    cond: Conditional = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
 
-    query = db.query(MealNutrition).filter(MealNutrition.user_id == user.id)
+    M = MealNutrition
+    columns = None
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(requested) - set(MEAL_FIELDS))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        columns = [f for f in MEAL_FIELDS if f in requested or f in ("id", "created_at")]
 
+    filters = [M.user_id == user.id]
     if date:
-        query = query.filter(cast(MealNutrition.created_at, Date) == date)
+        filters.extend(_day_range(date, date, _zone(tz)))
 
-    meals = query.order_by(MealNutrition.created_at.desc()).all()
-    return meals
+    # projection ดึง updated_at ไปด้วยเสมอ (ใช้ทำ ETag) แล้วตัดออกถ้าไม่ได้ขอ
+    fetch = columns + ["updated_at"] if columns and "updated_at" not in columns else columns
+    query = select(*[getattr(M, f) for f in fetch]) if columns else select(M)
+    query = query.where(*filters)
+
+    # keyset: หน้าถัดไปเริ่มหลัง (created_at, id) ของแถวสุดท้าย ใช้ index (user_id, created_at)
+    # ไม่ต้อง OFFSET ข้ามแถวที่อ่านไปแล้ว
+    if cursor:
+        ts, last_id = decode_cursor(cursor)
+        query = query.where(
+            M.created_at <= ts,
+            or_(M.created_at < ts, and_(M.created_at == ts, M.id < last_id)),
+        )
+
+    query = query.order_by(M.created_at.desc(), M.id.desc()).limit(limit + 1)
+    if columns:
+        rows = [r._asdict() for r in (await db.execute(query)).all()]
+    else:
+        rows = (await db.scalars(query)).all()
+
+    page = rows[:limit]
+    has_more = len(rows) > limit
+
+    # ETag จากแถวของหน้านี้เอง (id, updated_at) + มีหน้าถัดไปไหม: เพิ่ม / แก้ / ลบในช่วงของหน้านี้ทำให้เปลี่ยน
+    # (ไม่ count / max ทั้งประวัติทุกหน้า: user ที่มี meal หลักแสนแถวจะ scan ทั้งหมดทุก request)
+    # date / tz / limit / cursor / fields อยู่ใน ETag แล้วจาก query string (Conditional.check)
+    versions = [(r["id"], r["updated_at"]) if columns else (r.id, r.updated_at) for r in page]
+    not_modified = cond.check(user.id, has_more, *versions)
+    if not_modified:
+        return not_modified
+
+    headers = cond.headers
+    if has_more:
+        last = page[-1]
+        created_at, last_id = (last["created_at"], last["id"]) if columns else (last.created_at, last.id)
+        headers["X-Next-Cursor"] = encode_cursor(created_at, last_id)
+
+    if columns:
+        # projection: ส่งเฉพาะ field ที่ขอ (ไม่ผ่าน response_model ที่ต้องการทุก field)
+        page = [{f: r[f] for f in columns} for r in page]
+        return JSONResponse(jsonable_encoder(page), headers=headers)
+    response.headers.update(headers)
+    return page
+
+
+# 🟢 Delta sync — meals created / updated / deleted after the cursor
+@router.get("/changes", response_model=MealChanges)
+async def get_meal_changes(
+    since: Optional[str] = Query(None, description="next_cursor จากครั้งก่อน; ไม่ส่ง = เริ่ม sync ใหม่ทั้งหมด"),
+    limit: int = Query(200, ge=1, le=MAX_CHANGES_PAGE),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    last_xid, last_id = decode_change_cursor(since) if since else (0, 0)
+
+    # cursor คือ (change_xid, id) และส่งเฉพาะแถวที่ change_xid < xmin ของ snapshot
+    # = transaction ที่เขียนแถวนั้นจบไปแล้ว และ transaction ที่ยังไม่จบทุกตัวได้ xid >= xmin
+    # แถวที่ commit ทีหลังจึงไม่มีทางได้ key ต่ำกว่า cursor ที่ client ได้ไปแล้ว
+    # (ต่างจาก now() ซึ่งเป็นเวลาเริ่ม transaction: transaction ยาว ๆ commit แล้วตกหล่นได้)
+    # transaction ที่ค้างนาน ๆ แค่ทำให้ change ใหม่ถูกหน่วงไว้จนกว่าจะจบ ไม่หาย
+    horizon = select(text("pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar_subquery()
+
+    # keyset บน (change_xid, id) ทั้งสองตาราง ใช้ index (user_id, change_xid, id) / (user_id, change_xid, meal_id)
+    M, T = MealNutrition, MealTombstone
+    meals = (await db.scalars(
+        select(M)
+        .where(M.user_id == user.id, tuple_(M.change_xid, M.id) > tuple_(last_xid, last_id), M.change_xid < horizon)
+        .order_by(M.change_xid, M.id)
+        .limit(limit + 1)
+    )).all()
+    tombstones = (await db.execute(
+        select(T.meal_id, T.change_xid)
+        .where(T.user_id == user.id, tuple_(T.change_xid, T.meal_id) > tuple_(last_xid, last_id), T.change_xid < horizon)
+        .order_by(T.change_xid, T.meal_id)
+        .limit(limit + 1)
+    )).all()
+
+    changes = sorted(
+        [(m.change_xid, m.id, m) for m in meals] + [(t.change_xid, t.meal_id, None) for t in tombstones],
+        key=lambda c: (c[0], c[1]),
+    )
+    page = changes[:limit]
+
+    return MealChanges(
+        upserts=[m for _, _, m in page if m is not None],
+        deleted=[meal_id for _, meal_id, m in page if m is None],
+        next_cursor=encode_change_cursor(page[-1][0], page[-1][1]) if page else encode_change_cursor(last_xid, last_id),
+        has_more=len(changes) > limit,
+    )
+
+
+# 🟢 Daily summary — totals + per meal_time breakdown + profile targets
+@router.get("/summary", response_model=DailySummary)
+async def get_daily_summary(
+    day: Optional[date] = Query(None, alias="date"),
+    tz: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    zone = _zone(tz)
+    day = day or _local_today(zone)
+
+    rows = (await db.execute(
+        select(MealNutrition.meal_time, *_totals_columns())
+        .where(
+            MealNutrition.user_id == user.id,
+            *_day_range(day, day, zone),
+        )
+        .group_by(MealNutrition.meal_time)
+        .order_by(MealNutrition.meal_time)
+    )).all()
+
+    by_meal_time = [MealTimeTotals(meal_time=r.meal_time, **_row_totals(r)) for r in rows]
+
+    return DailySummary(
+        date=day,
+        totals=_sum_totals(by_meal_time),
+        by_meal_time=by_meal_time,
+        targets=await _targets(db, user.id),
+    )
+
+
+# 🟢 Summary for a span of days (inclusive) — one row per day that has meals
+@router.get("/summary/range", response_model=RangeSummary)
+async def get_range_summary(
+    start: date = Query(...),
+    end: Optional[date] = Query(None),
+    tz: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    zone = _zone(tz)
+    end = end or _local_today(zone)
+
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start) >= timedelta(days=MAX_SUMMARY_DAYS):
+        raise HTTPException(status_code=400, detail=f"range is limited to {MAX_SUMMARY_DAYS} days")
+
+    if _uses_rollup(zone):
+        # O(วัน) จากตาราง rollup
+        R = DailyNutritionRollup
+        rows = (await db.execute(
+            select(R.day.label("d"), R.calories, R.protein, R.carb, R.fat, R.meal_count)
+            .where(R.user_id == user.id, R.day >= start, R.day <= end, R.meal_count > 0)
+            .order_by(R.day)
+        )).all()
+    else:
+        day_col = _local_date(zone).label("d")
+        rows = (await db.execute(
+            select(day_col, *_totals_columns())
+            .where(
+                MealNutrition.user_id == user.id,
+                *_day_range(start, end, zone),
+            )
+            .group_by("d")
+            .order_by("d")
+        )).all()
+
+    days = [DayTotals(date=r.d, **_row_totals(r)) for r in rows]
+
+    return RangeSummary(
+        start=start,
+        end=end,
+        totals=_sum_totals(days),
+        days=days,
+        targets=await _targets(db, user.id),
+    )
 
 
 # 🟢 Delete meal (only owner can delete)
 @router.delete("/{meal_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_meal(
+async def delete_meal(
     meal_id: int,
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
 
-    meal = (
-        db.query(MealNutrition)
-        .filter(MealNutrition.id == meal_id, MealNutrition.user_id == user.id)
-        .first()
+    # ล็อกแถวก่อนอ่านค่าไปหักออกจาก rollup (request พร้อมกันต้องรอกัน ไม่หักค่าเดิมซ้ำ)
+    meal = await db.scalar(
+        select(MealNutrition)
+        .where(MealNutrition.id == meal_id, MealNutrition.user_id == user.id)
+        .with_for_update()
     )
 
     if not meal:
         raise HTTPException(status_code=404, detail="Meal not found")
 
     try:
-        db.delete(meal)
-        db.commit()
+        await rollup.remove_meal(db, meal)
+        db.add(MealTombstone(meal_id=meal.id, user_id=user.id))
+        await db.delete(meal)
+        await db.commit()
     except:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Error deleting meal")
 
 
 # 🟢 Update meal — only owner's meal
 @router.put("/{meal_id}", response_model=MealOut)
 @router.patch("/{meal_id}", response_model=MealOut)
-def update_meal(
+async def update_meal(
     meal_id: int,
     payload: MealUpdate,
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
 
-    meal = (
-        db.query(MealNutrition)
-        .filter(MealNutrition.id == meal_id, MealNutrition.user_id == user.id)
-        .first()
+    # ล็อกแถวก่อน snapshot: ค่า "ก่อนแก้" ต้องเป็นค่าล่าสุดที่ commit แล้ว ไม่ใช่ค่าที่ request อื่นกำลังแก้
+    meal = await db.scalar(
+        select(MealNutrition)
+        .where(MealNutrition.id == meal_id, MealNutrition.user_id == user.id)
+        .with_for_update()
     )
 
     if not meal:
@@ -98,32 +450,47 @@ def update_meal(
 
     update_data = payload.dict(exclude_unset=True)
     try:
+        before = rollup.snapshot(meal)
         for field, value in update_data.items():
             setattr(meal, field, value)
 
-        db.commit()
-        db.refresh(meal)
+        # ปรับ rollup เฉพาะเมื่อค่าโภชนาการเปลี่ยน (ลบค่าเดิม + บวกค่าใหม่)
+        if any(before[f] != getattr(meal, f) for f in ("calories", "protein", "carb", "fat")):
+            await rollup.remove_snapshot(db, before)
+            await rollup.add_meal(db, meal)
+
+        await db.commit()
+        await db.refresh(meal)
         return meal
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating meal: {str(e)}")
 
 
 # 🟢 Get unique dates (user only)
 @router.get("/dates")
-def get_meal_dates(
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+async def get_meal_dates(
+    tz: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
-
-    rows = (
-        db.query(cast(MealNutrition.created_at, Date).label("d"))
-        .filter(MealNutrition.user_id == user.id)
-        .group_by("d")
-        .order_by(desc("d"))
-        .all()
-    )
+    zone = _zone(tz)
+
+    if _uses_rollup(zone):
+        R = DailyNutritionRollup
+        rows = (await db.execute(
+            select(R.day.label("d"))
+            .where(R.user_id == user.id, R.meal_count > 0)
+            .order_by(desc(R.day))
+        )).all()
+    else:
+        day_col = _local_date(zone).label("d")
+        rows = (await db.execute(
+            select(day_col)
+            .where(MealNutrition.user_id == user.id)
+            .group_by("d")
+            .order_by(desc("d"))
+        )).all()
 
     return [str(r.d) for r in rows]
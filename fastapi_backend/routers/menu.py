@@ -1,19 +1,36 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from database import get_db
-from models import Menu
+from database import get_async_db
 from schemas import MenuOut 
-from sqlalchemy import or_
+from menu_index import menu_index
+from config import settings
+from etag import Conditional
 
 router = APIRouter()
 
+MAX_LIMIT = 50
+
 @router.get("/menu", response_model=List[MenuOut])
-def search_menu(search: str = Query(...), db: Session = Depends(get_db)):
-    return db.query(Menu).filter(
-        or_(
-            Menu.food_name.ilike(f"%{search}%"),
-            Menu.food_name_en.ilike(f"%{search}%")
-        )
-    ).all()
+async def search_menu(
+    response: Response,
+    search: str = Query(...),
+    limit: int = Query(20, ge=1, le=MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    cond: Conditional = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # ค้นจาก index ใน memory (ไทย/อังกฤษ, prefix + fuzzy) ไม่ query DB ทุก keystroke
+    await menu_index.ensure_loaded_async(db)
+
+    # ตาราง menu เป็นข้อมูลกลาง เปลี่ยนไม่บ่อย → ให้ client / proxy cache ได้
+    not_modified = cond.check(
+        menu_index.fingerprint, search, limit, offset,
+        cache_control=f"public, max-age={settings.MENU_CACHE_MAX_AGE_SECONDS}",
+    )
+    if not_modified:
+        return not_modified
 
+    rows, total = menu_index.search(search, limit=limit, offset=offset)
+    response.headers["X-Total-Count"] = str(total)
+    return rows
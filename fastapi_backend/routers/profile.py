@@ -1,9 +1,11 @@
 # routers/profile.py
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import crud, schemas, models
-from database import get_db
-from auth import get_current_user_email
+from database import get_async_db
+from auth import get_current_user, CurrentUser
+from etag import Conditional
 
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
@@ -11,29 +13,25 @@ router = APIRouter(prefix="/profiles", tags=["profiles"])
 # 🟢 CREATE PROFILE
 # ============================================================================
 @router.post("/", response_model=schemas.ProfileOut, status_code=status.HTTP_201_CREATED)
-def create_profile(
+async def create_profile(
     profile: schemas.ProfileCreate,
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     # ป้องกันสร้างซ้ำ
-    exists = crud.get_profile_by_user(db, user.id)
+    exists = await crud.get_profile_by_user(db, user.id)
     if exists:
         raise HTTPException(status_code=400, detail="Profile already exists")
 
     # ตรวจสอบ username ซ้ำ
     if profile.username:
-        username_exists = db.query(models.Profile).filter(
+        username_exists = await db.scalar(select(models.Profile.id).where(
             models.Profile.username == profile.username
-        ).first()
+        ))
         if username_exists:
             raise HTTPException(status_code=400, detail="Username already taken")
 
-    new_profile = crud.create_profile(db, user.id, profile)
+    new_profile = await crud.create_profile(db, user.id, profile)
     return new_profile
 
 
@@ -41,44 +39,56 @@ def create_profile(
 # 🟢 GET MY PROFILE
 # ============================================================================
 @router.get("/me", response_model=schemas.ProfileOut)
-def read_my_profile(
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+async def read_my_profile(
+    cond: Conditional = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
-    profile = crud.get_profile_by_user(db, user.id)
+    # profile ที่ serialize แล้วอยู่ใน cache (ลบเมื่อ profile ถูกแก้ ดู crud.profile_cache)
+    cached = await crud.profile_cache.aget(user.id)
+    if cached is None:
+        profile = await crud.get_profile_by_user(db, user.id)
 
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
+        if not profile:
+            raise HTTPException(status_code=404, detail="Profile not found")
+
+        cached = {
+            "version": [profile.id, profile.updated_at.isoformat()],
+            "data": schemas.ProfileOut.model_validate(profile).model_dump(mode="json"),
+        }
+        await crud.profile_cache.aset(user.id, cached)
+
+    not_modified = cond.check(*cached["version"])
+    if not_modified:
+        return not_modified
 
-    return profile
+    return cached["data"]
 
 
 # ============================================================================
 # 🟢 PATCH – UPDATE SOME FIELDS
 # ============================================================================
 @router.patch("/", response_model=schemas.ProfileOut)
-def patch_my_profile(
+async def patch_my_profile(
     profile: schemas.ProfileUpdate,
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
-    db_profile = crud.get_profile_by_user(db, user.id)
+    db_profile = await crud.get_profile_by_user(db, user.id)
 
     if not db_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
     # ตรวจสอบ username ซ้ำ
     if profile.username:
-        username_exists = db.query(models.Profile).filter(
+        username_exists = await db.scalar(select(models.Profile.id).where(
             models.Profile.username == profile.username,
             models.Profile.user_id != user.id
-        ).first()
+        ))
         if username_exists:
             raise HTTPException(status_code=400, detail="Username already taken")
 
-    updated_profile = crud.patch_profile(db, user.id, profile)
+    updated_profile = await crud.patch_profile(db, user.id, profile)
     return updated_profile
 
 
@@ -86,26 +96,25 @@ def patch_my_profile(
 # 🟢 PUT – UPDATE ALL FIELDS
 # ============================================================================
 @router.put("/", response_model=schemas.ProfileOut)
-def update_my_profile(
+async def update_my_profile(
     profile: schemas.ProfileUpdate,
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
-    db_profile = crud.get_profile_by_user(db, user.id)
+    db_profile = await crud.get_profile_by_user(db, user.id)
 
     if not db_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
     # ตรวจสอบ username ซ้ำ
     if profile.username:
-        username_exists = db.query(models.Profile).filter(
+        username_exists = await db.scalar(select(models.Profile.id).where(
             models.Profile.username == profile.username,
             models.Profile.user_id != user.id
-        ).first()
+        ))
 
         if username_exists:
             raise HTTPException(status_code=400, detail="Username already taken")
 
-    updated_profile = crud.update_profile(db, user.id, profile)
+    updated_profile = await crud.update_profile(db, user.id, profile)
     return updated_profile
@@ -1,19 +1,28 @@
 # routers/users.py
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import crud
+import passwords
 from schemas import UserCreate, UserOut, UserLogin, Token
-from auth import verify_password, create_access_token, get_current_user_email
-from database import get_db
+from auth import create_access_token, get_current_user, CurrentUser
+from etag import Conditional
+from database import get_async_db
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# register / login: bcrypt รันบน process pool (passwords.py) ส่วน query ใช้ AsyncSession
+# ปิด transaction ที่อ่าน users ก่อนรอ bcrypt: ไม่งั้นทุก login ที่รอ hash ถือ connection ค้างไว้
+# (login พร้อมกันเกินขนาด pool แล้ว request อื่นรอ connection จน timeout)
+# commit ไม่ทำให้ object หมดอายุ (expire_on_commit=False) ใช้ db_user ต่อได้
 @router.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    if crud.get_user_by_email(db, user.email):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    passwords.check_capacity()
+    if await crud.get_user_by_email(db, user.email):
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-    db_user = crud.create_user(db, user)
-    token = create_access_token(sub=db_user.email)
+    await db.commit()
+    hashed = await passwords.hash_password(user.password)
+    db_user = await crud.create_user(db, user, hashed)
+    token = create_access_token(sub=db_user.email, uid=db_user.id)
     return {
         "user": {"id": db_user.id, "email": db_user.email},
         "access_token": token,
@@ -21,28 +30,34 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, user.email)
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    passwords.check_capacity()
+    db_user = await crud.get_user_by_email(db, user.email)
+    await db.commit()
+    ok, new_hash = (False, None)
+    if db_user:
+        ok, new_hash = await passwords.verify_password(user.password, db_user.hashed_password)
+    if not ok:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password",
                             headers={"WWW-Authenticate": "Bearer"})
-    token = create_access_token(sub=db_user.email)
+    if new_hash:
+        # BCRYPT_ROUNDS เปลี่ยน → เก็บ hash ใหม่ตอนที่รู้รหัสผ่าน
+        await crud.update_password_hash(db, db_user, new_hash)
+    token = create_access_token(sub=db_user.email, uid=db_user.id)
     return {"access_token": token, "token_type": "bearer"}
 
 @router.get("/protected")
-def protected_route(
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email)
+async def protected_route(
+    user: CurrentUser = Depends(get_current_user)
 ):
-    user = crud.get_user_by_email(db, current_email)
     return {"message": f"Hello, {user.email}! This is a protected route."}
 
 @router.get("/me", response_model=UserOut)
-def read_me(
-    db: Session = Depends(get_db),
-    current_email: str = Depends(get_current_user_email),
+async def read_me(
+    cond: Conditional = Depends(),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    user = crud.get_user_by_email(db, current_email)
-    if not user:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
+    not_modified = cond.check(user.id, user.email)
+    if not_modified:
+        return not_modified
     return user
\ No newline at end of file
@@ -1,78 +1,219 @@
 # routers/yolo.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-from ultralytics import YOLO
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse
 from pathlib import Path
-import uuid
-import shutil
+import asyncio
+
+from config import settings
+from inference import BatchScheduler, SchedulerStopped
+from model_registry import registry
+from model_server import ModelServerUnavailable
+from overlay import render_overlay, prune_dir
+from prediction_cache import PredictionCache, PREDICTIONS_DIR
+from storage import UPLOAD_DIR, read_upload, save_archive, find_by_digest, find_archive, digest_from_name, resolve_upload
+from ingest import InvalidImage, decode_for_inference, decode_file, archive_copy
+from class_menu import class_menu
+from metrics import YOLO_STAGE, record_upload, timed
+import thumbnails
+from database import SessionLocal
 
 router = APIRouter(prefix="/yolo", tags=["yolo"])
 
-UPLOAD_DIR = Path("uploads")
 RESULTS_DIR = Path("results") / "runs"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
-# โหลดโมเดล YOLOv8
-model = YOLO("models/best.pt")
+prediction_cache = PredictionCache(
+    PREDICTIONS_DIR,
+    memory_size=settings.YOLO_DETECTION_CACHE_SIZE,
+    persist=settings.YOLO_PREDICTION_DISK_CACHE,
+    max_files=settings.YOLO_PREDICTION_DISK_MAX_FILES,
+)
+
+
+def _predict_batch(images):
+    # backend รับ list ของรูป (numpy ที่ decode + ย่อแล้ว) รันเป็น batch เดียว คืนผลตามลำดับ input
+    # ไม่ save รูป annotate ที่นี่ (ไม่มี JPEG encode / disk write ต่อ request)
+    model = registry.get()
+    results = model.predict([im.array for im in images], conf=0.25, imgsz=settings.YOLO_IMGSZ)
+
+    preds = []
+    for im, r in zip(images, results):
+        for stage, ms in r.get("speed", {}).items():
+            if ms is not None:
+                YOLO_STAGE.observe(ms / 1000.0, stage)
+        # box จาก model อยู่ในพิกัดรูปที่ย่อ → แปลงกลับเป็นพิกัดรูปต้นฉบับ
+        boxes = [
+            {**d, "box": im.to_original(d["box"]), "label": registry.class_name(d["cls"])}
+            for d in r["detections"]
+        ]
+        preds.append({
+            "detections": boxes,
+            "original_width": im.orig_width,
+            "original_height": im.orig_height,
+        })
+    return preds
+
+
+# รัน forward pass บน worker thread แยก ไม่ block event loop
+scheduler = BatchScheduler(
+    _predict_batch,
+    max_batch_size=settings.YOLO_MAX_BATCH_SIZE,
+    max_wait_ms=settings.YOLO_MAX_WAIT_MS,
+    name="yolo",
+)
+
+
+def _upload_path(filename: str) -> Path:
+    fpath = resolve_upload(filename)
+    if fpath is None:
+        raise HTTPException(status_code=404, detail="image not found")
+    return fpath
+
+
+def _model_version() -> str:
+    # YOLO_MODEL_SERVER=true: version ถามจาก model server ซึ่งอาจกำลัง restart อยู่
+    try:
+        return registry.version
+    except ModelServerUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def _overlay_path(digest: str, model_version: str) -> Path:
+    # overlay ขึ้นกับ version ของ model ด้วย (hot-swap แล้วไม่ใช้รูปเก่า)
+    return RESULTS_DIR / f"{digest}_{model_version}.jpg"
+
+
+def _render(fpath: Path, pred: dict, out: Path) -> Path:
+    orig_size = (pred["original_width"], pred["original_height"])
+    with timed(YOLO_STAGE, "render"):
+        render_overlay(fpath, pred["detections"], out, orig_size=orig_size)
+    prune_dir(RESULTS_DIR, settings.YOLO_RENDER_CACHE_MAX_FILES)
+    return out
+
+
+def _archive(data: bytes, digest: str):
+    with timed(YOLO_STAGE, "archive"):
+        jpeg = archive_copy(data, settings.YOLO_ARCHIVE_MAX_SIDE, settings.YOLO_ARCHIVE_QUALITY)
+        return save_archive(jpeg, digest)
+
+
+def _decode_timed(decode):
+    with timed(YOLO_STAGE, "decode"):
+        return decode()
+
+
+async def _predict_cached(digest: str, decode) -> dict:
+    # รูปเดิม + model เดิม → คืนผลเก่าทันที ไม่ต้อง decode / รัน inference ซ้ำ
+    version = _model_version()
+    # disk / Redis → ไม่ทำบน event loop
+    pred = await run_in_threadpool(prediction_cache.get, digest, version)
+    if pred is None:
+        try:
+            image = await run_in_threadpool(_decode_timed, decode)
+        except InvalidImage:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        try:
+            pred = await scheduler.submit(image)
+        except (ModelServerUnavailable, SchedulerStopped) as e:
+            # model server ล่ม / กำลังปิด server: ลองใหม่ได้
+            raise HTTPException(status_code=503, detail=str(e))
+        await run_in_threadpool(prediction_cache.put, digest, version, pred)
+    return pred
+
+
+def _class_menu_map():
+    db = SessionLocal()
+    try:
+        return class_menu.refresh(db)
+    finally:
+        db.close()
 
 
 @router.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(
+    background: BackgroundTasks,
+    file: UploadFile = File(...),
+    annotate: bool = Query(False, description="render overlay ทันที (ช้ากว่า); ปกติคืนแค่ detections"),
+    include_nutrition: bool = Query(False, description="แนบแถว Menu ของแต่ละ class ที่เจอ (ไม่ต้องเรียก /menu ซ้ำ)"),
+):
 
     # ตรวจองค์ประกอบไฟล์
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="only image allowed")
 
-    ext = (Path(file.filename).suffix or ".jpg").lower()
-    if ext not in [".jpg", ".jpeg", ".png", ".bmp", ".webp"]:
-        ext = ".jpg"
-
-    fname = f"{uuid.uuid4().hex}{ext}"
-    fpath = UPLOAD_DIR / fname
-
-    with fpath.open("wb") as f:
-        shutil.copyfileobj(file.file, f)
-
-    # รัน YOLO
-    results = model.predict(
-        source=str(fpath),
-        save=True,
-        conf=0.25,
-        project=str(RESULTS_DIR.parent),
-        name=RESULTS_DIR.name,
-        exist_ok=True
-    )
-
-    r = results[0]
-
-    boxes = []
-    for b in r.boxes:
-        cls_id = int(b.cls[0])
-        conf = float(b.conf[0])
-        x1, y1, x2, y2 = map(float, b.xyxy[0])
-
-        class_name = model.names[cls_id]
-
-        boxes.append({
-            "cls": cls_id,
-            "conf": conf,
-            "box": [x1, y1, x2, y2],
-            "label": class_name
-        })
-
-    saved_image = Path(r.save_dir) / fpath.name
-    rel_path = saved_image.relative_to("results")
+    # อ่านเข้า memory + hash (ไม่เขียนรูปเต็มขนาดลง disk)
+    data, digest = await read_upload(file)
+    record_upload("/yolo/predict", len(data))
+
+    # decode ครั้งเดียวที่ขนาด input ของ model แล้วส่ง array เข้า model ตรง ๆ
+    # ระหว่างนั้นเก็บสำเนา JPEG ย่อไว้ (ถ้าเปิดไว้ และยังไม่เคยเก็บรูปนี้)
+    stored = find_by_digest(digest) or find_archive(digest)
+    if annotate and stored is None and not settings.YOLO_ARCHIVE_UPLOADS:
+        # ไม่มีรูปให้ render overlay (ปิด archive และรูปนี้ไม่เคย upload) — แจ้งชัด ๆ แทน image_url: null
+        raise HTTPException(status_code=409, detail="annotate requires YOLO_ARCHIVE_UPLOADS or an uploaded image")
+    archive_job = None
+    if stored is None and settings.YOLO_ARCHIVE_UPLOADS:
+        archive_job = asyncio.ensure_future(run_in_threadpool(_archive, data, digest))
+
+    try:
+        pred = await _predict_cached(digest, lambda: decode_for_inference(data, settings.YOLO_IMGSZ))
+    except BaseException:
+        if archive_job is not None:
+            archive_job.cancel()
+        raise
+    if archive_job is not None:
+        stored = (await archive_job).path
+        # รูปย่อ (ใช้ในหน้า history) สร้างหลังส่ง response
+        background.add_task(thumbnails.generate, stored)
+    boxes = pred["detections"]
+
+    # รูป overlay render ตอนถูกเรียกดู (lazy) ยกเว้นขอ annotate มาเลย
+    image_url = None
+    if stored is not None:
+        if annotate:
+            out = _overlay_path(digest, _model_version())
+            if not out.is_file():
+                await run_in_threadpool(_render, stored, pred, out)
+            image_url = f"/results/{RESULTS_DIR.name}/{out.name}"
+        else:
+            image_url = f"/yolo/render/{stored.name}"
 
     # ชื่ออาหารตัวแรกของภาพ
     food_name = boxes[0]["label"] if boxes else ""
 
-    return JSONResponse({
+    body = {
         "success": True,
         "name": food_name,
         "detections": boxes,
-        "image_url": f"/results/{rel_path.as_posix()}",
-        "uploaded_url": f"/uploads/{fname}",
-        "original_width": r.orig_shape[1],
-        "original_height": r.orig_shape[0]
-    })
+        "image_url": image_url,
+        "uploaded_url": f"/uploads/{stored.relative_to(UPLOAD_DIR).as_posix()}" if stored is not None else None,
+        "original_width": pred["original_width"],
+        "original_height": pred["original_height"]
+    }
+    if include_nutrition:
+        try:
+            mapping = await run_in_threadpool(_class_menu_map)
+        except ModelServerUnavailable as e:
+            # class_names / version ถามจาก model server (YOLO_MODEL_SERVER=true) เหมือน _model_version
+            raise HTTPException(status_code=503, detail=str(e))
+        body["nutrition"] = class_menu.lookup(boxes, mapping)
+
+    return JSONResponse(body)
+
+
+@router.get("/render/{filename}")
+async def render(filename: str):
+    fpath = _upload_path(filename)
+    digest = digest_from_name(fpath.name)
+
+    out = _overlay_path(digest, _model_version())
+    if not out.is_file():
+        pred = await _predict_cached(digest, lambda: decode_file(fpath, settings.YOLO_IMGSZ))
+        await run_in_threadpool(_render, fpath, pred, out)
+    return FileResponse(out, media_type="image/jpeg")
+
+
+@router.get("/stats")
+def inference_stats():
+    return {**scheduler.stats(), "cache": prediction_cache.stats(), "model": registry.info()}
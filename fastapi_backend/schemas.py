@@ -1,7 +1,7 @@
 # schemas.py
-from pydantic import BaseModel, EmailStr, ConfigDict
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 
 
 # -----------------------
@@ -118,7 +118,84 @@ class MealOut(BaseModel):
     meal_time: str
     image_url: Optional[str]
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    client_key: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+
+# -----------------------
+# Meal batch (offline sync)
+# -----------------------
+class MealBatchItem(MealCreate):
+    client_key: str = Field(..., min_length=1, max_length=64)
+    # เวลาที่บันทึกบนเครื่อง (offline) ไม่ส่ง = เวลาที่ server ได้รับ; ไม่มี timezone = APP_TIMEZONE
+    created_at: Optional[datetime] = None
+
+
+class MealBatchCreate(BaseModel):
+    items: List[MealBatchItem]
+
+
+class MealBatchResult(BaseModel):
+    client_key: str
+    status: str          # "created" | "duplicate"
+    meal: MealOut
+
+
+class MealBatchOut(BaseModel):
+    created: int
+    duplicates: int
+    results: List[MealBatchResult]
+
+
+# -----------------------
+# Meal changes (delta sync)
+# -----------------------
+class MealChanges(BaseModel):
+    upserts: List[MealOut] = []
+    deleted: List[int] = []
+    next_cursor: str
+    has_more: bool = False
+
+
+# -----------------------
+# Meal Summary
+# -----------------------
+class NutritionTotals(BaseModel):
+    calories: float = 0
+    protein: float = 0
+    carb: float = 0
+    fat: float = 0
+    meal_count: int = 0
+
+
+class MealTimeTotals(NutritionTotals):
+    meal_time: Optional[str] = None
+
+
+class NutritionTargets(BaseModel):
+    target_calories: Optional[int] = None
+    protein_target: Optional[int] = None
+    carb_target: Optional[int] = None
+    fat_target: Optional[int] = None
+
+
+class DailySummary(BaseModel):
+    date: date
+    totals: NutritionTotals
+    by_meal_time: List[MealTimeTotals] = []
+    targets: NutritionTargets
+
+
+class DayTotals(NutritionTotals):
+    date: date
+
+
+class RangeSummary(BaseModel):
+    start: date
+    end: date
+    totals: NutritionTotals
+    days: List[DayTotals] = []
+    targets: NutritionTargets
@@ -0,0 +1,70 @@
+# startup_bench.py
+"""วัดเวลา import main.py และ memory (max RSS) ของ worker แต่ละแบบ
+
+    python startup_bench.py              # api (ENABLE_INFERENCE=false) เทียบกับ full
+    python startup_bench.py --runs 10
+
+แต่ละรอบรันใน process ใหม่ (import ไม่ติด cache ของรอบก่อน) และปิด DB_CREATE_ALL
+เพราะวัดแค่ import ไม่ต่อ DB; model โหลดตอน lifespan จึงไม่รวมในตัวเลขนี้
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_PROBE = """
+import json, resource, sys, time
+t = time.perf_counter()
+import main
+elapsed = time.perf_counter() - t
+heavy = [m for m in ("numpy", "torch", "ultralytics", "onnxruntime", "openvino") if m in sys.modules]
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "routes": len(main.app.routes),
+    "heavy": heavy,
+}))
+"""
+
+PROFILES = {
+    "api": {"ENABLE_INFERENCE": "false"},
+    "full": {"ENABLE_INFERENCE": "true"},
+}
+
+
+def run_once(env_overrides: dict) -> dict:
+    env = {**os.environ, "DB_CREATE_ALL": "false", **env_overrides}
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API worker import time and RSS")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("profiles", nargs="*", help=f"one or more of {', '.join(PROFILES)}")
+    args = parser.parse_args()
+    unknown = set(args.profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"unknown profile: {', '.join(sorted(unknown))}")
+
+    for name in args.profiles or list(PROFILES):
+        samples = [run_once(PROFILES[name]) for _ in range(args.runs)]
+        seconds = [s["seconds"] for s in samples]
+        rss = [s["rss_mb"] for s in samples]
+        print(
+            f"{name:5s} import median {statistics.median(seconds) * 1000:7.1f} ms"
+            f"  max {max(seconds) * 1000:7.1f} ms"
+            f"  rss {statistics.median(rss):6.1f} MB"
+            f"  routes {samples[-1]['routes']}"
+            f"  heavy {','.join(samples[-1]['heavy']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# storage.py
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image, UnidentifiedImageError
+
+BASE_DIR   = Path(__file__).resolve().parent
+UPLOAD_DIR = BASE_DIR / "uploads"
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+# สำเนา JPEG ย่อจาก /yolo/predict ชื่อ = sha256 ของไฟล์ต้นฉบับ (ไม่ใช่ของ JPEG)
+# จึงแยกโฟลเดอร์: find_by_digest / save_upload ต้องไม่นับเป็นไฟล์ต้นฉบับตอน dedup
+ARCHIVE_DIR = UPLOAD_DIR / "archive"
+ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+
+MAX_BYTES = 8 * 1024 * 1024
+CHUNK = 64 * 1024
+
+# format ของ PIL → นามสกุลไฟล์ที่เก็บ (ใช้ format จริง ไม่เชื่อชื่อไฟล์จาก client)
+FORMAT_EXT = {
+    "JPEG": "jpg",
+    "PNG": "png",
+    "WEBP": "webp",
+    "BMP": "bmp",
+}
+
+
+@dataclass
+class StoredUpload:
+    path: Path
+    digest: str      # sha256 ของไฟล์ (hex)
+    size: int
+    created: bool    # False = มีไฟล์เดียวกันอยู่แล้ว (dedup)
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def url(self) -> str:
+        return f"/uploads/{self.path.relative_to(UPLOAD_DIR).as_posix()}"
+
+
+def find_by_digest(digest: str):
+    for ext in FORMAT_EXT.values():
+        p = UPLOAD_DIR / f"{digest}.{ext}"
+        if p.is_file():
+            return p
+    return None
+
+
+def find_archive(digest: str):
+    p = ARCHIVE_DIR / f"{digest}.jpg"
+    return p if p.is_file() else None
+
+
+def digest_from_name(filename: str) -> str:
+    return Path(filename).stem
+
+
+def resolve_upload(filename: str):
+    """path ของไฟล์ใน uploads จากชื่อที่ client ส่งมา (None ถ้าไม่มี / ชื่อไม่ถูกต้อง)"""
+    # กัน path traversal: รับเฉพาะชื่อไฟล์ใน uploads
+    if not filename or Path(filename).name != filename or filename.startswith("."):
+        return None
+    fpath = find_by_digest(digest_from_name(filename))
+    if fpath is None and (UPLOAD_DIR / filename).is_file():
+        # ไฟล์เก่าก่อนเปลี่ยนเป็น content-addressed (ชื่อ uuid)
+        fpath = UPLOAD_DIR / filename
+    if fpath is None:
+        # มีแค่สำเนาย่อจาก /yolo/predict (ใช้ render / รูปย่อได้)
+        fpath = find_archive(digest_from_name(filename))
+    return fpath
+
+
+async def save_upload(file: UploadFile, max_bytes: int = MAX_BYTES) -> StoredUpload:
+    """เขียนไฟล์ upload ลง disk แบบ content-addressed (ชื่อไฟล์ = sha256)
+
+    hash ไปพร้อมกับตอน stream ลงไฟล์ชั่วคราว ถ้ามีไฟล์ hash เดียวกันอยู่แล้ว
+    จะลบไฟล์ชั่วคราวทิ้งแล้วคืนไฟล์เดิม (ไม่เก็บซ้ำ)
+    """
+    tmp = UPLOAD_DIR / f".tmp-{uuid.uuid4().hex}"
+    h = hashlib.sha256()
+    size = 0
+
+    try:
+        with tmp.open("wb") as out:
+            while True:
+                chunk = await file.read(CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="File too large")
+                h.update(chunk)
+                out.write(chunk)
+
+        digest = h.hexdigest()
+        existing = find_by_digest(digest)
+        if existing is not None:
+            tmp.unlink(missing_ok=True)
+            return StoredUpload(existing, digest, size, created=False)
+
+        try:
+            with Image.open(tmp) as im:
+                fmt = im.format
+                im.verify()
+        except (UnidentifiedImageError, OSError):
+            raise HTTPException(status_code=400, detail="Invalid image file")
+
+        ext = FORMAT_EXT.get(fmt)
+        if ext is None:
+            raise HTTPException(status_code=400, detail="Unsupported image format")
+
+        final = UPLOAD_DIR / f"{digest}.{ext}"
+        os.replace(tmp, final)
+        return StoredUpload(final, digest, size, created=True)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_BYTES):
+    """อ่าน upload เข้า memory (ไม่เขียน disk) คืน (bytes, sha256 hex)"""
+    h = hashlib.sha256()
+    buf = bytearray()
+    while True:
+        chunk = await file.read(CHUNK)
+        if not chunk:
+            break
+        if len(buf) + len(chunk) > max_bytes:
+            raise HTTPException(status_code=413, detail="File too large")
+        h.update(chunk)
+        buf += chunk
+    return bytes(buf), h.hexdigest()
+
+
+def save_archive(data: bytes, digest: str) -> StoredUpload:
+    """เก็บสำเนา JPEG ย่อของไฟล์ที่มี sha256 = digest ใน ARCHIVE_DIR ถ้ามีอยู่แล้วไม่เขียนซ้ำ"""
+    existing = find_archive(digest)
+    if existing is not None:
+        return StoredUpload(existing, digest, existing.stat().st_size, created=False)
+
+    final = ARCHIVE_DIR / f"{digest}.jpg"
+    tmp = ARCHIVE_DIR / f".tmp-{uuid.uuid4().hex}"
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, final)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return StoredUpload(final, digest, len(data), created=True)
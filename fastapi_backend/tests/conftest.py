@@ -0,0 +1,47 @@
+# tests/conftest.py
+"""ตั้ง env ก่อน import config
+
+test ที่ต้องใช้ Postgres (row lock, pg_insert, timezone()) รันเฉพาะเมื่อตั้ง TEST_DATABASE_URL
+และ drop / create ตารางทั้งหมดในฐานนั้น — ห้ามชี้ไปที่ฐานจริง
+    TEST_DATABASE_URL=postgresql://postgres:@localhost/nutrition_test python -m pytest
+"""
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+# ไม่ใช้ DATABASE_URL จาก env / .env เด็ดขาด (fixture ด้านล่าง drop ตาราง)
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL or "sqlite://"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ["ENABLE_INFERENCE"] = "false"
+os.environ["REDIS_URL"] = ""
+
+requires_postgres = pytest.mark.skipif(
+    not (TEST_DATABASE_URL or "").startswith("postgresql"),
+    reason="needs TEST_DATABASE_URL pointing at a throwaway Postgres database",
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def pg_app():
+    """app ที่มีเฉพาะ router ฝั่ง DB บนตารางว่าง"""
+    from fastapi import FastAPI
+
+    import models  # noqa: F401  (register ตารางกับ Base)
+    from database import Base, engine
+    from routers import meals, menu, profile, users
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    app = FastAPI()
+    for r in (users, meals, profile, menu):
+        app.include_router(r.router)
+    yield app
+    engine.dispose()
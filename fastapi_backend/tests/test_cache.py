@@ -0,0 +1,207 @@
+# tests/test_cache.py
+import threading
+import time
+
+import fakeredis
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+import cache
+from cache import SharedBackend, TieredCache, TTLCache, invalidate_on_commit
+from config import settings
+
+
+@pytest.fixture
+def server():
+    """Redis ปลอมหนึ่งตัว ทุก client ที่สร้างจาก server เดียวกันเห็นข้อมูล / pub/sub ร่วมกัน"""
+    srv = fakeredis.FakeServer()
+    cache.set_shared_client(fakeredis.FakeRedis(server=srv))
+    yield srv
+    cache.shutdown()
+
+
+def _wait_until(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_shared_tier_hit_after_local_miss(server):
+    c = TieredCache("t_shared", maxsize=10, ttl=60)
+    c.set("k", {"v": 1})
+
+    # worker อื่น (memory ว่าง) ได้ค่าจาก Redis แล้วเก็บเข้า memory ของตัวเอง
+    c.local.clear()
+    assert c.get("k") == {"v": 1}
+    assert c.shared_hits == 1
+    assert c.get("k") == {"v": 1}
+    assert c.shared_hits == 1
+    assert c.stats()["shared"] is True
+
+
+def test_delete_evicts_other_workers_local_tier(server):
+    c = TieredCache("t_pubsub", maxsize=10, ttl=60)
+    evicted = []
+    c.on_invalidate(evicted.append)
+
+    # worker ที่สอง: client คนละตัวบน Redis เดียวกัน มี memory tier ของตัวเอง
+    other_local = TTLCache(10, 60)
+    other = SharedBackend(fakeredis.FakeRedis(server=server), settings.CACHE_KEY_PREFIX,
+                          f"{settings.CACHE_KEY_PREFIX}:invalidate")
+    other.start_listener(lambda ns, key: ns == "t_pubsub" and other_local.delete(key))
+    try:
+        c.set("k", 1)
+        other_local.set("k", 1)
+        c.delete("k")
+        assert _wait_until(lambda: other_local.get("k") is None)
+
+        # ทางกลับ: worker ที่สองลบ → memory ของ process นี้ถูกลบด้วย
+        c.local.set("j", 2)
+        other.publish("t_pubsub", "j")
+        assert _wait_until(lambda: c.local.get("j") is None)
+        assert evicted == ["k", "j"]
+    finally:
+        other.stop()
+
+
+def test_own_invalidation_message_is_ignored(server):
+    c = TieredCache("t_self", maxsize=10, ttl=60)
+    evicted = []
+    c.on_invalidate(evicted.append)
+    c.delete("k")
+    time.sleep(0.3)
+    assert evicted == ["k"]      # ลบเองครั้งเดียว ไม่นับข้อความที่ส่งกลับมาหาตัวเอง
+
+
+def test_falls_back_to_local_when_redis_down(server):
+    c = TieredCache("t_down", maxsize=10, ttl=60)
+    server.connected = False
+
+    c.set("k", 1)
+    assert c.get("k") == 1
+    c.delete("k")
+    assert c.get("k") is None
+    assert c.get("missing", "default") == "default"
+    assert c.stats()["shared_errors"] > 0
+
+    server.connected = True
+    c.set("k", 2)
+    c.local.clear()
+    assert c.get("k") == 2
+
+
+@pytest.mark.anyio
+async def test_async_api_without_shared_tier():
+    cache.set_shared_client(None)
+    try:
+        c = TieredCache("t_async", maxsize=10, ttl=60)
+        await c.aset("k", 1)
+        assert await c.aget("k") == 1
+        await c.adelete("k")
+        assert await c.aget("k", "gone") == "gone"
+    finally:
+        cache.shutdown()
+
+
+# ----------- invalidate_on_commit -----------
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+@pytest.fixture
+def item_cache(server):
+    c = TieredCache("t_items", maxsize=10, ttl=60)
+    invalidate_on_commit(Item, c, lambda row: row.id)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Item(id=1, name="a"))
+        db.commit()
+        yield c, db
+
+
+def test_invalidate_on_commit(item_cache):
+    c, db = item_cache
+    c.set(1, "a")
+    row = db.get(Item, 1)
+    row.name = "b"
+    db.flush()
+    assert c.get(1) == "a"          # flush แล้วแต่ยังไม่ commit: worker อื่นยังเห็นค่าเดิม
+    db.commit()
+    assert c.get(1) is None
+    cache.wait_invalidations(5)
+    c.local.clear()
+    assert c.get(1) is None         # ลบจาก Redis ด้วย
+
+
+def test_rollback_keeps_cache(item_cache):
+    c, db = item_cache
+    c.set(1, "a")
+    db.get(Item, 1).name = "b"
+    db.flush()
+    db.rollback()
+    db.commit()
+    assert c.get(1) == "a"
+
+
+def test_delete_row_invalidates(item_cache):
+    c, db = item_cache
+    c.set(1, "a")
+    db.delete(db.get(Item, 1))
+    db.commit()
+    assert c.get(1) is None
+
+
+class SlowRedis(fakeredis.FakeRedis):
+    """Redis ที่ตอบ DELETE ช้า (เครือข่ายช้า / Redis ค้างจน timeout)"""
+    delay = 0.5
+
+    def delete(self, *names):
+        time.sleep(self.delay)
+        return super().delete(*names)
+
+
+def test_commit_does_not_wait_for_shared_delete(item_cache, server):
+    c, db = item_cache
+    cache.set_shared_client(SlowRedis(server=server))
+    c.set(1, "a")
+    db.get(Item, 1).name = "b"
+
+    started = time.monotonic()
+    db.commit()
+    assert time.monotonic() - started < SlowRedis.delay / 2
+    # memory ถูกลบแล้ว และระหว่างที่ Redis ยังลบไม่เสร็จ ไม่ดึงค่าเก่าจาก Redis กลับมา
+    assert c.local.get(1) is None
+    assert c.get(1) is None
+
+    cache.wait_invalidations(5)
+    assert fakeredis.FakeRedis(server=server).get(cache.get_shared().key("t_items", 1)) is None
+
+
+def test_commit_hook_never_connects(item_cache, monkeypatch):
+    c, db = item_cache
+    cache.shutdown()
+    monkeypatch.setattr(cache, "_shared_configured", False)
+    threads = []
+
+    def connect():
+        threads.append(threading.current_thread().name)
+        return None
+
+    monkeypatch.setattr(cache, "get_shared", connect)
+    c.local.set(1, "a")
+    db.get(Item, 1).name = "b"
+    db.commit()
+    assert c.local.get(1) is None
+    cache.wait_invalidations(5)
+    # ยังไม่เคยต่อ Redis: ต่อใน thread ของ invalidation ไม่ใช่ใน hook (event loop)
+    assert threads and all(t.startswith("cache-invalidate") for t in threads)
@@ -0,0 +1,164 @@
+# tests/test_detector_backends.py
+"""post-processing ของ OnnxBackend + ตัวเทียบผล ทดสอบได้โดยไม่มี weights
+
+test parity (torch vs onnx / openvino บนรูปใน tests/fixtures/detector) รันเมื่อมี
+ultralytics + runtime ของ backend นั้น และไฟล์ weights (YOLO_MODEL_PATH กับไฟล์ที่ export แล้ว)
+    python detector_backends.py export            # → models/best.onnx
+    python -m pytest tests/test_detector_backends.py
+"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from config import settings
+from detector_backends import OnnxBackend, _letterbox, _nms, compare_detections, create_backend, onnx_path_for
+
+FIXTURES = Path(__file__).parent / "fixtures" / "detector"
+
+
+def _det(cls, conf, box):
+    return {"cls": cls, "conf": conf, "box": list(box)}
+
+
+# =========================
+# compare_detections
+# =========================
+def test_compare_identical_is_clean():
+    dets = [_det(0, 0.9, (10, 10, 50, 50)), _det(3, 0.6, (60, 20, 90, 80))]
+    assert compare_detections(dets, list(reversed(dets))) == []
+
+
+def test_compare_small_drift_is_clean():
+    ref = [_det(0, 0.9, (10, 10, 50, 50))]
+    assert compare_detections(ref, [_det(0, 0.88, (10.5, 10, 50, 50.5))]) == []
+
+
+def test_compare_reports_moved_box_and_class_mismatch():
+    ref = [_det(0, 0.9, (10, 10, 50, 50))]
+    assert compare_detections(ref, [_det(0, 0.9, (30, 30, 70, 70))])[0].startswith("no match for cls=0")
+    assert compare_detections(ref, [_det(1, 0.9, (10, 10, 50, 50))])[0].startswith("no match for cls=0")
+
+
+def test_compare_reports_conf_drift():
+    ref = [_det(2, 0.9, (10, 10, 50, 50))]
+    assert compare_detections(ref, [_det(2, 0.7, (10, 10, 50, 50))]) == ["cls=2 conf 0.900 vs 0.700"]
+
+
+def test_compare_extra_box_only_counts_above_threshold():
+    ref = [_det(0, 0.9, (10, 10, 50, 50))]
+    near_threshold = _det(1, 0.27, (60, 60, 90, 90))
+    assert compare_detections(ref, ref + [near_threshold]) == []
+    assert compare_detections(ref, ref + [_det(1, 0.8, (60, 60, 90, 90))]) == ["extra box cls=1 conf=0.800"]
+
+
+# =========================
+# _nms
+# =========================
+def test_nms_keeps_best_of_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.5], dtype=np.float32)
+    assert _nms(boxes, scores, 0.5) == [1, 2]
+    # IoU ของสองกล่องแรก ~0.68 → threshold สูงกว่านั้นเก็บทั้งคู่ เรียงตาม score
+    assert _nms(boxes, scores, 0.7) == [1, 0, 2]
+
+
+def test_nms_empty():
+    assert _nms(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), 0.5) == []
+
+
+# =========================
+# letterbox + map box กลับขนาดเดิม
+# =========================
+def test_letterbox_pads_to_square():
+    img = np.full((100, 200, 3), 7, dtype=np.uint8)
+    canvas, ratio, (left, top) = _letterbox(img, 64)
+    assert canvas.shape == (64, 64, 3)
+    assert ratio == pytest.approx(0.32)
+    assert (left, top) == (0, 16)
+    assert (canvas[:16] == 114).all() and (canvas[48:] == 114).all()
+    assert (canvas[16:48] == 7).all()
+
+
+def test_letterbox_keeps_size_without_resize():
+    img = np.zeros((64, 64, 3), dtype=np.uint8)
+    canvas, ratio, pad = _letterbox(img, 64)
+    assert ratio == 1 and pad == (0, 0)
+    assert (canvas == 0).all()
+
+
+def _backend(iou=0.7, max_det=300):
+    # _postprocess ใช้แค่ iou / max_det ไม่ต้องโหลด onnxruntime session
+    backend = object.__new__(OnnxBackend)
+    backend.iou, backend.max_det = iou, max_det
+    return backend
+
+
+def _raw(boxes_xyxy, classes, confs, nc=4):
+    """output ของ model แบบ (4 + nc, anchors): xywh ในพิกัดรูป letterbox + score ต่อ class"""
+    pred = np.zeros((4 + nc, len(boxes_xyxy)), dtype=np.float32)
+    for i, ((x1, y1, x2, y2), c, s) in enumerate(zip(boxes_xyxy, classes, confs)):
+        pred[:4, i] = [(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1]
+        pred[4 + c, i] = s
+    return pred
+
+
+@pytest.mark.parametrize("shape", [(100, 200), (200, 100), (563, 750), (640, 640)])
+def test_postprocess_maps_boxes_back_to_original(shape):
+    h, w = shape
+    original = [(0.1 * w, 0.1 * h, 0.6 * w, 0.5 * h), (0.5 * w, 0.4 * h, w, h)]
+    _, ratio, (left, top) = _letterbox(np.zeros((h, w, 3), dtype=np.uint8), 640)
+    boxed = [(x1 * ratio + left, y1 * ratio + top, x2 * ratio + left, y2 * ratio + top) for x1, y1, x2, y2 in original]
+
+    dets = _backend()._postprocess(_raw(boxed, [0, 2], [0.9, 0.8]), 0.25, ratio, (left, top), (h, w))
+    assert [d["cls"] for d in dets] == [0, 2]
+    for d, box in zip(dets, original):
+        assert d["box"] == pytest.approx(box, abs=1e-3)
+
+
+def test_postprocess_filters_conf_and_runs_nms_per_class():
+    box = (10, 10, 100, 100)
+    pred = _raw([box, box, box, (12, 12, 100, 100)], [0, 1, 2, 0], [0.9, 0.8, 0.1, 0.7])
+    dets = _backend()._postprocess(pred, 0.25, 1.0, (0, 0), (640, 640))
+    # class 2 ต่ำกว่า conf; class 0 กล่องที่ซ้อนถูก NMS; class 1 ทับ class 0 ได้
+    assert [(d["cls"], d["conf"]) for d in dets] == [(0, pytest.approx(0.9)), (1, pytest.approx(0.8))]
+
+
+def test_postprocess_clips_to_image():
+    dets = _backend()._postprocess(_raw([(-20, -20, 700, 700)], [1], [0.9]), 0.25, 1.0, (0, 0), (480, 640))
+    assert dets[0]["box"] == [0.0, 0.0, 640.0, 480.0]
+
+
+# =========================
+# parity กับ PyTorch (ต้องมี weights)
+# =========================
+def _exported(kind: str, weights: Path) -> Path:
+    if kind == "onnx":
+        pytest.importorskip("onnxruntime")
+        return onnx_path_for(str(weights))
+    pytest.importorskip("openvino")
+    return Path(str(weights.with_suffix("")) + "_openvino_model")
+
+
+@pytest.mark.parametrize("kind", ["onnx", "openvino"])
+def test_backend_parity_with_torch(kind):
+    pytest.importorskip("ultralytics")
+    weights = Path(settings.YOLO_MODEL_PATH)
+    if not weights.is_file():
+        pytest.skip(f"no weights at {weights}")
+    exported = _exported(kind, weights)
+    if not exported.exists():
+        pytest.skip(f"no {kind} export at {exported} (python detector_backends.py export)")
+
+    ref, other = create_backend("torch", str(weights)), create_backend(kind, str(exported))
+    images = sorted(FIXTURES.glob("*.jpg"))
+    assert images
+    problems = {}
+    for img in images:
+        a = ref.predict([str(img)], imgsz=settings.YOLO_IMGSZ)[0]
+        b = other.predict([str(img)], imgsz=settings.YOLO_IMGSZ)[0]
+        assert tuple(a["orig_shape"]) == tuple(b["orig_shape"])
+        found = compare_detections(a["detections"], b["detections"])
+        if found:
+            problems[img.name] = found
+    assert problems == {}
@@ -0,0 +1,51 @@
+# tests/test_etag.py
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from etag import Conditional, etag_matches, weak_etag
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/items")
+    def items(cond: Conditional = Depends()):
+        # version ของข้อมูลเหมือนกันทุก query: ETag ต้องต่างกันตาม filter ใน URL
+        not_modified = cond.check("v1")
+        if not_modified:
+            return not_modified
+        return []
+
+    return TestClient(app)
+
+
+def test_query_filters_change_etag(client):
+    a = client.get("/items", params={"date": "2026-10-16"}).headers["etag"]
+    b = client.get("/items", params={"date": "2026-10-17"}).headers["etag"]
+    c = client.get("/items", params={"date": "2026-10-17", "tz": "UTC"}).headers["etag"]
+    plain = client.get("/items").headers["etag"]
+    assert len({a, b, c, plain}) == 4
+
+
+def test_param_order_does_not_change_etag(client):
+    a = client.get("/items?date=2026-10-17&tz=UTC").headers["etag"]
+    b = client.get("/items?tz=UTC&date=2026-10-17").headers["etag"]
+    assert a == b
+
+
+def test_if_none_match_only_for_same_query(client):
+    etag = client.get("/items", params={"date": "2026-10-16"}).headers["etag"]
+    assert client.get("/items", params={"date": "2026-10-16"}, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/items", params={"date": "2026-10-17"}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_matches_weak_and_lists():
+    tag = weak_etag("x")
+    assert etag_matches(tag, tag)
+    assert etag_matches(tag[2:], tag)
+    assert etag_matches(f'"other", {tag}', tag)
+    assert etag_matches("*", tag)
+    assert not etag_matches(None, tag)
+    assert not etag_matches('"other"', tag)
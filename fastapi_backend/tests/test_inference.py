@@ -0,0 +1,72 @@
+# tests/test_inference.py
+import asyncio
+import threading
+
+import pytest
+
+from inference import BatchScheduler, SchedulerStopped
+
+
+def _blocking_scheduler():
+    """batch แรกค้างจนกว่าจะ set event (เหมือน model กำลังรัน) batch ละ 1 งาน งานถัดไปจึงรอคิว"""
+    release = threading.Event()
+    running = threading.Event()
+
+    def run_batch(items):
+        running.set()
+        release.wait(5)
+        return [x * 2 for x in items]
+
+    return BatchScheduler(run_batch, max_batch_size=1, max_wait_ms=0, name="test"), running, release
+
+
+def test_results_in_order():
+    scheduler = BatchScheduler(lambda items: [x + 1 for x in items], max_batch_size=4, max_wait_ms=5)
+    try:
+        futures = [scheduler.submit_nowait(i) for i in range(10)]
+        assert [f.result(5) for f in futures] == list(range(1, 11))
+    finally:
+        scheduler.stop()
+
+
+def test_stop_fails_queued_and_finishes_running_batch():
+    scheduler, running, release = _blocking_scheduler()
+    first = scheduler.submit_nowait(1)
+    assert running.wait(5)
+    queued = [scheduler.submit_nowait(i) for i in (2, 3)]
+
+    scheduler.stop(timeout=0.1)
+    for fut in queued:
+        with pytest.raises(SchedulerStopped):
+            fut.result(1)
+    assert not first.done()
+    release.set()
+    assert first.result(5) == 2
+
+
+def test_submit_after_stop_fails_fast_until_started():
+    scheduler = BatchScheduler(lambda items: items, name="test")
+    scheduler.stop()
+    with pytest.raises(SchedulerStopped):
+        scheduler.submit_nowait(1)
+    scheduler.start()
+    try:
+        assert scheduler.submit_nowait(1).result(5) == 1
+    finally:
+        scheduler.stop()
+
+
+@pytest.mark.anyio
+async def test_awaiting_caller_is_released_on_stop():
+    scheduler, running, release = _blocking_scheduler()
+    try:
+        first = scheduler.submit_nowait(1)
+        assert running.wait(5)
+        waiting = asyncio.ensure_future(scheduler.submit(2))
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(scheduler.stop, 0.1)
+        with pytest.raises(SchedulerStopped):
+            await asyncio.wait_for(waiting, 5)
+    finally:
+        release.set()
+    assert first.result(5) == 2
@@ -0,0 +1,61 @@
+# tests/test_meal_changes.py
+import pytest
+
+from tests.conftest import requires_postgres
+from tests.test_meal_rollup import _client, _login
+
+pytestmark = [requires_postgres, pytest.mark.anyio]
+
+
+async def _changes(client, auth, since=None):
+    r = await client.get("/meals/changes", headers=auth, params={"since": since} if since else {})
+    assert r.status_code == 200
+    return r.json()
+
+
+async def test_late_commit_is_not_skipped(pg_app):
+    from database import SessionLocal, async_engine
+    from models import MealNutrition
+
+    async with await _client(pg_app) as client:
+        auth = await _login(client, "changes@test.com")
+        first = (await client.post("/meals", headers=auth, json={"name": "rice", "calories": 100, "meal_time": "lunch"})).json()
+        synced = await _changes(client, auth)
+        assert [m["id"] for m in synced["upserts"]] == [first["id"]]
+
+        # transaction A แก้ meal แล้วค้างไว้ (เช่นรอ row lock) ระหว่างนั้น B สร้าง meal ใหม่และ commit
+        slow = SessionLocal()
+        try:
+            slow.get(MealNutrition, first["id"]).name = "late rice"
+            slow.flush()
+            second = (await client.post("/meals", headers=auth, json={"name": "soup", "calories": 50, "meal_time": "dinner"})).json()
+
+            # client sync ระหว่างที่ A ยังไม่ commit: B ยังไม่ถูกส่ง (cursor จะข้าม A ไม่ได้)
+            pending = await _changes(client, auth, synced["next_cursor"])
+            assert pending["upserts"] == [] and pending["deleted"] == []
+            slow.commit()
+        finally:
+            slow.close()
+
+        late = await _changes(client, auth, pending["next_cursor"])
+        assert [(m["id"], m["name"]) for m in late["upserts"]] == [(first["id"], "late rice"), (second["id"], "soup")]
+
+        assert (await client.delete(f"/meals/{first['id']}", headers=auth)).status_code == 204
+        gone = await _changes(client, auth, late["next_cursor"])
+        assert gone["upserts"] == [] and gone["deleted"] == [first["id"]]
+        assert (await _changes(client, auth, gone["next_cursor"]))["upserts"] == []
+    await async_engine.dispose()
+
+
+async def test_timestamp_cursor_is_rejected(pg_app):
+    from datetime import datetime, timezone
+
+    from cursors import encode_cursor
+    from database import async_engine
+
+    async with await _client(pg_app) as client:
+        auth = await _login(client, "changes@test.com")
+        since = encode_cursor(datetime.now(timezone.utc), 1)
+        r = await client.get("/meals/changes", headers=auth, params={"since": since})
+        assert r.status_code == 400
+    await async_engine.dispose()
@@ -0,0 +1,127 @@
+# tests/test_meal_rollup.py
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from tests.conftest import requires_postgres
+
+pytestmark = [requires_postgres, pytest.mark.anyio]
+
+
+async def _client(app):
+    from database import async_engine
+
+    await async_engine.dispose()    # pool ของ loop ก่อนหน้าใช้ใน loop ของ test นี้ไม่ได้
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def _login(client, email="rollup@test.com"):
+    r = await client.post("/users/register", json={"email": email, "password": "pw"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _rollup_vs_meals():
+    from database import engine
+
+    with engine.connect() as conn:
+        rolled = conn.execute(text(
+            "SELECT COALESCE(SUM(calories), 0), COALESCE(SUM(protein), 0), COALESCE(SUM(meal_count), 0)"
+            " FROM daily_nutrition_rollup"
+        )).one()
+        actual = conn.execute(text(
+            "SELECT COALESCE(SUM(calories), 0), COALESCE(SUM(protein), 0), COUNT(*) FROM meal_nutrition"
+        )).one()
+    return tuple(rolled), tuple(actual)
+
+
+async def test_concurrent_updates_keep_rollup_in_sync(pg_app):
+    from database import async_engine
+
+    async with await _client(pg_app) as client:
+        auth = await _login(client)
+        meal = (await client.post("/meals", headers=auth, json={
+            "name": "rice", "calories": 100, "protein": 1, "meal_time": "2026-10-17T12:00:00",
+        })).json()
+
+        # แก้ meal เดียวกันพร้อมกัน: ถ้าไม่ล็อกแถว หลาย request หัก snapshot เดิมซ้ำ rollup เพี้ยน
+        results = await asyncio.gather(*(
+            client.put(f"/meals/{meal['id']}", headers=auth, json={"calories": 200 + i, "protein": i})
+            for i in range(30)
+        ))
+        assert all(r.status_code == 200 for r in results)
+    await async_engine.dispose()
+
+    rolled, actual = _rollup_vs_meals()
+    assert rolled == actual
+
+
+async def test_concurrent_delete_and_update_keep_rollup_in_sync(pg_app):
+    from database import async_engine
+
+    async with await _client(pg_app) as client:
+        auth = await _login(client)
+        meal = (await client.post("/meals", headers=auth, json={
+            "name": "rice", "calories": 100, "protein": 1, "meal_time": "2026-10-17T12:00:00",
+        })).json()
+
+        calls = [client.put(f"/meals/{meal['id']}", headers=auth, json={"calories": 300 + i}) for i in range(10)]
+        calls.insert(5, client.delete(f"/meals/{meal['id']}", headers=auth))
+        results = await asyncio.gather(*calls)
+        assert {r.status_code for r in results} <= {200, 204, 404}
+    await async_engine.dispose()
+
+    rolled, actual = _rollup_vs_meals()
+    assert rolled == actual
+
+
+async def test_batch_replay_keeps_client_day(pg_app):
+    from datetime import datetime, timedelta
+    from zoneinfo import ZoneInfo
+
+    from config import settings
+    from database import async_engine
+
+    zone = ZoneInfo(settings.APP_TIMEZONE)
+    now = datetime.now(zone)
+    yesterday = (now - timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
+    items = [
+        # บันทึกเมื่อวานตอน offline แล้วส่งวันนี้
+        {"client_key": "y", "name": "rice", "calories": 100, "meal_time": "lunch", "created_at": yesterday.isoformat()},
+        # ไม่มี timezone = APP_TIMEZONE
+        {"client_key": "n", "name": "egg", "calories": 70, "meal_time": "lunch",
+         "created_at": yesterday.replace(tzinfo=None, hour=13).isoformat()},
+        # นาฬิกาเครื่องเพี้ยน: อนาคต → ตอนนี้, เก่าเกิน → ขอบ MEAL_BATCH_MAX_AGE_DAYS
+        {"client_key": "f", "name": "soup", "calories": 50, "meal_time": "dinner",
+         "created_at": (now + timedelta(days=3)).isoformat()},
+        {"client_key": "o", "name": "tea", "calories": 10, "meal_time": "snack",
+         "created_at": (now - timedelta(days=400)).isoformat()},
+        {"client_key": "d", "name": "salad", "calories": 30, "meal_time": "dinner"},
+    ]
+
+    async with await _client(pg_app) as client:
+        auth = await _login(client, "batch@test.com")
+        r = await client.post("/meals/batch", headers=auth, json={"items": items})
+        assert r.status_code == 200 and r.json()["created"] == 5
+        created = {x["client_key"]: datetime.fromisoformat(x["meal"]["created_at"]) for x in r.json()["results"]}
+
+        day = await client.get("/meals", headers=auth, params={"date": yesterday.date().isoformat()})
+        assert sorted(m["name"] for m in day.json()) == ["egg", "rice"]
+        summary = (await client.get("/meals/summary", headers=auth,
+                                    params={"date": yesterday.date().isoformat()})).json()
+        assert summary["totals"]["calories"] == 170
+
+        oldest = now - timedelta(days=settings.MEAL_BATCH_MAX_AGE_DAYS)
+        assert created["f"] <= datetime.now(zone) and created["f"].astimezone(zone).date() == now.date()
+        assert abs(created["o"] - oldest) < timedelta(seconds=5)
+        assert created["d"].astimezone(zone).date() == now.date()
+    await async_engine.dispose()
+
+    rolled, actual = _rollup_vs_meals()
+    assert rolled == actual
+    from database import engine
+
+    with engine.connect() as conn:
+        days = dict(conn.execute(text("SELECT day, calories FROM daily_nutrition_rollup")).all())
+    assert days[yesterday.date()] == 170
@@ -0,0 +1,52 @@
+# tests/test_menu_index.py
+import pytest
+
+from menu_index import MenuSearchIndex
+
+ROWS = [
+    {"id": 1, "food_name": "ผัดไทย", "food_name_en": "Pad Thai", "protein": 1, "fat": 1, "carbs": 1, "calories": 1},
+    {"id": 2, "food_name": "ข้าวมันไก่", "food_name_en": "Chicken Rice", "protein": 1, "fat": 1, "carbs": 1, "calories": 1},
+    {"id": 3, "food_name": "ต้มยำกุ้ง", "food_name_en": "Tom Yum Goong", "protein": 1, "fat": 1, "carbs": 1, "calories": 1},
+    {"id": 4, "food_name": "ส้มตำ", "food_name_en": "Som Tam", "protein": 1, "fat": 1, "carbs": 1, "calories": 1},
+]
+
+
+@pytest.fixture
+def index():
+    idx = MenuSearchIndex(ttl=3600)
+    idx._install(ROWS)
+    return idx
+
+
+def _ids(index, text, **kw):
+    rows, total = index.search(text, **kw)
+    assert total >= len(rows)
+    return [r["id"] for r in rows]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("a", {1, 4}),         # กลางคำ: pAd thAi, som tAm
+    ("h", {1, 2}),
+    ("ย", {1, 3}),         # ตัวสุดท้ายของ ผัดไทย / กลางคำ ต้มยำ
+    ("ไ", {1, 2}),
+])
+def test_single_character_matches_anywhere(index, text, expected):
+    # เหมือน ILIKE '%q%' เดิม: คำค้นตัวเดียวต้องเจอทุกชื่อที่มีตัวนั้น ไม่ใช่แค่ prefix
+    assert set(_ids(index, text)) == expected
+
+
+def test_single_character_prefix_ranks_first(index):
+    assert _ids(index, "t")[0] in (3, 4)     # "Tom Yum" / "Tam" ขึ้นต้นคำด้วย t
+    assert set(_ids(index, "t")) == {1, 3, 4}
+
+
+def test_prefix_and_fuzzy(index):
+    assert _ids(index, "pad")[0] == 1
+    assert _ids(index, "chick")[0] == 2
+    assert _ids(index, "ผัดไท")[0] == 1      # ขาด ย
+    assert _ids(index, "ผัด ไทย")[0] == 1    # มีช่องว่าง
+    assert _ids(index, "tom yum")[0] == 3
+
+
+def test_empty_query(index):
+    assert index.search("   ") == ([], 0)
@@ -0,0 +1,46 @@
+# tests/test_prediction_cache.py
+import os
+
+import cache
+from prediction_cache import PredictionCache
+
+PRED = {"detections": [], "original_width": 1, "original_height": 1}
+
+
+def _files(root):
+    return sorted(p.name for p in root.glob("*/*.json"))
+
+
+def test_memory_only_by_default(tmp_path):
+    cache.set_shared_client(None)
+    pc = PredictionCache(tmp_path)
+    pc.put("a" * 64, "v1", PRED)
+    assert pc.get("a" * 64, "v1") == PRED
+    assert list(tmp_path.iterdir()) == []
+
+    pc._memory.local.clear()
+    assert pc.get("a" * 64, "v1") is None
+
+
+def test_persisted_entries_survive_memory_loss(tmp_path):
+    cache.set_shared_client(None)
+    pc = PredictionCache(tmp_path, persist=True, max_files=10)
+    pc.put("a" * 64, "v1", PRED)
+    pc._memory.local.clear()
+    assert pc.get("a" * 64, "v1") == PRED
+
+
+def test_disk_cache_is_bounded_across_versions(tmp_path):
+    cache.set_shared_client(None)
+    pc = PredictionCache(tmp_path, persist=True, max_files=5)
+    for i in range(8):
+        version = "v1" if i < 4 else "v2"
+        pc.put(f"{i:064d}", version, PRED)
+        # mtime ชัดเจนต่อไฟล์ (ไม่พึ่งความละเอียดของนาฬิกา filesystem)
+        os.utime(tmp_path / version / f"{i:064d}.json", (1_000_000 + i, 1_000_000 + i))
+
+    pc.put(f"{8:064d}", "v2", PRED)
+    # ไฟล์ของ version เก่า (mtime เก่าสุด) ถูกลบก่อน
+    assert len(_files(tmp_path)) == 5
+    assert _files(tmp_path)[-1] == f"{8:064d}.json"
+    assert not list((tmp_path / "v1").glob("*.json"))
@@ -0,0 +1,125 @@
+# tests/test_recompute_targets.py
+"""สูตร vectorized ต้องตรงกับ crud._apply_health_calculation ทุกแถว และ filter วันเกิดต้องไม่ตกหล่น"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+import recompute_targets as rt
+from models import Profile, User
+
+TODAY = date(2026, 10, 17)
+
+
+def _cols(rows):
+    """rows: dict ต่อ profile (ขาด key = NULL) → คอลัมน์แบบเดียวกับ _columns"""
+    cols = {k: np.array([r.get(k) for r in rows], dtype=object) for k in ("gender", "goal", "lifestyle")}
+    for k in ("height", "current_weight"):
+        cols[k] = np.array([r.get(k) for r in rows], dtype=float)
+    dobs = [r.get("dob") for r in rows]
+    cols["dob_year"] = np.array([d.year if d else None for d in dobs], dtype=float)
+    cols["dob_md"] = np.array([d.month * 100 + d.day if d else None for d in dobs], dtype=float)
+    return cols
+
+
+# =========================
+# parity กับ crud
+# =========================
+@pytest.mark.parametrize("today", [TODAY, date(2028, 2, 29), date(2027, 3, 1), date(2026, 12, 31), date(2027, 1, 1)])
+def test_synthetic_parity(today):
+    assert rt.parity(rt._synthetic(10000), today) == 0
+
+
+BASE = {"gender": "female", "height": 165, "current_weight": 60, "goal": "รักษาหุ่น", "lifestyle": "moderate",
+        "dob": date(1990, 5, 20)}
+
+
+@pytest.mark.parametrize("override", [
+    {"height": None},
+    {"height": 0},
+    {"current_weight": None},
+    {"current_weight": 0},
+    {"dob": None},
+    {"gender": None},
+    {"gender": "unknown"},
+    {"goal": None},
+    {"goal": "bulk"},
+    {"lifestyle": None},
+    {"lifestyle": "couch"},
+    {"dob": date(2025, 10, 18)},    # อายุ 0 ปีเต็ม: crud ถือว่าไม่มีค่า (`not age`)
+])
+def test_null_and_invalid_fields_match_scalar(override):
+    row = {**BASE, **override}
+    row = {k: v for k, v in row.items() if v is not None}
+    assert rt.parity(_cols([row, BASE]), TODAY) == 0
+
+
+def test_missing_body_measurements_give_nulls():
+    out = rt.compute_targets(_cols([{**BASE, "height": 0}, {**BASE, "current_weight": None}]), TODAY)
+    for k in rt.TARGETS:
+        assert np.isnan(out[k]).all(), k
+
+
+@pytest.mark.parametrize("today", [date(2027, 2, 28), date(2027, 3, 1), date(2028, 2, 28), date(2028, 2, 29)])
+def test_leap_day_birthday_matches_scalar(today):
+    rows = [{**BASE, "dob": date(2000, 2, 29)}, {**BASE, "dob": date(2001, 3, 1)}, {**BASE, "dob": date(2001, 2, 28)}]
+    assert rt.parity(_cols(rows), today) == 0
+
+
+# =========================
+# _birthday_filter
+# =========================
+BIRTHDAYS = [(1, 2, 28), (2, 2, 29), (3, 3, 1), (4, 12, 30), (5, 12, 31), (6, 1, 1), (7, 1, 2), (8, 1, 3), (9, 6, 15)]
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    # extract(month/day) บน SQLite ใช้ strftime ได้เหมือน Postgres
+    engine = create_engine("sqlite://")
+    User.metadata.create_all(engine, tables=[User.__table__, Profile.__table__])
+    with Session(engine) as db:
+        for pid, month, day in BIRTHDAYS:
+            db.add(User(id=pid, email=f"u{pid}@test.com", hashed_password="x"))
+            db.add(Profile(id=pid, user_id=pid, date_of_birth=date(1996, month, day)))
+        db.add(User(id=99, email="nodob@test.com", hashed_password="x"))
+        db.add(Profile(id=99, user_id=99))
+        db.commit()
+        yield db
+    engine.dispose()
+
+
+def _matched(db, since, today):
+    return sorted(db.scalars(select(Profile.id).where(rt._birthday_filter(since, today))))
+
+
+@pytest.mark.parametrize("since, today, expected", [
+    # ข้ามปี: 31 ธ.ค. / 1-2 ม.ค. อยู่ใน (since, today]
+    (date(2026, 12, 30), date(2027, 1, 2), [5, 6, 7]),
+    (date(2026, 12, 31), date(2027, 1, 1), [6]),
+    # 29 ก.พ. ปีไม่ใช่ปีอธิกสุรทิน: นับอายุเพิ่มวันที่ 1 มี.ค. ตาม crud (วัน > 228)
+    (date(2027, 2, 28), date(2027, 3, 1), [2, 3]),
+    (date(2028, 2, 28), date(2028, 2, 29), [2]),
+    (date(2028, 2, 29), date(2028, 3, 1), [3]),
+    # ไม่ได้รันหลายวันข้ามปี
+    (date(2026, 11, 1), date(2027, 3, 1), [1, 2, 3, 4, 5, 6, 7, 8]),
+    # ห่างครบปี: ทุกคนที่มีวันเกิด
+    (date(2026, 6, 15), date(2027, 6, 15), [1, 2, 3, 4, 5, 6, 7, 8, 9]),
+    (date(2025, 12, 31), date(2027, 1, 1), [1, 2, 3, 4, 5, 6, 7, 8, 9]),
+])
+def test_birthday_filter(profiles, since, today, expected):
+    assert _matched(profiles, since, today) == expected
+
+
+def test_birthday_filter_covers_every_age_change(profiles):
+    """ทุกวันตลอดสองปี (มีปีอธิกสุรทิน): profile ที่อายุเปลี่ยนระหว่าง since → today ต้องถูกเลือก"""
+    dobs = {pid: date(1996, m, d) for pid, m, d in BIRTHDAYS}
+    day = date(2027, 1, 1)
+    while day < date(2029, 1, 1):
+        since, today = day, day + timedelta(days=3)
+        chosen = set(_matched(profiles, since, today))
+        for pid, dob in dobs.items():
+            if rt.crud.calculate_age(dob, today) != rt.crud.calculate_age(dob, since):
+                assert pid in chosen, (pid, since, today)
+        day += timedelta(days=1)
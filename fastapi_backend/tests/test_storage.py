@@ -0,0 +1,55 @@
+# tests/test_storage.py
+import hashlib
+import io
+
+import pytest
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+import storage
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(storage, "ARCHIVE_DIR", tmp_path / "archive")
+    (tmp_path / "archive").mkdir()
+    return tmp_path
+
+
+def _png(size=(64, 48)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.anyio
+async def test_archive_copy_does_not_satisfy_upload_dedup(upload_dir):
+    original = _png()
+    digest = hashlib.sha256(original).hexdigest()
+
+    # /yolo/predict เก็บสำเนาย่อ (คนละ bytes) ไว้ใต้ digest ของต้นฉบับ
+    archived = storage.save_archive(b"downsized jpeg bytes", digest)
+    assert archived.path.parent == upload_dir / "archive"
+    assert archived.url == f"/uploads/archive/{digest}.jpg"
+    assert storage.find_by_digest(digest) is None
+
+    # /files/upload ของต้นฉบับต้องได้ไฟล์ต้นฉบับ ไม่ใช่สำเนาย่อ
+    saved = await storage.save_upload(UploadFile(io.BytesIO(original), filename="x.png"))
+    assert saved.created
+    assert saved.path == upload_dir / f"{digest}.png"
+    assert saved.path.read_bytes() == original
+
+
+def test_resolve_upload_prefers_original_then_archive(upload_dir):
+    digest = "ab" * 32
+    storage.save_archive(b"jpeg", digest)
+    assert storage.resolve_upload(f"{digest}.jpg") == upload_dir / "archive" / f"{digest}.jpg"
+
+    (upload_dir / f"{digest}.png").write_bytes(b"png")
+    assert storage.resolve_upload(f"{digest}.jpg") == upload_dir / f"{digest}.png"
+
+
+@pytest.mark.parametrize("name", ["../secret.jpg", "archive/x.jpg", ".tmp-1", ""])
+def test_resolve_upload_rejects_paths(upload_dir, name):
+    assert storage.resolve_upload(name) is None
@@ -0,0 +1,100 @@
+# tests/test_yolo_predict.py
+"""/yolo/predict โดยไม่โหลด model: ผล detection มาจาก prediction_cache ที่ patch ไว้"""
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from class_menu import class_menu
+from config import settings
+from inference import BatchScheduler
+from model_server import ModelServerUnavailable
+from routers import yolo
+import storage
+import thumbnails
+
+PRED = {
+    "detections": [{"cls": 0, "label": "pad_thai", "conf": 0.9, "box": [1, 2, 3, 4]}],
+    "original_width": 32,
+    "original_height": 24,
+}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    # archive / render ลง tmp_path แทน uploads/ และ results/runs จริง
+    monkeypatch.setattr(storage, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(storage, "ARCHIVE_DIR", tmp_path / "archive")
+    (tmp_path / "archive").mkdir()
+    monkeypatch.setattr(yolo, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(yolo, "RESULTS_DIR", tmp_path / "runs")
+    (tmp_path / "runs").mkdir()
+    monkeypatch.setattr(thumbnails, "generate", lambda path: None)
+    monkeypatch.setattr(yolo, "_model_version", lambda: "test")
+    monkeypatch.setattr(yolo.prediction_cache, "get", lambda digest, version: PRED)
+    app = FastAPI()
+    app.include_router(yolo.router)
+    return TestClient(app)
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 24), (0, 128, 0)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _predict(client, **params):
+    return client.post("/yolo/predict", params=params, files={"file": ("a.png", _png(), "image/png")})
+
+
+def test_include_nutrition(client, monkeypatch):
+    monkeypatch.setattr(class_menu, "refresh", lambda db: {0: {"id": 7, "name": "Pad Thai"}})
+    r = _predict(client, include_nutrition="true")
+    assert r.status_code == 200
+    assert r.json()["nutrition"] == [{"cls": 0, "label": "pad_thai", "menu": {"id": 7, "name": "Pad Thai"}}]
+
+
+def test_include_nutrition_model_server_down_is_503(client, monkeypatch):
+    def refresh(db):
+        raise ModelServerUnavailable("model server not reachable")
+
+    monkeypatch.setattr(class_menu, "refresh", refresh)
+    r = _predict(client, include_nutrition="true")
+    assert r.status_code == 503
+    assert r.json()["detail"] == "model server not reachable"
+    # ไม่ขอ nutrition ไม่ต้องถาม model server เรื่อง class
+    assert _predict(client).status_code == 200
+
+
+def test_archive_default_gives_image_url(client):
+    assert settings.YOLO_ARCHIVE_UPLOADS
+    body = _predict(client).json()
+    assert body["image_url"].startswith("/yolo/render/")
+    assert body["uploaded_url"].startswith("/uploads/archive/")
+
+
+def test_annotate_renders_overlay(client):
+    body = _predict(client, annotate="true").json()
+    assert body["image_url"] == f"/results/runs/{storage.digest_from_name(body['uploaded_url'].rsplit('/', 1)[1])}_test.jpg"
+
+
+def test_annotate_without_archive_is_409(client, monkeypatch):
+    monkeypatch.setattr(settings, "YOLO_ARCHIVE_UPLOADS", False)
+    r = _predict(client, annotate="true")
+    assert r.status_code == 409
+    # ไม่ขอ annotate ยังได้ detections ตามปกติ (แค่ไม่มี image_url)
+    body = _predict(client).json()
+    assert body["detections"] == PRED["detections"] and body["image_url"] is None
+
+
+def test_stopped_scheduler_is_503(client, monkeypatch):
+    # กำลังปิด server: request ที่ต้องรัน model ได้ 503 แทนค้างรอ future ที่ไม่มีวันเสร็จ
+    stopped = BatchScheduler(lambda items: items, name="yolo")
+    stopped.stop()
+    monkeypatch.setattr(yolo, "scheduler", stopped)
+    monkeypatch.setattr(yolo.prediction_cache, "get", lambda digest, version: None)
+    r = _predict(client)
+    assert r.status_code == 503
+    assert r.json()["detail"] == "yolo scheduler is stopped"
@@ -0,0 +1,79 @@
+# thumbnails.py
+"""รูปย่อหลายขนาดของไฟล์ใน uploads (WebP + JPEG)
+
+    uploads/thumbs/<size>/<ชื่อไฟล์ต้นฉบับไม่มีนามสกุล>.<webp|jpg>
+
+สร้างหลัง upload (background task) หรือสร้างตอนถูกขอครั้งแรก (รูปเก่าที่ยังไม่มีรูปย่อ)
+ชื่อไฟล์ต้นฉบับเป็น sha256 ของเนื้อไฟล์ รูปย่อจึงไม่เปลี่ยนและ cache ฝั่ง client ได้ตลอด
+"""
+import os
+import uuid
+from pathlib import Path
+from typing import Dict
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config import settings
+from storage import UPLOAD_DIR
+
+THUMB_DIR = UPLOAD_DIR / "thumbs"
+
+# format ที่ส่งได้ → (PIL format, นามสกุล, media type)
+FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+
+def sizes():
+    return sorted(set(settings.THUMBNAIL_SIZES))
+
+
+def thumb_path(source: Path, size: int, fmt: str) -> Path:
+    return THUMB_DIR / str(size) / f"{source.stem}.{FORMATS[fmt][1]}"
+
+
+def thumb_urls(source: Path) -> Dict[int, str]:
+    return {size: f"/files/thumb/{size}/{source.name}" for size in sizes()}
+
+
+def _save(im: Image.Image, out: Path, fmt: str):
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f".{out.name}.{uuid.uuid4().hex}")
+    try:
+        pil_format = FORMATS[fmt][0]
+        if pil_format == "WEBP":
+            im.save(tmp, format=pil_format, quality=settings.THUMBNAIL_QUALITY, method=4)
+        else:
+            im.save(tmp, format=pil_format, quality=settings.THUMBNAIL_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp, out)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def generate(source: Path, force: bool = False) -> bool:
+    """สร้างรูปย่อทุกขนาดทุก format ของ source (decode ครั้งเดียว ย่อจากใหญ่ไปเล็ก)
+
+    คืน False ถ้า source เปิดไม่ได้
+    """
+    wanted = [(s, f) for s in sizes() for f in FORMATS if force or not thumb_path(source, s, f).is_file()]
+    if not wanted:
+        return True
+
+    largest = max(s for s, _ in wanted)
+    try:
+        with Image.open(source) as im:
+            if im.format == "JPEG":
+                # decode ที่ 1/2 .. 1/8 ของขนาดจริงพอสำหรับรูปย่อ
+                im.draft("RGB", (largest, largest))
+            im = ImageOps.exif_transpose(im).convert("RGB")
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return False
+
+    for size in sorted({s for s, _ in wanted}, reverse=True):
+        if max(im.size) > size:
+            im.thumbnail((size, size), Image.LANCZOS)
+        for s, fmt in wanted:
+            if s == size:
+                _save(im, thumb_path(source, size, fmt), fmt)
+    return True
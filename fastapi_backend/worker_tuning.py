@@ -0,0 +1,153 @@
+# worker_tuning.py
+"""แบ่ง CPU ให้ API worker หลายตัวบนเครื่องเดียว (ใช้โดย gunicorn.conf.py)
+
+torch / BLAS ตั้ง thread เท่าจำนวน core ต่อ process: 4 worker บนเครื่อง 8 core = 32+ thread
+แย่ง core กัน throughput จึงตกเมื่อเพิ่ม worker
+- intra-op thread ต่อ worker = YOLO_INTRA_OP_THREADS หรือ (0) core ÷ WEB_WORKERS
+- inter-op thread ต่อ worker = YOLO_INTER_OP_THREADS หรือ (0) 1
+- WORKER_CPU_AFFINITY=true: worker ช่อง i ผูกกับ core ชุดที่ i (Linux)
+
+CLI (throughput ของ model ตามจำนวน worker × thread, fork หลังโหลด weights แบบ preload_app):
+    python worker_tuning.py uploads/xxx.jpg --combos 1x8 2x4 4x2 8x1 --seconds 10
+"""
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from config import settings
+
+# library ที่อ่านจำนวน thread จาก env ตอนโหลด (ต้องตั้งก่อน import numpy / torch)
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+@dataclass
+class WorkerPlan:
+    slot: int
+    intra_op_threads: int
+    inter_op_threads: int
+    cores: List[int] = field(default_factory=list)     # ว่าง = ไม่ผูก core
+
+
+def _cores_for(slot: int, workers: int, cores: List[int]) -> List[int]:
+    if len(cores) < workers:
+        # worker มากกว่า core: วนใช้ทีละ core
+        return [cores[slot % len(cores)]]
+    per = len(cores) // workers
+    start = (slot % workers) * per
+    return cores[start:start + per]
+
+
+def plan(slot: int, workers: int, intra: Optional[int] = None, inter: Optional[int] = None,
+         affinity: Optional[bool] = None, cores: Optional[List[int]] = None) -> WorkerPlan:
+    """thread / core ของ worker ช่อง `slot` (ค่าที่ไม่ส่งมาใช้จาก config)"""
+    intra = settings.YOLO_INTRA_OP_THREADS if intra is None else intra
+    inter = settings.YOLO_INTER_OP_THREADS if inter is None else inter
+    affinity = settings.WORKER_CPU_AFFINITY if affinity is None else affinity
+    cores = available_cores() if cores is None else cores
+    workers = max(1, workers)
+
+    mine = _cores_for(slot, workers, cores) if affinity else []
+    auto_intra = len(mine) if mine else max(1, len(cores) // workers)
+    return WorkerPlan(slot, intra or auto_intra, inter or 1, mine)
+
+
+def limit_thread_env(workers: int):
+    """ตั้ง OMP/MKL/OpenBLAS threads ก่อน import library (ไม่ทับค่าที่ตั้งมาใน env แล้ว)"""
+    threads = str(plan(0, workers).intra_op_threads)
+    for name in _THREAD_ENV:
+        os.environ.setdefault(name, threads)
+
+
+def should_preload_model() -> bool:
+    """โหลด weights ใน master ก่อน fork ได้เฉพาะ torch
+
+    onnxruntime / openvino สร้าง thread pool ตอนโหลด session ซึ่งใช้ต่อใน process ที่ fork ไม่ได้
+    """
+    return (settings.ENABLE_INFERENCE and not settings.YOLO_MODEL_SERVER
+            and settings.YOLO_BACKEND.lower() == "torch")
+
+
+def apply(p: WorkerPlan):
+    """เรียกใน worker หลัง fork ก่อนรัน inference ครั้งแรก"""
+    if p.cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, p.cores)
+    # backend ที่จะโหลดทีหลังใน worker นี้ (onnx, หรือ torch ที่ไม่ได้ preload) อ่านจาก settings
+    settings.YOLO_INTRA_OP_THREADS = p.intra_op_threads
+    settings.YOLO_INTER_OP_THREADS = p.inter_op_threads
+    if "torch" in sys.modules:
+        from detector_backends import set_torch_threads
+
+        set_torch_threads(p.intra_op_threads, p.inter_op_threads)
+
+
+# =========================
+# BENCHMARK
+# =========================
+def _bench_worker(p: WorkerPlan, image, seconds: float, barrier, results):
+    from model_registry import registry
+
+    apply(p)
+    model = registry.get()
+    model.predict([image], imgsz=settings.YOLO_IMGSZ)     # warm-up หลังตั้ง thread แล้ว
+    barrier.wait()
+    n, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        model.predict([image], imgsz=settings.YOLO_IMGSZ)
+        n += 1
+    results.put((p.slot, n))
+
+
+def _parse_combo(text: str) -> Tuple[int, int]:
+    workers, threads = text.lower().split("x")
+    return int(workers), int(threads)
+
+
+def run_bench(image_path: str, combos: List[Tuple[int, int]], seconds: float, affinity: bool) -> int:
+    import multiprocessing
+
+    from ingest import decode_file
+    from model_registry import registry
+
+    image = decode_file(image_path, settings.YOLO_IMGSZ).array
+    if should_preload_model():
+        registry.get()      # เหมือน preload_app: worker ได้ weights จาก master แบบ copy-on-write
+
+    ctx = multiprocessing.get_context("fork")
+    for workers, threads in combos:
+        plans = [plan(i, workers, intra=threads, affinity=affinity) for i in range(workers)]
+        barrier, results = ctx.Barrier(workers + 1), ctx.Queue()
+        procs = [ctx.Process(target=_bench_worker, args=(p, image, seconds, barrier, results)) for p in plans]
+        for proc in procs:
+            proc.start()
+        barrier.wait()
+        counts = sorted(results.get() for _ in procs)
+        for proc in procs:
+            proc.join()
+        total = sum(n for _, n in counts)
+        print(f"{workers:2d} workers x {threads:2d} threads: {total / seconds:7.1f} img/s"
+              f"  per worker {[n for _, n in counts]}")
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    cores = len(available_cores())
+    default_combos = [f"{w}x{max(1, cores // w)}" for w in (1, 2, 4, 8) if w <= cores]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image")
+    parser.add_argument("--combos", nargs="+", default=default_combos, help="WORKERSxTHREADS เช่น 2x4")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--affinity", action="store_true", help="ผูก worker กับ core (WORKER_CPU_AFFINITY)")
+    args = parser.parse_args()
+
+    sys.exit(run_bench(args.image, [_parse_combo(c) for c in args.combos], args.seconds, args.affinity))
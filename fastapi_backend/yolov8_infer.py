@@ -1,46 +1,29 @@
 # yolov8_infer.py
-from ultralytics import YOLO
 from pathlib import Path
 
-# ⭐ รายการ class ที่คุณเทรน YOLOv8 ไว้
-CLASS_MAP = [
-    "Fried Rice",
-    "Pad Thai",
-    "Papaya Salad",
-    "Omelet Rice",
-    "Green Curry",
-    "Tom Yum"
-]
+from config import settings
+from model_registry import registry
+from overlay import render_overlay
+
+RESULTS_DIR = Path("results") / "runs"
 
-_model = None
 
 def detect_objects(image_path: str):
-    global _model
-    if _model is None:
-        _model = YOLO("models/best.pt")
-
-    results = _model.predict(
-        source=image_path,
-        save=True,
-        project="results",
-        name="runs",
-        exist_ok=True,
-    )
-
-    r = results[0]
-
-    detected_classes = []
-    for b in r.boxes:
-        cls_id = int(b.cls[0])
-        conf = float(b.conf[0])
-        name = CLASS_MAP[cls_id] if cls_id < len(CLASS_MAP) else f"class_{cls_id}"
-        detected_classes.append(name)
-
-    # ไฟล์ที่ YOLO เซฟไว้หลัง annotate
-    saved_path = Path(r.save_dir) / Path(image_path).name
+    # ใช้ model ตัวเดียวกับ /yolo/predict และชื่อ class จาก model.names
+    model = registry.get()
+
+    r = model.predict([image_path], conf=0.25, imgsz=settings.YOLO_IMGSZ)[0]
+
+    detections = [
+        {**d, "label": registry.class_name(d["cls"])}
+        for d in r["detections"]
+    ]
+
+    # ไฟล์ที่ annotate แล้ว
+    saved_path = render_overlay(Path(image_path), detections, RESULTS_DIR / Path(image_path).name)
 
     return {
         "filename": saved_path.name,
-        "detected_classes": detected_classes,
-        "confidence": [float(b.conf[0]) for b in r.boxes],
+        "detected_classes": [d["label"] for d in detections],
+        "confidence": [d["conf"] for d in detections],
     }